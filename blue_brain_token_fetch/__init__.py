@@ -1,10 +1,16 @@
 """
 Version corresponding to the git version tag
 """
-from pkg_resources import get_distribution, DistributionNotFound
+try:
+    from importlib.metadata import version, PackageNotFoundError
+except ImportError:  # python < 3.8
+    from pkg_resources import get_distribution, DistributionNotFound as PackageNotFoundError
+
+    def version(distribution_name):
+        return get_distribution(distribution_name).version
 
 try:
-    __version__ = get_distribution(__name__).version
-except DistributionNotFound:
+    __version__ = version(__name__)
+except PackageNotFoundError:
     # package is not installed
     pass
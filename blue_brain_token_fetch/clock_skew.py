@@ -0,0 +1,105 @@
+"""This class allows to estimate the offset between the local clock and the clock of a
+Keycloak server, from the 'iat' claim of the tokens it issues and from the round-trip
+time of the requests that returned them.
+One smoothed estimate is kept per server and shared by all the fetchers of the process.
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+
+class ClockSkewEstimator:
+    """
+    A class to represent the smoothed clock offset of a Keycloak server.
+
+    Attributes
+    ----------
+    skew : float
+        Estimated number of seconds to add to the local clock to get the server clock.
+    samples : int
+        Number of tokens used for the estimation.
+    last_round_trip : float
+        Round-trip time, in seconds, of the last request used for the estimation.
+    """
+
+    SMOOTHING = 0.2
+
+    def __init__(self, smoothing: float = SMOOTHING):
+        self.smoothing = smoothing
+        self.skew = 0.0
+        self.samples = 0
+        self.last_round_trip: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def add_sample(self, issued_at: float, sent_at: float, received_at: float) -> float:
+        """
+        Update the estimation with a token issued at 'issued_at' (server clock) by a
+        request sent at 'sent_at' and answered at 'received_at' (local clock).
+
+        The token is assumed to be issued in the middle of the round trip. As 'iat' is
+        truncated to the second, half a second is added to the issuing time.
+        """
+        round_trip = max(received_at - sent_at, 0.0)
+        offset = issued_at + 0.5 - (sent_at + round_trip / 2)
+
+        with self._lock:
+            if self.samples == 0:
+                self.skew = offset
+            else:
+                self.skew += self.smoothing * (offset - self.skew)
+            self.samples += 1
+            self.last_round_trip = round_trip
+
+            return self.skew
+
+    def server_time(self, local_time: Optional[float] = None) -> float:
+        """
+        Return the server timestamp corresponding to 'local_time' (now by default).
+        """
+        return (time.time() if local_time is None else local_time) + self.skew
+
+    def local_time(self, server_time: float) -> float:
+        """
+        Return the local timestamp corresponding to the server timestamp 'server_time'.
+        """
+        return server_time - self.skew
+
+
+_estimators: Dict[str, ClockSkewEstimator] = {}
+_estimators_lock = threading.Lock()
+
+
+def get_estimator(server_url: str) -> ClockSkewEstimator:
+    """
+    Return the clock skew estimator of the Keycloak server located at 'server_url'.
+    """
+    key = server_url.rstrip("/")
+    with _estimators_lock:
+        if key not in _estimators:
+            _estimators[key] = ClockSkewEstimator()
+        return _estimators[key]
+
+
+def clock_skews() -> Dict[str, float]:
+    """
+    Return the estimated clock skew, in seconds, of every Keycloak server contacted.
+    """
+    with _estimators_lock:
+        return {
+            server_url: estimator.skew
+            for server_url, estimator in _estimators.items()
+            if estimator.samples
+        }
+
+
+def _after_fork_in_child():
+    # the threads holding the locks during the fork do not exist in the child
+    global _estimators_lock  # pylint: disable=global-statement
+    _estimators_lock = threading.Lock()
+    for estimator in _estimators.values():
+        estimator._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
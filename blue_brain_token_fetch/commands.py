@@ -0,0 +1,33 @@
+"""
+This module is the entry point of the 'blue-brain-token-fetch' CLI: it dispatches the
+subcommands given as first argument to their click command and runs the token fetcher
+otherwise. The commands are only imported once chosen, so that the light ones (such as
+'health') do not pay the import of keycloak.
+"""
+import importlib
+import sys
+
+# subcommands, given as first argument, and the location of their click command
+SUBCOMMANDS = {
+    "fetch-many": "blue_brain_token_fetch.fetch_many:fetch_many_command",
+    "exec": "blue_brain_token_fetch.exec_command:exec_command",
+    "health": "blue_brain_token_fetch.health:health_command",
+    "simulate": "blue_brain_token_fetch.simulation:simulate_command",
+}
+DEFAULT_COMMAND = "blue_brain_token_fetch.nexus_token_fetch:token_fetcher"
+
+
+def _load(location: str):
+    module_name, command_name = location.split(":")
+    return getattr(importlib.import_module(module_name), command_name)
+
+
+def start():
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        command = _load(SUBCOMMANDS[sys.argv[1]])
+        command(args=sys.argv[2:], prog_name=f"blue-brain-token-fetch {sys.argv[1]}", obj={})
+    _load(DEFAULT_COMMAND)(obj={})
+
+
+if __name__ == "__main__":
+    start()
@@ -0,0 +1,142 @@
+"""This class allows to be notified when the keycloak configuration file changes, so that
+a fetcher can reload it without being restarted.
+On Linux the directory of the file is watched with inotify (through ctypes, editors
+usually replacing the file instead of writing it in place), otherwise the file status is
+polled. In both cases the callback is only called when the modification time, size or
+inode of the file changed.
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+from typing import Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 2.0
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# wd, mask, cookie, name length
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        status = os.stat(path)
+    except OSError:
+        return None
+    return status.st_mtime_ns, status.st_size, status.st_ino
+
+
+def _inotify_watch(directory: str) -> Optional[int]:
+    """
+    Return an inotify file descriptor watching the changes of the directory entries,
+    or None if inotify is not available.
+    """
+    library_path = ctypes.util.find_library("c")
+    if library_path is None:
+        return None
+    try:
+        libc = ctypes.CDLL(library_path, use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+class ConfigWatcher(threading.Thread):
+    """
+    A class to represent the thread calling 'on_change' when a file changes.
+
+    Attributes
+    ----------
+    path : str
+        Path of the watched file.
+    mode : str
+        'inotify' or 'poll'.
+    """
+
+    def __init__(self, path: str, on_change: Callable[[], None],
+                 poll_interval: float = DEFAULT_POLL_INTERVAL, use_inotify: bool = True):
+        threading.Thread.__init__(self, name=f"ConfigWatcher({path})")
+        self.daemon = True
+        self.path = os.path.abspath(path)
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.stopped = threading.Event()
+        self._signature = _file_signature(self.path)
+        self._inotify_fd = _inotify_watch(os.path.dirname(self.path)) if use_inotify else None
+        self.mode = "poll" if self._inotify_fd is None else "inotify"
+        # written by 'stop' to wake up the thread waiting for inotify events
+        self._wakeup_read, self._wakeup_write = os.pipe() \
+            if self._inotify_fd is not None else (None, None)
+
+    def stop(self, wait: bool = False):
+        if not self.stopped.is_set():
+            self.stopped.set()
+            if self._wakeup_write is not None:
+                os.write(self._wakeup_write, b"\0")
+                os.close(self._wakeup_write)
+        if wait and self.is_alive() and self is not threading.current_thread():
+            self.join()
+
+    def run(self):
+        try:
+            while not self.stopped.is_set():
+                if self._inotify_fd is None:
+                    self.stopped.wait(self.poll_interval)
+                elif not self._wait_for_event():
+                    continue
+                if not self.stopped.is_set():
+                    self._check()
+        finally:
+            if self._inotify_fd is not None:
+                os.close(self._inotify_fd)
+                os.close(self._wakeup_read)
+                self._inotify_fd = None
+
+    def _wait_for_event(self) -> bool:
+        """
+        Wait for an event about the watched file, the stop event being checked at every
+        poll interval.
+        """
+        readable, _, _ = select.select(
+            [self._inotify_fd, self._wakeup_read], [], [], self.poll_interval
+        )
+        if self._inotify_fd not in readable:
+            return False
+        name = os.fsencode(os.path.basename(self.path))
+        data = os.read(self._inotify_fd, 64 * 1024)
+        offset, found = 0, False
+        while offset < len(data):
+            _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            found = found or data[offset:offset + length].rstrip(b"\0") == name
+            offset += length
+        return found
+
+    def _check(self):
+        signature = _file_signature(self.path)
+        if signature is None or signature == self._signature:
+            return
+        self._signature = signature
+        try:
+            self.on_change()
+        except Exception as error:  # pylint: disable=broad-except
+            logger.warning("⚠️  Reloading %s failed: %s", self.path, error)
@@ -0,0 +1,162 @@
+"""This class allows a user token fetcher to authenticate again without prompting, when
+its keycloak session reaches the SSO session maximum of the realm: the password is
+obtained from a provider chosen by the user, only at the time it is needed.
+The providers read it from a key of the Linux kernel keyring, from an inherited file
+descriptor or from an agent answering on a Unix socket. Giving a provider to a fetcher
+is the consent of the user to such background re-authentications.
+"""
+import os
+import socket
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from blue_brain_token_fetch.token_store import KeyringTokenStore
+
+DEFAULT_PASSWORD_KEY = "nexus_password"
+
+
+class CredentialProvider(ABC):
+    """
+    A class to represent the source of the password of a user.
+    """
+
+    name = None
+
+    @abstractmethod
+    def get_password(self, username: str) -> str:
+        """
+        Return the password of the user.
+        """
+
+    @abstractmethod
+    def location(self) -> str:
+        """
+        Return a description of the source of the password, for the log messages.
+        """
+
+
+class StaticCredentialProvider(CredentialProvider):
+    """
+    Keep the password in memory.
+    """
+
+    name = "static"
+
+    def __init__(self, password: str):
+        self._password = password
+
+    def get_password(self, username: str) -> str:
+        return self._password
+
+    def location(self) -> str:
+        return "memory"
+
+
+class KeyringCredentialProvider(CredentialProvider):
+    """
+    Read the password from a 'user' key of a Linux kernel keyring, added beforehand with
+    'keyctl add user nexus_password PASSWORD @u'.
+    """
+
+    name = "keyring"
+
+    def __init__(self, description: Optional[str] = None, keyring: str = "@u"):
+        self._store = KeyringTokenStore(description or DEFAULT_PASSWORD_KEY, keyring)
+
+    def get_password(self, username: str) -> str:
+        return self._store.read()
+
+    def location(self) -> str:
+        return self._store.location()
+
+
+class FileDescriptorCredentialProvider(CredentialProvider):
+    """
+    Read the password from an inherited file descriptor (ex: 'fd:3' with '3<password_file'
+    in the shell). A regular file is read again at each call, while the content of a
+    pipe, which can only be read once, is kept in memory.
+    """
+
+    name = "fd"
+
+    def __init__(self, fd: int):
+        self.fd = fd
+        self._password: Optional[str] = None
+
+    def get_password(self, username: str) -> str:
+        try:
+            os.lseek(self.fd, 0, os.SEEK_SET)
+            seekable = True
+        except OSError:
+            seekable = False
+            if self._password is not None:
+                return self._password
+
+        chunks = []
+        while True:
+            chunk = os.read(self.fd, 4096)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        password = b"".join(chunks).decode().rstrip("\n")
+        if not password:
+            raise ValueError(f"⚠️  ValueError. No password could be read from the fd {self.fd}")
+        if not seekable:
+            self._password = password
+        return password
+
+    def location(self) -> str:
+        return f"file descriptor {self.fd}"
+
+
+class AgentCredentialProvider(CredentialProvider):
+    """
+    Ask the password to an agent listening on a Unix socket: the username is sent on a
+    line and the agent answers the password before closing the connection.
+    """
+
+    name = "agent"
+
+    def __init__(self, path: str, timeout: float = 10):
+        self.path = path
+        self.timeout = timeout
+
+    def get_password(self, username: str) -> str:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.settimeout(self.timeout)
+            connection.connect(self.path)
+            connection.sendall(f"{username}\n".encode())
+            connection.shutdown(socket.SHUT_WR)
+            chunks = []
+            while True:
+                chunk = connection.recv(4096)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        password = b"".join(chunks).decode().rstrip("\n")
+        if not password:
+            raise ValueError(
+                f"⚠️  ValueError. The agent of {self.path} gave no password for {username}"
+            )
+        return password
+
+    def location(self) -> str:
+        return f"agent {self.path}"
+
+
+def make_credential_provider(spec: str) -> CredentialProvider:
+    """
+    Return the credential provider given as 'keyring[:DESCRIPTION]', 'fd:NUMBER' or
+    'agent:SOCKET_PATH'.
+    """
+    name, _, argument = spec.partition(":")
+    if name == KeyringCredentialProvider.name:
+        return KeyringCredentialProvider(argument or None)
+    if name == FileDescriptorCredentialProvider.name and argument.isdigit():
+        return FileDescriptorCredentialProvider(int(argument))
+    if name == AgentCredentialProvider.name and argument:
+        return AgentCredentialProvider(argument)
+    raise ValueError(
+        f"⚠️  ValueError. Invalid credential provider '{spec}', expected "
+        "keyring[:DESCRIPTION], fd:NUMBER or agent:SOCKET_PATH"
+    )
@@ -0,0 +1,198 @@
+"""This class allows a fetcher to use several equivalent keycloak servers (replicas of the
+same cluster, sharing their sessions), given as a list of 'SERVER_URL' in the keycloak
+configuration file.
+Every request goes to the healthy server with the lowest latency, measured on the
+requests themselves and on light probes of the OpenID configuration endpoint. A server
+that cannot be reached or answers with a server error is set aside for a while and the
+request is sent to the next one, so that the outage of a replica is not seen by the
+fetcher.
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Union
+
+from keycloak import KeycloakOpenID
+from keycloak.exceptions import KeycloakConnectionError, KeycloakError
+
+from blue_brain_token_fetch.tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROBE_INTERVAL = 30
+DEFAULT_RETRY_AFTER = 30
+
+
+def server_urls(keycloak_config: Dict) -> List[str]:
+    """
+    Return the list of the server URLs of the configuration, given as a single URL or as
+    a list of equivalent ones.
+    """
+    urls: Union[str, List[str]] = keycloak_config["SERVER_URL"]
+    if isinstance(urls, str):
+        return [urls]
+    if not urls:
+        raise ValueError("⚠️  ValueError. The list of keycloak server URLs is empty")
+    return list(urls)
+
+
+def is_server_failure(error: Exception) -> bool:
+    """
+    Whether another server may succeed where this one failed: connection errors and
+    server errors, as opposed to the rejections of the request itself.
+    """
+    if isinstance(error, KeycloakConnectionError):
+        return True
+    return isinstance(error, KeycloakError) and (error.response_code or 0) >= 500
+
+
+class Endpoint:
+    """
+    A class to represent one keycloak server of a pool.
+
+    Attributes
+    ----------
+    url : str
+        URL of the server.
+    latency : float
+        Moving average of the response times, in seconds, None before the first one.
+    failures : int
+        Number of consecutive failures.
+    down_until : float
+        Monotonic time before which the server is not used anymore.
+    """
+
+    __slots__ = ("instance", "url", "latency", "failures", "down_until")
+
+    def __init__(self, instance: KeycloakOpenID, url: str):
+        self.instance = instance
+        self.url = url
+        self.latency: Optional[float] = None
+        self.failures = 0
+        self.down_until = 0.0
+
+    def is_healthy(self, now: float) -> bool:
+        return self.down_until <= now
+
+    def record_success(self, latency: float, smoothing: float):
+        self.latency = latency if self.latency is None \
+            else smoothing * latency + (1 - smoothing) * self.latency
+        self.failures = 0
+        self.down_until = 0.0
+
+    def record_failure(self, retry_after: float):
+        self.failures += 1
+        # servers failing repeatedly are retried less often
+        self.down_until = time.monotonic() + retry_after * min(self.failures, 10)
+
+
+class EndpointPool:
+    """
+    A class to represent a set of equivalent keycloak servers, used in place of a single
+    KeycloakOpenID instance.
+    """
+
+    def __init__(self, instances: List[KeycloakOpenID], smoothing: float = 0.3,
+                 retry_after: float = DEFAULT_RETRY_AFTER):
+        if not instances:
+            raise ValueError("⚠️  ValueError. An endpoint pool needs at least one server")
+        self.endpoints = [
+            Endpoint(instance, instance.connection.base_url) for instance in instances
+        ]
+        self.smoothing = smoothing
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+
+    def ranked(self) -> List[Endpoint]:
+        """
+        Return the healthy servers by increasing latency (the ones never measured first,
+        to measure them), then the unhealthy ones as a last resort.
+        """
+        now = time.monotonic()
+        with self._lock:
+            endpoints = list(self.endpoints)
+        healthy = sorted(
+            (endpoint for endpoint in endpoints if endpoint.is_healthy(now)),
+            key=lambda endpoint: -1 if endpoint.latency is None else endpoint.latency
+        )
+        unhealthy = sorted(
+            (endpoint for endpoint in endpoints if not endpoint.is_healthy(now)),
+            key=lambda endpoint: endpoint.down_until
+        )
+        return healthy + unhealthy
+
+    @property
+    def best(self) -> Endpoint:
+        return self.ranked()[0]
+
+    def _call(self, method: str, *args, **kwargs):
+        error = None
+        for attempt, endpoint in enumerate(self.ranked()):
+            if attempt:
+                # the number of servers tried before, on the span of the grant
+                current_span().set_attribute("retry_count", attempt)
+            start = time.monotonic()
+            try:
+                result = getattr(endpoint.instance, method)(*args, **kwargs)
+            except Exception as request_error:  # pylint: disable=broad-except
+                if not is_server_failure(request_error):
+                    raise
+                with self._lock:
+                    endpoint.record_failure(self.retry_after)
+                logger.warning(
+                    "⚠️  Keycloak server %s failed (%s), trying the next one",
+                    endpoint.url, request_error
+                )
+                error = request_error
+                continue
+            with self._lock:
+                endpoint.record_success(time.monotonic() - start, self.smoothing)
+            return result
+        raise error
+
+    def token(self, *args, **kwargs) -> Dict:
+        return self._call("token", *args, **kwargs)
+
+    def refresh_token(self, *args, **kwargs) -> Dict:
+        return self._call("refresh_token", *args, **kwargs)
+
+    def exchange_token(self, *args, **kwargs) -> Dict:
+        return self._call("exchange_token", *args, **kwargs)
+
+    def well_known(self) -> Dict:
+        return self._call("well_known")
+
+    def probe(self):
+        """
+        Measure the response time of every server on its OpenID configuration endpoint,
+        and set aside the failing ones.
+        """
+        for endpoint in list(self.endpoints):
+            start = time.monotonic()
+            try:
+                endpoint.instance.well_known()
+            except Exception as error:  # pylint: disable=broad-except
+                with self._lock:
+                    endpoint.record_failure(self.retry_after)
+                logger.debug("Keycloak server %s failed its probe: %s", endpoint.url, error)
+                continue
+            with self._lock:
+                endpoint.record_success(time.monotonic() - start, self.smoothing)
+
+    def stats(self) -> List[Dict]:
+        now = time.monotonic()
+        return [
+            {
+                "url": endpoint.url,
+                "healthy": endpoint.is_healthy(now),
+                "latency": endpoint.latency,
+                "failures": endpoint.failures,
+            }
+            for endpoint in self.ranked()
+        ]
+
+    def __getattr__(self, name):
+        # the other attributes (connection, realm_name...) are the ones of the best server
+        if name.startswith("_") or name == "endpoints":
+            raise AttributeError(name)
+        return getattr(self.best.instance, name)
@@ -0,0 +1,284 @@
+"""
+This CLI allows to run a command with a Nexus access token kept fresh for its whole
+duration: it authenticates once, starts the command with the location of the token in
+its environment, refreshes the token while the command runs, forwards the signals it
+receives to the command and exits with the exit code of the command. The command stays in
+the foreground process group, so it gets the interrupt and quit signals of the terminal
+(Ctrl-C, Ctrl-\\) directly, which are not forwarded a second time.
+The token is available to the command in a file (NEXUS_TOKEN_FILE), optionally through a
+Unix socket answering the current token to each connection (NEXUS_TOKEN_SOCKET) and, for
+the commands not running longer than the token life span, in the NEXUS_TOKEN variable.
+"""
+import errno
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+from typing import Callable, Dict, List, Optional
+
+import click
+
+from blue_brain_token_fetch.credential_provider import make_credential_provider
+from blue_brain_token_fetch.duration_converter import convert_duration_to_sec
+from blue_brain_token_fetch.nexus_token_fetch import shortened_refresh_period
+from blue_brain_token_fetch.token_fetcher_base import TokenFetcherBase
+from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
+from blue_brain_token_fetch.token_fetcher_user import TokenFetcherUser
+from blue_brain_token_fetch.token_sink import TokenSink, write_sinks
+from blue_brain_token_fetch.token_store import TMPFS_DIRECTORY, FileTokenStore
+
+L = logging.getLogger(__name__)
+
+TOKEN_FILE_VARIABLE = "NEXUS_TOKEN_FILE"
+TOKEN_SOCKET_VARIABLE = "NEXUS_TOKEN_SOCKET"
+TOKEN_VARIABLE = "NEXUS_TOKEN"
+
+FORWARDED_SIGNALS = [signal.SIGTERM, signal.SIGHUP, signal.SIGUSR1, signal.SIGUSR2]
+# sent by the terminal to the whole foreground process group, the command included
+TERMINAL_SIGNALS = [signal.SIGINT, signal.SIGQUIT]
+
+
+class TokenSocketServer(threading.Thread):
+    """
+    A thread answering the current access token to each connection to a Unix socket.
+    """
+
+    def __init__(self, path: str, get_token: Callable[[], str]):
+        threading.Thread.__init__(self, name=f"TokenSocketServer({path})")
+        self.daemon = True
+        self.path = path
+        self.get_token = get_token
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(path)
+        os.chmod(path, 0o600)
+        self._socket.listen()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                connection, _ = self._socket.accept()
+            except OSError:
+                break
+            with connection:
+                try:
+                    connection.sendall(self.get_token().encode())
+                except OSError:
+                    pass
+
+    def stop(self):
+        self._stopped.set()
+        try:
+            # wakes up the accept call of the thread
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+        self.join()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _default_token_file() -> str:
+    directory = TMPFS_DIRECTORY if os.path.isdir(TMPFS_DIRECTORY) else None
+    fd, path = tempfile.mkstemp(prefix="nexus_token_", dir=directory)
+    os.close(fd)
+    return path
+
+
+def _exit_code(returncode: int) -> int:
+    # a command killed by a signal exits like in a shell
+    return 128 - returncode if returncode < 0 else returncode
+
+
+def _start_error_code(error: OSError) -> int:
+    # like in a shell: 126 for a command found but not executable, 127 if not found
+    if isinstance(error, PermissionError) or error.errno == errno.ENOEXEC:
+        return 126
+    return 127
+
+
+def run_with_token(fetcher: TokenFetcherBase, command: List[str], token_file: str,
+                   refresh_period: float, token_socket: Optional[str] = None,
+                   env_token: bool = False) -> int:
+    """
+    Run the command with the access token of the fetcher written in 'token_file' and
+    refreshed every 'refresh_period' seconds (shortened to half the token life span if
+    longer, as in the main command), forward the signals received to it and return its
+    exit code, or the one of a shell if it cannot be started.
+    """
+    sinks = [TokenSink(FileTokenStore(token_file))]
+    access_token = fetcher.get_valid_access_token(refresh_period + fetcher.TOKEN_REFRESH_MARGIN)
+    half_life_span = shortened_refresh_period(refresh_period, fetcher.time_to_expiry())
+    if half_life_span is not None:
+        L.info(
+            f"The refresh period (= {refresh_period:g} seconds) is greater than half the "
+            f"access token life span, it becomes {half_life_span:g} seconds."
+        )
+        refresh_period = half_life_span
+    # the token written stays valid until the next refresh
+    min_validity = refresh_period + fetcher.TOKEN_REFRESH_MARGIN
+    write_sinks(sinks, access_token, fetcher.expires_at())
+
+    env: Dict[str, str] = dict(os.environ, **{TOKEN_FILE_VARIABLE: token_file})
+    if env_token:
+        env[TOKEN_VARIABLE] = access_token
+    server = None
+    if token_socket is not None:
+        server = TokenSocketServer(
+            token_socket, lambda: fetcher.get_valid_access_token(fetcher.TOKEN_REFRESH_MARGIN)
+        )
+        server.start()
+        env[TOKEN_SOCKET_VARIABLE] = token_socket
+
+    try:
+        try:
+            child = subprocess.Popen(command, env=env)
+        except OSError as e:
+            L.error(f"Error: {e}")
+            return _start_error_code(e)
+
+        def forward(signum, _frame):
+            L.debug(f"Forwarding the signal {signum} to the command")
+            child.send_signal(signum)
+
+        previous_handlers = {
+            signum: signal.signal(signum, forward) for signum in FORWARDED_SIGNALS
+        }
+        # the command already got them, only its exit code ends the wait
+        previous_handlers.update({
+            signum: signal.signal(signum, signal.SIG_IGN) for signum in TERMINAL_SIGNALS
+        })
+        try:
+            while True:
+                try:
+                    return _exit_code(child.wait(timeout=refresh_period))
+                except subprocess.TimeoutExpired:
+                    pass
+                try:
+                    access_token = fetcher.get_valid_access_token(min_validity)
+                    write_sinks(sinks, access_token, fetcher.expires_at())
+                except Exception as e:  # pylint: disable=broad-except
+                    # the current token may still be valid, retried at the next period
+                    L.warning(f"⚠️  The token could not be refreshed: {e}")
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+    finally:
+        if server is not None:
+            server.stop()
+
+
+@click.command(
+    "exec", context_settings={"ignore_unknown_options": True, "allow_interspersed_args": False}
+)
+@click.argument("command", nargs=-1, required=True, type=click.UNPROCESSED)
+@click.option(
+    "--username",
+    prompt=True,
+    default=lambda: os.environ.get("USER", ""),
+    help="Username (or client identifier of a service account) to request the access token",
+)
+@click.option(
+    "--password",
+    prompt=True,
+    hide_input=True,
+    help="Password (or client secret of a service account) to request the access token",
+)
+@click.option("--service", "-s", count=False,
+              help="Whether the account is a service account or not")
+@click.option(
+    "--keycloak-config-file",
+    "-kcf",
+    type=click.Path(exists=True),
+    help="The path to the yaml file containing the keycloak configuration.",
+)
+@click.option(
+    "--config-profile",
+    help=(
+        "Profile of the keycloak configuration file (ex: dev, prod), its default profile "
+        "if not given."
+    ),
+)
+@click.option(
+    "--refresh-period",
+    "-rp",
+    default="15",
+    show_default=True,
+    help="Duration between two refreshes of the token file. Ex: '-rp 30', '-rp 0.5min'",
+)
+@click.option(
+    "--token-file",
+    type=click.Path(),
+    help=(
+        f"File where the token is written, given to the command as ${TOKEN_FILE_VARIABLE}. "
+        f"A temporary file of {TMPFS_DIRECTORY} removed at exit by default."
+    ),
+)
+@click.option(
+    "--socket",
+    "token_socket",
+    type=click.Path(),
+    help=(
+        "Path of a Unix socket answering the current token to each connection, given to "
+        f"the command as ${TOKEN_SOCKET_VARIABLE}."
+    ),
+)
+@click.option(
+    "--env-token",
+    is_flag=True,
+    default=False,
+    help=(
+        f"Also give the token to the command as ${TOKEN_VARIABLE}, which is not refreshed: "
+        "for the commands running shorter than the token life span only."
+    ),
+)
+@click.option(
+    "--credential-provider",
+    help=(
+        "Source of the password used to authenticate again before the keycloak session "
+        "reaches its maximum duration: 'keyring[:DESCRIPTION]', 'fd:NUMBER' or "
+        "'agent:SOCKET_PATH'."
+    ),
+)
+def exec_command(command, username, password, service, keycloak_config_file,
+                 config_profile, refresh_period, token_file, token_socket, env_token,
+                 credential_provider):
+    """
+    Run COMMAND (given after '--') with a Nexus access token refreshed while it runs, and
+    exit with its exit code.
+    """
+    try:
+        refresh_period = convert_duration_to_sec(refresh_period)
+        init_cls = TokenFetcherService if service else TokenFetcherUser
+        # a service account gets a new token with its secret whenever needed
+        extra = {} if service or not credential_provider else {
+            "credential_provider": make_credential_provider(credential_provider)
+        }
+        fetcher = init_cls(
+            username, password, keycloak_config_file, config_profile=config_profile, **extra
+        )
+    except Exception as e:
+        L.error(f"Error: {e}")
+        sys.exit(1)
+
+    temporary_file = token_file is None
+    token_file = token_file or _default_token_file()
+    try:
+        returncode = run_with_token(
+            fetcher, list(command), token_file, refresh_period, token_socket, env_token
+        )
+    except Exception as e:
+        # ex: the token file or the socket cannot be created
+        L.error(f"Error: {e}")
+        returncode = 1
+    finally:
+        fetcher.close()
+        if temporary_file and os.path.exists(token_file):
+            os.remove(token_file)
+
+    sys.exit(returncode)
@@ -0,0 +1,257 @@
+"""
+This CLI allows the one-shot fetching of the Nexus access tokens of many service
+accounts at once, using 'client_credentials' grants run concurrently.
+The service identities are read from a YAML (or JSON) file containing a list of
+entries with a 'client_id', a secret source ('secret', 'secret_env' or 'secret_file')
+and an optional 'keycloak_config_file'.
+Results are streamed as JSON lines as soon as each grant finishes, failures being
+reported per identity without aborting the batch.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+import click
+import yaml
+
+from blue_brain_token_fetch.duration_converter import convert_duration_to_sec
+from blue_brain_token_fetch.rate_limiter import DEFAULT_BURST, DEFAULT_RATE, configure_rate_limit
+from blue_brain_token_fetch.token_fetcher_base import TokenFetcherBase
+from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
+
+L = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 30
+
+
+class ServiceIdentity(NamedTuple):
+    """
+    A service account identity and the source of its secret.
+    """
+    client_id: str
+    secret: Optional[str] = None
+    secret_env: Optional[str] = None
+    secret_file: Optional[str] = None
+    keycloak_config_file: Optional[str] = None
+
+    def resolve_secret(self) -> str:
+        if self.secret is not None:
+            return self.secret
+        if self.secret_env is not None:
+            if self.secret_env not in os.environ:
+                raise KeyError(f"⚠️  KeyError. Environment variable {self.secret_env} is not set")
+            return os.environ[self.secret_env]
+        if self.secret_file is not None:
+            with open(self.secret_file) as secret_file:
+                return secret_file.read().strip()
+        raise ValueError(
+            f"⚠️  ValueError. No secret source given for the client {self.client_id}: one "
+            "of 'secret', 'secret_env' or 'secret_file' is expected"
+        )
+
+
+def load_identities(identities_file: str,
+                    keycloak_config_file: Optional[str] = None) -> List[ServiceIdentity]:
+    """
+    Load the list of service identities from a YAML or JSON file ('-' for stdin).
+    'keycloak_config_file' is used for the entries not giving their own, and defaults
+    to the one of the main command (see TokenFetcherBase._config_file_path), so that
+    both find the same configuration of the $HOME directory.
+    """
+    if identities_file == "-":
+        content = yaml.safe_load(sys.stdin.read())
+    else:
+        with open(identities_file) as input_file:
+            content = yaml.safe_load(input_file.read())
+
+    if not isinstance(content, list):
+        raise ValueError("⚠️  ValueError. The identities file must contain a list of entries")
+
+    identities = []
+    for entry in content:
+        try:
+            identity = ServiceIdentity(**entry)
+        except TypeError as error:
+            raise ValueError(f"⚠️  ValueError. Invalid identity {entry}: {error}") from error
+        if identity.keycloak_config_file is None:
+            identity = identity._replace(
+                keycloak_config_file=TokenFetcherBase._config_file_path(keycloak_config_file)
+            )
+        identities.append(identity)
+
+    return identities
+
+
+class _ConfigCache:
+    """
+    Load each keycloak configuration file once for the whole batch.
+    """
+
+    def __init__(self):
+        self._configs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def get(self, keycloak_config_file: str) -> Dict:
+        with self._lock:
+            if keycloak_config_file not in self._configs:
+                self._configs[keycloak_config_file] = \
+                    TokenFetcherService._load_keycloak_config(keycloak_config_file)
+            return self._configs[keycloak_config_file]
+
+
+def _fetch(index: int, identity: ServiceIdentity, configs: _ConfigCache,
+           started: Dict[int, float], timeout: float) -> Dict:
+    started[index] = time.monotonic()
+    keycloak_config = configs.get(identity.keycloak_config_file)
+    # the HTTP requests themselves are bounded, so that a late grant frees its worker
+    keycloak_config = dict(
+        keycloak_config, TIMEOUT=min(timeout, keycloak_config.get("TIMEOUT") or timeout)
+    )
+    fetcher = TokenFetcherService(
+        identity.client_id,
+        identity.resolve_secret(),
+        keycloak_config=keycloak_config
+    )
+    try:
+        return {
+            "access_token": fetcher.snapshot().access_token,
+            "expires_in": fetcher.get_access_token_duration(),
+            "expires_at": fetcher.expires_at(),
+        }
+    finally:
+        # a one-shot fetch, the refreshing of the token is not needed
+        fetcher.close()
+
+
+def fetch_many(identities: List[ServiceIdentity], concurrency: int = DEFAULT_CONCURRENCY,
+               timeout: float = DEFAULT_TIMEOUT) -> Iterator[Dict]:
+    """
+    Run the 'client_credentials' grants of the given identities with at most
+    'concurrency' grants in flight, and yield one result per identity as soon as it
+    is available. A grant running for more than 'timeout' seconds is reported as
+    failed, its late result being discarded, and each keycloak request is given up
+    after 'timeout' seconds.
+    """
+    configs = _ConfigCache()
+    started: Dict[int, float] = {}
+    timed_out = False
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        pending = {
+            executor.submit(_fetch, index, identity, configs, started, timeout):
+                (index, identity)
+            for index, identity in enumerate(identities)
+        }
+        while pending:
+            done, _ = wait(pending, timeout=min(timeout, 1), return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+
+            for future in done:
+                index, identity = pending.pop(future)
+                result = {
+                    "client_id": identity.client_id,
+                    "elapsed": round(now - started.get(index, now), 6),
+                }
+                try:
+                    result.update(status="ok", **future.result())
+                except Exception as error:  # pylint: disable=broad-except
+                    result.update(status="error", error=f"{error.__class__.__name__}: {error}")
+                yield result
+
+            for future, (index, identity) in list(pending.items()):
+                if index in started and now - started[index] > timeout:
+                    del pending[future]
+                    timed_out = True
+                    yield {
+                        "client_id": identity.client_id,
+                        "elapsed": round(now - started[index], 6),
+                        "status": "error",
+                        "error": f"TimeoutError: no token after {timeout:g} seconds",
+                    }
+    finally:
+        # do not wait for the grants running late or abandoned by the caller
+        executor.shutdown(wait=not (pending or timed_out))
+
+
+@click.command("fetch-many")
+@click.argument("identities_file", type=click.Path(allow_dash=True))
+@click.option(
+    "--concurrency",
+    "-c",
+    default=DEFAULT_CONCURRENCY,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Maximum number of grants run at the same time.",
+)
+@click.option(
+    "--timeout",
+    "-to",
+    default=str(DEFAULT_TIMEOUT),
+    show_default=True,
+    help=(
+        "Maximum duration of each grant. It can be expressed as number of seconds or by "
+        "using time unit : '{float}{time unit}'. Ex: '-to 30', '-to 0.5min'"
+    ),
+)
+@click.option(
+    "--keycloak-config-file",
+    "-kcf",
+    type=click.Path(exists=True),
+    help=(
+        "The keycloak configuration file used by the identities not giving their own, "
+        "the default one of the main command if not provided."
+    ),
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.File("w"),
+    default="-",
+    help="File where the JSON lines are written, the console output by default.",
+)
+@click.option(
+    "--rate-limit",
+    default=DEFAULT_RATE,
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help=(
+        "Maximum number of requests per second sent to each keycloak realm, 0 for no "
+        "limit. The grants exceeding it wait for their turn."
+    ),
+)
+@click.option(
+    "--rate-limit-burst",
+    default=DEFAULT_BURST,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of requests that can be sent at once within the rate limit.",
+)
+def fetch_many_command(identities_file, concurrency, timeout, keycloak_config_file, output,
+                       rate_limit, rate_limit_burst):
+    """
+    Fetch the access tokens of all the service accounts listed in IDENTITIES_FILE and
+    print one JSON line per account as soon as its grant finishes. The exit code is 1
+    if at least one grant failed.
+    """
+    try:
+        timeout = convert_duration_to_sec(timeout)
+        identities = load_identities(identities_file, keycloak_config_file)
+    except Exception as e:
+        L.error(f"Error: {e}")
+        sys.exit(1)
+    configure_rate_limit(rate_limit or None, rate_limit_burst)
+
+    failures = 0
+    for result in fetch_many(identities, concurrency, timeout):
+        failures += result["status"] != "ok"
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+
+    sys.exit(1 if failures else 0)
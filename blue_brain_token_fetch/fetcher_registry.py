@@ -0,0 +1,176 @@
+"""This module allows the libraries of a process to share one token fetcher per identity
+(server, realm, client and user) instead of each creating their own: 'get_fetcher'
+returns a handle on the fetcher of the identity, created by the first call only, and
+the fetcher is closed when the last handle is released. Each identity thus costs one
+keycloak session and one refresh thread per process, whatever the number of its users.
+"""
+import getpass
+import hashlib
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from blue_brain_token_fetch.token_fetcher_base import TokenFetcherBase
+from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
+from blue_brain_token_fetch.token_fetcher_user import TokenFetcherUser
+
+# service account or not, server URL, realm, client identifier, username
+Identity = Tuple[bool, str, str, str, Optional[str]]
+
+_SALT = os.urandom(16)
+
+
+def _digest(secret: str) -> bytes:
+    return hashlib.sha256(_SALT + secret.encode()).digest()
+
+
+class _Entry:
+    """
+    The fetcher of an identity, its number of handles and the digest of its secret.
+    """
+
+    __slots__ = ("fetcher", "references", "secret_digest", "lock")
+
+    def __init__(self):
+        self.fetcher: Optional[TokenFetcherBase] = None
+        self.references = 0
+        self.secret_digest: Optional[bytes] = None
+        self.lock = threading.Lock()
+
+
+_entries: Dict[Identity, _Entry] = {}
+_lock = threading.Lock()
+
+
+class SharedFetcher:
+    """
+    A class to represent a handle on the fetcher shared by the users of an identity. It
+    gives access to all the methods of the fetcher, 'close' (or the exit of a 'with'
+    block) releasing the handle instead of closing the fetcher.
+    """
+
+    def __init__(self, identity: Identity, fetcher: TokenFetcherBase):
+        self._identity = identity
+        self._fetcher = fetcher
+        self._released = False
+        self._release_lock = threading.Lock()
+
+    @property
+    def fetcher(self) -> TokenFetcherBase:
+        return self._fetcher
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self._fetcher, name)
+
+    def __enter__(self) -> "SharedFetcher":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        """
+        Release the handle, the fetcher being closed with the last one. Closing it again,
+        from any thread, does nothing.
+        """
+        with self._release_lock:
+            if self._released:
+                return
+            self._released = True
+        _release(self._identity)
+
+
+def _identity(server_url: str, realm: str, client_id: str, username: Optional[str],
+              service: bool) -> Identity:
+    return service, server_url.rstrip("/"), realm, client_id, None if service else username
+
+
+def _resolve_credentials(username: Optional[str], password: Optional[str],
+                         service: bool) -> Tuple[Optional[str], str]:
+    """
+    Return the credentials the fetcher is created with, prompting for the missing ones
+    as the fetchers do.
+    """
+    if password is not None:
+        return username, password
+    if service:
+        return username, getpass.getpass("Client secret: ")
+    if username is None:
+        return TokenFetcherBase._get_credentials(None, None)
+    return username, getpass.getpass(f"Password of {username}: ")
+
+
+def get_fetcher(server_url: str, realm: str, client_id: str, username: Optional[str] = None,
+                password: Optional[str] = None, service: bool = False,
+                client_secret: Optional[str] = None) -> SharedFetcher:
+    """
+    Return a handle on the fetcher of the identity, creating it on the first call.
+
+    For a user, 'password' authenticates 'username' with the public client 'client_id'
+    ('client_secret' for a confidential one). For a service account ('service=True'),
+    'password' is the secret of the client 'client_id' and 'username' is not used.
+    The password is prompted for when not given and the fetcher is created. The identity
+    is kept whatever the password, but a handle is refused if the given password is not
+    the one the fetcher was created with, given or prompted for.
+    """
+    identity = _identity(server_url, realm, client_id, username, service)
+    with _lock:
+        entry = _entries.setdefault(identity, _Entry())
+        entry.references += 1
+
+    try:
+        with entry.lock:
+            if entry.fetcher is None:
+                username, password = _resolve_credentials(username, password, service)
+                keycloak_config = {
+                    "SERVER_URL": server_url, "REALM_NAME": realm, "CLIENT_ID": client_id,
+                    "CLIENT_PASSWORD": client_secret,
+                }
+                if service:
+                    entry.fetcher = TokenFetcherService(
+                        client_id, password, keycloak_config=keycloak_config
+                    )
+                else:
+                    entry.fetcher = TokenFetcherUser(
+                        username, password, keycloak_config=keycloak_config
+                    )
+                entry.secret_digest = _digest(password)
+            elif password is not None and entry.secret_digest != _digest(password):
+                raise ValueError(
+                    "⚠️  ValueError. The password differs from the one of the shared "
+                    f"fetcher of {identity[4] or identity[3]}"
+                )
+    except BaseException:
+        _release(identity)
+        raise
+
+    return SharedFetcher(identity, entry.fetcher)
+
+
+def _release(identity: Identity):
+    with _lock:
+        entry = _entries[identity]
+        entry.references -= 1
+        if entry.references > 0:
+            return
+        del _entries[identity]
+    if entry.fetcher is not None:
+        entry.fetcher.close()
+
+
+def registered_fetchers() -> List[Dict]:
+    """
+    Return the identities having a shared fetcher, with their number of handles.
+    """
+    with _lock:
+        return [
+            {
+                "service": identity[0], "server_url": identity[1], "realm": identity[2],
+                "client_id": identity[3], "username": identity[4],
+                "references": entry.references,
+            }
+            for identity, entry in _entries.items()
+        ]
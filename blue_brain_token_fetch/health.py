@@ -0,0 +1,192 @@
+"""
+This CLI allows to check the health of a running token fetcher without contacting
+keycloak: the fetcher keeps a small state record (time of the last refresh, expiry of
+the current access token, number of consecutive failures and process id) in a JSON file
+that the 'health' subcommand reads, so that liveness and readiness probes cost a file
+read instead of a keycloak round trip.
+This module must stay light: it is imported by the probes, and neither imports keycloak
+nor the token fetchers.
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import click
+
+from blue_brain_token_fetch.duration_converter import convert_duration_to_sec
+
+L = logging.getLogger(__name__)
+
+# exit codes of the 'health' subcommand
+HEALTHY = 0
+DEGRADED = 1
+EXPIRED = 2
+UNKNOWN = 3
+
+STATUSES = {HEALTHY: "healthy", DEGRADED: "degraded", EXPIRED: "expired", UNKNOWN: "unknown"}
+
+DEFAULT_MIN_VALIDITY = 30
+DEFAULT_MAX_FAILURES = 3
+
+
+class HealthRecorder:
+    """
+    A class to keep the state record of a fetcher up to date, the file being replaced
+    atomically at each change so that a probe never reads a partial record. A record
+    that cannot be written is logged and skipped: it never fails the token request.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state: Dict = {
+            "pid": os.getpid(),
+            "last_refresh": None,
+            "expires_at": None,
+            "consecutive_failures": 0,
+            "last_error": None,
+            "updated_at": None,
+        }
+
+    def record_refresh(self, expires_at: float):
+        """
+        Record a new access token, expiring at 'expires_at'.
+        """
+        with self._lock:
+            self._state.update(
+                last_refresh=time.time(), expires_at=expires_at, consecutive_failures=0,
+                last_error=None,
+            )
+            self._write()
+
+    def record_failure(self, error: BaseException):
+        """
+        Record a failed token request.
+        """
+        with self._lock:
+            self._state["consecutive_failures"] += 1
+            self._state["last_error"] = f"{error.__class__.__name__}: {error}"
+            self._write()
+
+    def _write(self):
+        self._state.update(pid=os.getpid(), updated_at=time.time())
+        try:
+            self._replace_file()
+        except OSError as error:
+            L.warning("⚠️  OSError. Cannot write the state record %s: %s", self.path, error)
+
+    def _replace_file(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temporary_path = tempfile.mkstemp(prefix=".state_", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as state_file:
+                json.dump(self._state, state_file)
+            os.replace(temporary_path, self.path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+
+def read_state(path: str) -> Optional[Dict]:
+    """
+    Return the state record of the file, None if it does not exist or is unreadable.
+    """
+    try:
+        with open(path) as state_file:
+            state = json.load(state_file)
+    except (OSError, ValueError):
+        return None
+    return state if isinstance(state, dict) else None
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # the process exists but belongs to another user
+        return True
+    return True
+
+
+def check_health(state: Optional[Dict], now: Optional[float] = None,
+                 min_validity: float = DEFAULT_MIN_VALIDITY,
+                 max_failures: int = DEFAULT_MAX_FAILURES) -> Tuple[int, str]:
+    """
+    Return the status of a state record and the reason for it:
+    - EXPIRED when the access token has expired,
+    - DEGRADED when it expires in less than 'min_validity' seconds, when the last
+      'max_failures' requests failed or when the fetcher process is not running anymore,
+    - HEALTHY otherwise,
+    - UNKNOWN when there is no record or no token yet.
+    """
+    if state is None:
+        return UNKNOWN, "no state record"
+    expires_at = state.get("expires_at")
+    if expires_at is None:
+        return UNKNOWN, "no access token fetched yet"
+
+    time_to_expiry = expires_at - (time.time() if now is None else now)
+    if time_to_expiry <= 0:
+        return EXPIRED, f"the access token expired {-time_to_expiry:.0f} seconds ago"
+    pid = state.get("pid")
+    if pid is not None and not _is_running(pid):
+        return DEGRADED, f"the fetcher process {pid} is not running"
+    failures = state.get("consecutive_failures", 0)
+    if failures >= max_failures:
+        return DEGRADED, f"{failures} consecutive failures, last: {state.get('last_error')}"
+    if time_to_expiry < min_validity:
+        return DEGRADED, f"the access token expires in {time_to_expiry:.0f} seconds"
+    return HEALTHY, f"the access token expires in {time_to_expiry:.0f} seconds"
+
+
+@click.command("health")
+@click.option(
+    "--state-file",
+    type=click.Path(),
+    help="State record written by the running fetcher (its --state-file option).",
+)
+@click.option(
+    "--min-validity",
+    default=str(DEFAULT_MIN_VALIDITY),
+    show_default=True,
+    help="Remaining validity of the token under which it is degraded. Ex: '30', '1min'",
+)
+@click.option(
+    "--max-failures",
+    default=DEFAULT_MAX_FAILURES,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of consecutive failed requests from which the fetcher is degraded.",
+)
+@click.option("--json", "as_json", is_flag=True, default=False,
+              help="Print the state record and the status as JSON.")
+def health_command(state_file, min_validity, max_failures, as_json):
+    """
+    Check the state record of a running fetcher, without contacting keycloak, and exit
+    with 0 if healthy, 1 if degraded, 2 if the token expired and 3 if unknown.
+    """
+    # a usage error of click exits with 2, the code of an expired token
+    if state_file is None:
+        click.echo("Error: Missing option '--state-file'.", err=True)
+        sys.exit(UNKNOWN)
+    try:
+        min_validity = convert_duration_to_sec(min_validity)
+    except Exception as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(UNKNOWN)
+
+    state = read_state(state_file)
+    status, reason = check_health(state, min_validity=min_validity, max_failures=max_failures)
+    if as_json:
+        click.echo(json.dumps(dict(state or {}, status=STATUSES[status], reason=reason)))
+    else:
+        click.echo(f"{STATUSES[status]}: {reason}")
+    sys.exit(status)
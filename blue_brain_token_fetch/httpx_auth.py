@@ -0,0 +1,39 @@
+"""This class allows to authenticate the requests sent with the 'httpx' library using the
+access token of a token fetcher.
+The token is cached by the fetcher and only refreshed when it is about to expire, so
+that sending a request does not imply any call to Keycloak. When a request is rejected
+with a 401 status, it is sent once more with a freshly fetched token, provided that its
+body is held in memory. A streamed body is not read beforehand, so the 401 response of
+such a request is returned as it is.
+'httpx' is an optional dependency, only imported along with this module.
+"""
+import httpx
+
+from blue_brain_token_fetch.token_fetcher_base import TokenFetcherBase
+
+
+class NexusHttpxAuth(httpx.Auth):
+    """
+    'httpx' authentication adding the Nexus access token as a bearer token. It can be
+    used by both the synchronous and asynchronous clients, keeping in mind that the
+    occasional token refresh is a blocking call.
+
+    Ex: httpx.Client(auth=NexusHttpxAuth(my_token_fetcher))
+    """
+
+    def __init__(self, token_fetcher: TokenFetcherBase,
+                 min_validity: float = TokenFetcherBase.TOKEN_REFRESH_MARGIN):
+        self.token_fetcher = token_fetcher
+        self.min_validity = min_validity
+
+    def auth_flow(self, request):
+        token = self.token_fetcher.get_valid_access_token(self.min_validity)
+        request.headers["Authorization"] = f"Bearer {token}"
+
+        response = yield request
+
+        # only a body held in memory can be sent again, a streamed one is consumed
+        if response.status_code == 401 and isinstance(request.stream, httpx.ByteStream):
+            fresh_token = self.token_fetcher.renew_access_token(token)
+            request.headers["Authorization"] = f"Bearer {fresh_token}"
+            yield request
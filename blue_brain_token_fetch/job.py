@@ -1,17 +1,63 @@
+import logging
+import os
 import threading
 import signal
 from datetime import timedelta
 from typing import Callable, List
 
+L = logging.getLogger(__name__)
+
 
 class InterruptionStack:
     stack: List[Callable] = []
+    _lock = threading.Lock()
+    _handlers_installed = False
 
     @classmethod
     def callable_stack(cls):
-        for c in InterruptionStack.stack:
+        with cls._lock:
+            callables = list(InterruptionStack.stack)
+        for c in callables:
             c()
 
+    @classmethod
+    def push(cls, c: Callable):
+        """Register a callable run on SIGTERM/SIGINT, the signal handlers being installed once"""
+        with cls._lock:
+            InterruptionStack.stack.append(c)
+            if not cls._handlers_installed:
+                try:
+                    signal.signal(signal.SIGTERM, lambda a, b: InterruptionStack.callable_stack())
+                    signal.signal(signal.SIGINT, lambda a, b: InterruptionStack.callable_stack())
+                    cls._handlers_installed = True
+                except ValueError:
+                    # signal handlers can only be installed from the main thread
+                    pass
+
+    @classmethod
+    def remove(cls, c: Callable):
+        with cls._lock:
+            if c in InterruptionStack.stack:
+                InterruptionStack.stack.remove(c)
+
+    @classmethod
+    def _after_fork_in_child(cls):
+        """Forget the jobs of the parent process, whose threads do not exist in the child"""
+        cls._lock = threading.Lock()
+        InterruptionStack.stack = []
+
+
+def run_job_step(execute: Callable) -> bool:
+    """Run one step of a job and return whether it succeeded"""
+    try:
+        execute()
+    except Exception:  # pylint: disable=broad-except
+        # a failed run (ex: keycloak unreachable) is retried at the next interval
+        # instead of ending the thread
+        L.exception("⚠️  The job %s failed", getattr(execute, "__name__", execute))
+        return False
+    return True
+
 
 class Job(threading.Thread):
     def __init__(self, interval, execute):
@@ -27,7 +73,7 @@ class Job(threading.Thread):
 
     def run(self):
         while not self.stopped.wait(self.interval.total_seconds()):
-            self.execute()
+            run_job_step(self.execute)
 
     @staticmethod
     def schedule(execute, interval, interruption_str="") -> Callable:
@@ -39,10 +85,18 @@ class Job(threading.Thread):
             print(f"Program killed: {interruption_str}")
             job.stop()
 
-        InterruptionStack.stack.append(test)
-        signal.signal(signal.SIGTERM, lambda a, b: InterruptionStack.callable_stack())
-        signal.signal(signal.SIGINT, lambda a, b: InterruptionStack.callable_stack())
+        InterruptionStack.push(test)
 
         job.start()
 
-        return lambda: job.stop()
+        def interrupt(wait=False):
+            InterruptionStack.remove(test)
+            job.stop()
+            if wait and job is not threading.current_thread():
+                job.join()
+
+        return interrupt
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=InterruptionStack._after_fork_in_child)
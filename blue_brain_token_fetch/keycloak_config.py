@@ -0,0 +1,227 @@
+"""This module allows a keycloak configuration file to hold several named profiles (ex: the
+dev, staging and prod realms), each with optional 'user' and 'service' sections
+overriding its settings for the corresponding kind of account:
+
+    default: prod
+    profiles:
+      dev:
+        SERVER_URL: https://dev.example.org/auth/
+        REALM_NAME: DEV
+        user:
+          CLIENT_ID: nexus-cli
+      prod:
+        SERVER_URL: https://example.org/auth/
+        REALM_NAME: BBP
+        CLIENT_ID: nexus-cli
+
+A file without a 'profiles' key is the flat configuration of a single profile named
+'default'. Each file is parsed and validated once per process: the parsed content is
+cached with the modification time and size of the file, and only parsed again when they
+change.
+"""
+import os
+import threading
+from numbers import Real
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import yaml
+
+DEFAULT_PROFILE = "default"
+SECTIONS = ("user", "service")
+
+
+class ConfigProfileError(ValueError):
+    """
+    Raised for a profile missing from its configuration file.
+    """
+
+
+def _is_string_list(value: Any) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(v, str) for v in value)
+
+
+# setting -> (check of its value, description of the expected values)
+SETTING_TYPES = {
+    "SERVER_URL": (lambda value: isinstance(value, str) or _is_string_list(value),
+                   "a URL or a list of URLs"),
+    "REALM_NAME": (lambda value: isinstance(value, str), "a string"),
+    "CLIENT_ID": (lambda value: isinstance(value, str), "a string"),
+    "CLIENT_PASSWORD": (lambda value: isinstance(value, str), "a string"),
+    "TIMEOUT": (lambda value: isinstance(value, Real) and not isinstance(value, bool)
+                and value > 0, "a positive number of seconds"),
+}
+
+
+class ConfigProfile(NamedTuple):
+    """
+    A profile of a keycloak configuration file: its settings, and the ones of its 'user'
+    and 'service' sections.
+    """
+    name: str
+    settings: Dict[str, Any]
+    sections: Dict[str, Dict[str, Any]]
+
+    def keycloak_config(self, section: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Return the keycloak configuration of the profile for the given kind of account, a
+        new dictionary the caller can modify.
+        """
+        return dict(self.settings, **self.sections.get(section, {}))
+
+
+class ConfigFile(NamedTuple):
+    """
+    A parsed keycloak configuration file.
+    """
+    path: str
+    mtime_ns: int
+    size: int
+    profiles: Dict[str, ConfigProfile]
+    default_profile: Optional[str]
+
+    def profile(self, name: Optional[str] = None) -> ConfigProfile:
+        """
+        Return the given profile, by default the one named by the 'default' key of the
+        file, else the 'default' profile, else the only one.
+        """
+        if name is None:
+            name = self.default_profile
+        if name is None:
+            if DEFAULT_PROFILE in self.profiles:
+                name = DEFAULT_PROFILE
+            elif len(self.profiles) == 1:
+                name = next(iter(self.profiles))
+            else:
+                raise ConfigProfileError(
+                    f"⚠️  ConfigProfileError. No profile chosen in {self.path}, nor default "
+                    f"one, among {self.profile_names()}"
+                )
+        if name not in self.profiles:
+            raise ConfigProfileError(
+                f"⚠️  ConfigProfileError. No profile '{name}' in {self.path}, available "
+                f"profiles are {self.profile_names()}"
+            )
+        return self.profiles[name]
+
+    def profile_names(self) -> List[str]:
+        return sorted(self.profiles)
+
+
+def _validate_settings(settings: Dict, where: str):
+    for key, value in settings.items():
+        if key not in SETTING_TYPES or value is None:
+            continue
+        is_valid, expected = SETTING_TYPES[key]
+        if not is_valid(value):
+            raise ValueError(
+                f"⚠️  ValueError. {key} of {where} should be {expected}, got {value!r}"
+            )
+
+
+def _parse_profile(name: str, content: Any, path: str) -> ConfigProfile:
+    where = f"the profile '{name}' of {path}"
+    if not isinstance(content, dict):
+        raise ValueError(f"⚠️  ValueError. The profile '{name}' of {path} is not a mapping")
+    settings = {key: value for key, value in content.items() if key not in SECTIONS}
+    _validate_settings(settings, where)
+
+    sections = {}
+    for section in SECTIONS:
+        section_settings = content.get(section)
+        if section_settings is None:
+            continue
+        if not isinstance(section_settings, dict):
+            raise ValueError(
+                f"⚠️  ValueError. The '{section}' section of {where} is not a mapping"
+            )
+        _validate_settings(section_settings, f"the '{section}' section of {where}")
+        sections[section] = section_settings
+    return ConfigProfile(name, settings, sections)
+
+
+def parse_config_file(path: str) -> ConfigFile:
+    """
+    Read, parse and validate the keycloak configuration file, without the cache.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"⚠️  FileNotFoundError. Cannot find file {path}")
+    try:
+        with open(path) as config_file:
+            stat = os.fstat(config_file.fileno())
+            content = yaml.safe_load(config_file.read().strip())
+    except OSError as error:
+        raise OSError(f"⚠️  OSError. {error}") from error
+
+    if content is None:
+        raise ValueError("⚠️  Keycloak configuration file is empty")
+    if not isinstance(content, dict):
+        raise ValueError(
+            f"⚠️  ValueError. The keycloak configuration file {path} is not a mapping"
+        )
+
+    if "profiles" not in content:
+        profiles = {DEFAULT_PROFILE: _parse_profile(DEFAULT_PROFILE, content, path)}
+        default_profile = None
+    else:
+        if not isinstance(content["profiles"], dict) or not content["profiles"]:
+            raise ValueError(f"⚠️  ValueError. The profiles of {path} are not a mapping")
+        profiles = {
+            str(name): _parse_profile(str(name), profile, path)
+            for name, profile in content["profiles"].items()
+        }
+        default_profile = content.get("default")
+        if default_profile is not None and default_profile not in profiles:
+            raise ConfigProfileError(
+                f"⚠️  ConfigProfileError. The default profile '{default_profile}' of {path} "
+                f"is not one of {sorted(profiles)}"
+            )
+    return ConfigFile(path, stat.st_mtime_ns, stat.st_size, profiles, default_profile)
+
+
+_cache: Dict[str, ConfigFile] = {}
+_cache_lock = threading.Lock()
+
+
+def load_config_file(path: str, reload: bool = False) -> ConfigFile:
+    """
+    Return the parsed keycloak configuration file, from the cache of the process unless
+    the file changed since it was parsed (or 'reload' is set).
+    """
+    key = os.path.abspath(path)
+    cached = _cache.get(key)
+    if cached is not None and not reload:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stat = None
+        if stat is not None and (stat.st_mtime_ns, stat.st_size) == \
+                (cached.mtime_ns, cached.size):
+            return cached
+
+    config_file = parse_config_file(path)
+    with _cache_lock:
+        _cache[key] = config_file
+    return config_file
+
+
+def load_keycloak_config(path: str, profile: Optional[str] = None,
+                         section: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Return the keycloak configuration of the given profile of the file, for the given
+    kind of account ('user' or 'service').
+    """
+    return load_config_file(path).profile(profile).keycloak_config(section)
+
+
+def missing_keys(keycloak_config: Dict[str, Any], keys: Dict[str, bool]) -> Tuple[str, ...]:
+    """
+    Return the mandatory keys absent from the keycloak configuration.
+    """
+    return tuple(
+        key for key, mandatory in keys.items() if mandatory and key not in keycloak_config
+    )
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -6,20 +6,104 @@ displayed on the console output as desired.
 For more information about Nexus, see https://bluebrainnexus.io/
 """
 import os
+import re
 import time
 import logging
+from typing import Callable, Optional
+from urllib.parse import urlparse
 import click
 
 from blue_brain_token_fetch.token_fetcher_base import TokenFetcherBase
 from blue_brain_token_fetch.token_fetcher_user import TokenFetcherUser
 from blue_brain_token_fetch.duration_converter import convert_duration_to_sec
 from blue_brain_token_fetch import __version__
+from blue_brain_token_fetch.commands import start  # noqa: F401, kept as entry point
 from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
+from blue_brain_token_fetch.profiling import enable_profiling, phase
+from blue_brain_token_fetch.tracing import OTLPJSONFileExporter, set_exporter, span
+from blue_brain_token_fetch.rate_limiter import (
+    DEFAULT_RATE, DEFAULT_BURST, RateLimitExceededError, configure_rate_limit, rate_limit_stats
+)
+from blue_brain_token_fetch.token_store import TOKEN_STORES, make_token_store
+from blue_brain_token_fetch.token_sink import FORMATS, TokenSink, parse_sink, write_sinks
+from blue_brain_token_fetch.credential_provider import make_credential_provider
 
 L = logging.getLogger(__name__)
+
+# escape sequences of the sink templates given on the command line
+ESCAPES = {"n": "\n", "t": "\t", "\\": "\\"}
+
 logging.basicConfig(level=logging.INFO)
 
 
+def shortened_refresh_period(refresh_period: float, time_to_expiry: float):
+    """
+    Return half the remaining life span of the access token if the refresh period is
+    greater, so that the written token is always replaced before it expires, and None
+    otherwise.
+    """
+    half_life_span = max(time_to_expiry // 2, 1)
+    return half_life_span if half_life_span < refresh_period else None
+
+
+class RefreshLoop:
+    """
+    A class to represent the loop of the CLI: a fresh access token every refresh period,
+    shortened to half the life span of the first tokens if needed, until the timeout.
+    The CLI sleeps between the iterations, the simulation moves its virtual clock.
+    """
+
+    def __init__(self, fetcher: TokenFetcherBase, refresh_period: float,
+                 timeout: Optional[float] = None, clock: Callable[[], float] = time.time):
+        self.fetcher = fetcher
+        self.refresh_period = refresh_period
+        self.timeout = timeout
+        self.started_at = clock()
+        self.shortened = False
+        self._clock = clock
+
+    def fetch(self) -> Optional[str]:
+        """
+        Return a fresh access token, None if the rate limit refused it this time.
+        """
+        try:
+            with phase("cli.get_access_token"):
+                access_token = self.fetcher.get_access_token()
+        except RateLimitExceededError as e:
+            L.warning(f"{e}. The token is not refreshed this time.")
+            return None
+
+        # if refresh period is superior to half of access token remaining life span, as
+        # measured with the server clock
+        if not self.shortened:
+            L.debug(
+                f"Estimated clock skew of the keycloak server: "
+                f"{self.fetcher.clock_skew():+.3f} seconds."
+            )
+            half_life_span = shortened_refresh_period(
+                self.refresh_period, self.fetcher.time_to_expiry()
+            )
+            if half_life_span is not None:
+                self.shortened = True
+                L.info(
+                    f"The refresh period (= {self.refresh_period} seconds) is greater than "
+                    "the value of half the access token life span "
+                    f"(= {half_life_span:g} seconds)). The "
+                    "refresh period thus becomes equal to : "
+                    f"{half_life_span:g} seconds)."
+                )
+                self.refresh_period = half_life_span
+        return access_token
+
+    def timed_out(self, now: Optional[float] = None) -> bool:
+        """
+        Return whether the timeout is reached at 'now' (the current time by default).
+        """
+        if not self.timeout:
+            return False
+        return (self._clock() if now is None else now) > self.started_at + self.timeout
+
+
 class HiddenPassword(object):
     def __init__(self, password=""):
         self.password = password
@@ -110,9 +194,124 @@ class HiddenPassword(object):
         f"'{TokenFetcherBase.DEFAULT_TOKEN_FILEPATH}'."
     ),
 )
+@click.option(
+    "--config-profile",
+    help=(
+        "Profile of the keycloak configuration file to use (ex: dev, prod), the default "
+        "profile of the file if not given."
+    ),
+)
+@click.option(
+    "--watch-config",
+    is_flag=True,
+    default=False,
+    help=(
+        "Reload the keycloak configuration file when it changes, switching to the new "
+        "server or realm once it issued a token."
+    ),
+)
 @click.option("--verbose", "-v", count=True)
 @click.option("--service", "-s", count=False,
               help="Whether the account is a service account or not")
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help=(
+        "Time each phase of the fetcher construction and of every refresh cycle, and "
+        "print a summary table at exit."
+    ),
+)
+@click.option(
+    "--profile-output",
+    type=click.Path(),
+    help="Path of the file where cProfile statistics are dumped (implies --profile).",
+)
+@click.option(
+    "--trace-file",
+    type=click.Path(),
+    help=(
+        "Path of the file where the spans of the token acquisition are appended as "
+        "OTLP-JSON lines. If the TRACEPARENT environment variable is set, they are "
+        "attached to this trace."
+    ),
+)
+@click.option(
+    "--rate-limit",
+    default=DEFAULT_RATE,
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help=(
+        "Maximum number of requests per second sent to the keycloak realm by this "
+        "process, 0 for no limit."
+    ),
+)
+@click.option(
+    "--rate-limit-burst",
+    default=DEFAULT_BURST,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of requests that can be sent at once within the rate limit.",
+)
+@click.option(
+    "--rate-limit-mode",
+    default="wait",
+    show_default=True,
+    type=click.Choice(["wait", "fail"]),
+    help="Whether a request exceeding the rate limit waits for its turn or fails.",
+)
+@click.option(
+    "--store",
+    default="file",
+    show_default=True,
+    type=click.Choice(list(TOKEN_STORES)),
+    help=(
+        "Where the token is written: 'file' for a regular file, 'tmpfs' for a file in "
+        "/dev/shm (or in the memory-backed filesystem of the 'path' argument), "
+        "'keyring' for a key of the Linux user keyring, described by the 'path' "
+        "argument if given ('nexus_token' by default)."
+    ),
+)
+@click.option(
+    "--sink",
+    multiple=True,
+    help=(
+        "Additional output of the token, given as FORMAT:LOCATION where FORMAT is one of "
+        f"{', '.join(FORMATS)} or a name defined with --sink-template, and LOCATION a "
+        "path (or key description) of the --store. Can be repeated, all the sinks are "
+        "written at each refresh, except the ones whose content is unchanged."
+    ),
+)
+@click.option(
+    "--sink-template",
+    multiple=True,
+    help=(
+        "Custom sink format given as NAME=TEMPLATE, the template using the fields "
+        "{token}, {expires_at}, {expires_at_iso}, {expires_in}, {username} and "
+        "{machine}. Ex: 'export=export NEXUS_TOKEN={token}\\n'"
+    ),
+)
+@click.option(
+    "--netrc-machine",
+    help="Machine of the netrc sinks, the host of the keycloak server by default.",
+)
+@click.option(
+    "--credential-provider",
+    help=(
+        "Source of the password used to authenticate again in the background before the "
+        "keycloak session reaches its maximum duration: 'keyring[:DESCRIPTION]' for a "
+        "key of the user keyring ('nexus_password' by default), 'fd:NUMBER' for an "
+        "inherited file descriptor or 'agent:SOCKET_PATH' for an agent."
+    ),
+)
+@click.option(
+    "--state-file",
+    type=click.Path(),
+    help=(
+        "File where the state of the fetcher (last refresh, expiry, consecutive "
+        "failures, pid) is kept for the 'health' subcommand. Not kept if not given."
+    ),
+)
 def token_fetcher(
     username,
     password,
@@ -121,8 +320,22 @@ def token_fetcher(
     refresh_period,
     timeout,
     keycloak_config_file,
+    config_profile,
+    watch_config,
     verbose,
-    service
+    service,
+    profile,
+    profile_output,
+    trace_file,
+    rate_limit,
+    rate_limit_burst,
+    rate_limit_mode,
+    store,
+    sink,
+    sink_template,
+    netrc_machine,
+    credential_provider,
+    state_file
 ):
     """
     As a first step it fetches the Nexus access token using Keycloak and the
@@ -134,62 +347,84 @@ def token_fetcher(
     """
     L.setLevel((logging.WARNING, logging.INFO, logging.DEBUG)[min(verbose, 2)])
 
+    if profile or profile_output:
+        enable_profiling(profile_output)
+    if trace_file:
+        set_exporter(OTLPJSONFileExporter(trace_file))
+    configure_rate_limit(rate_limit or None, rate_limit_burst, rate_limit_mode == "wait")
+
     if isinstance(password, HiddenPassword):
         password = password.password
 
     try:
         refresh_period = convert_duration_to_sec(refresh_period)
+        timeout = convert_duration_to_sec(timeout) if timeout else None
     except Exception as e:
         L.error(f"Error: {e}")
         exit(1)
 
     init_cls = TokenFetcherUser if not service else TokenFetcherService
     try:
-        my_token_fetcher: TokenFetcherBase = init_cls(username, password, keycloak_config_file)
+        # a service account gets a new token with its secret whenever needed
+        extra = {} if service or not credential_provider else {
+            "credential_provider": make_credential_provider(credential_provider)
+        }
+        my_token_fetcher: TokenFetcherBase = init_cls(
+            username, password, keycloak_config_file, watch_config=watch_config,
+            state_file=state_file,
+            config_profile=config_profile, **extra
+        )
+    except Exception as e:
+        L.error(f"Error: {e}")
+        exit(1)
+
+    sinks = []
+    try:
+        templates = {}
+        for template in sink_template:
+            name, separator, value = template.partition("=")
+            if not separator or not name:
+                raise ValueError(
+                    f"⚠️  ValueError. Invalid sink template '{template}', expected "
+                    "NAME=TEMPLATE"
+                )
+            # only the escaped newlines, tabs and backslashes, the rest being kept as is
+            templates[name] = re.sub(
+                r"\\([nt\\])", lambda match: ESCAPES[match.group(1)], value
+            )
+        # the token file is written unless only sinks or the console output are asked
+        if path is not None or (output and not sink):
+            sinks.append(TokenSink(make_token_store(store, path)))
+        sinks.extend(parse_sink(spec, store, templates) for spec in sink)
     except Exception as e:
         L.error(f"Error: {e}")
         exit(1)
 
-    start_time = time.time()
-    flag_rp = 0
+    netrc_machine = netrc_machine or urlparse(my_token_fetcher.server_url()).hostname
+    # the flag alone prints the token on the console, along with the sinks if any
+    console = not output and path is None
+
+    loop = RefreshLoop(my_token_fetcher, refresh_period, timeout)
     flag_to = 0
     flag_console = 0
     while True:
 
-        my_access_token = my_token_fetcher.get_access_token()
+        my_access_token = loop.fetch()
+        if my_access_token is None:
+            time.sleep(loop.refresh_period)
+            continue
+        refresh_period = loop.refresh_period
 
-        # if refresh period is superior to half of access token duration
-        if (
-            flag_rp == 0
-            and my_token_fetcher.get_access_token_duration() // 2 < refresh_period
-        ):
-            flag_rp += 1
-            L.info(
-                f"The refresh period (= {refresh_period} seconds) is greater than the "
-                "value of half the access token life span "
-                f"(= {my_token_fetcher.get_access_token_duration() // 2:g} seconds)). The "
-                "refresh period thus becomes equal to : "
-                f"{my_token_fetcher.get_access_token_duration() // 2:g} seconds)."
-            )
-            refresh_period = my_token_fetcher.get_access_token_duration() // 2
-
-        if timeout:
-            if flag_to == 0:
-                flag_to += 1
-                try:
-                    timeout = convert_duration_to_sec(timeout)
-                except Exception as e:
-                    L.error(f"Error: {e}")
-                    exit(1)
-
-                if timeout < refresh_period:
-                    L.info(
-                        f"The timeout argument (= {timeout:g} seconds) is shorter "
-                        f"than the refresh period (= {refresh_period:g} seconds). The "
-                        "app will shut down after one refresh period."
-                    )
-
-        if path is None and not output:
+        if timeout and flag_to == 0:
+            flag_to += 1
+            if timeout < refresh_period:
+                L.info(
+                    f"The timeout argument (= {timeout:g} seconds) is shorter "
+                    f"than the refresh period (= {refresh_period:g} seconds). The "
+                    "app will shut down after one refresh period."
+                )
+
+        if console:
             if flag_console == 0:
                 flag_console += 1
                 print(
@@ -200,29 +435,25 @@ def token_fetcher(
                 print(f"{my_access_token}")
             else:
                 print(f"\x1B[7A{my_access_token}")
-        else:
-
-            output_path = path or TokenFetcherBase.DEFAULT_TOKEN_FILEPATH
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
+        if sinks:
             L.info(
-                f"The token will be written in the file '{output_path}' every "
+                "The token will be written in "
+                f"{', '.join(repr(sink.store.location()) for sink in sinks)} every "
                 f"{refresh_period:g} seconds.\r"
             )
-            with open(output_path, "w") as f:
-                f.write(my_access_token)
-            os.chmod(output_path, 0o0600)
+            with phase("cli.write"), span("cli.write_token", sinks=len(sinks)) as write_span:
+                written = write_sinks(
+                    sinks, my_access_token, my_token_fetcher.expires_at(),
+                    username=username, machine=netrc_machine
+                )
+                write_span.set_attribute("written", len(written))
 
         time.sleep(refresh_period)
 
-        if timeout:
-            if time.time() > (start_time + timeout):
-                L.info("\n> Timeout reached, successfully exit.")
-                exit(1)
-
-
-def start():
-    token_fetcher(obj={})
+        if loop.timed_out():
+            L.info("\n> Timeout reached, successfully exit.")
+            L.debug(f"Keycloak requests: {rate_limit_stats()}")
+            exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,186 @@
+"""This class allows to measure the wall and CPU time spent in each phase of the token
+fetching pipeline (configuration loading, credentials resolution, grants, refresh
+cycles, token writing...).
+Profiling is disabled by default: phases are then entered through a shared no-op
+context manager, so that instrumented code pays almost nothing.
+"""
+import atexit
+import cProfile
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+
+class PhaseStats:
+    """
+    Accumulated timings of one phase.
+    """
+
+    __slots__ = ("count", "wall", "cpu", "max_wall")
+
+    def __init__(self):
+        self.count = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.max_wall = 0.0
+
+
+class _NullPhase:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+
+    __slots__ = ("_profiler", "_name", "_wall", "_cpu")
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._profiler.record(
+            self._name, time.perf_counter() - self._wall, time.thread_time() - self._cpu
+        )
+        return False
+
+
+class Profiler:
+    """
+    A class to collect the timings of the phases of the token fetching pipeline.
+
+    Attributes
+    ----------
+    enabled : bool
+        Whether the phases are timed or not.
+    stats : Dict[str, PhaseStats]
+        Timings accumulated for each phase name.
+    pstats_path : str
+        Path of the file where the cProfile statistics are dumped, if any.
+
+    Methods
+    -------
+    phase(name):
+        Return a context manager timing the enclosed code under the given phase name.
+    summary():
+        Return the table summarising the timings of every phase.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stats: Dict[str, PhaseStats] = {}
+        self.pstats_path: Optional[str] = None
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._report_registered = False
+        self._lock = threading.Lock()
+
+    def enable(self, pstats_path: Optional[str] = None, report_at_exit: bool = True):
+        """
+        Start timing the phases. If 'pstats_path' is given, the whole process is also
+        profiled with cProfile and its statistics are dumped in this file at exit.
+        """
+        self.enabled = True
+        self.pstats_path = pstats_path
+        if pstats_path and self._cprofile is None:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        if report_at_exit and not self._report_registered:
+            self._report_registered = True
+            atexit.register(self.report)
+
+    def disable(self):
+        self.enabled = False
+        if self._cprofile is not None:
+            self._cprofile.disable()
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def record(self, name: str, wall: float, cpu: float):
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = PhaseStats()
+            stats.count += 1
+            stats.wall += wall
+            stats.cpu += cpu
+            stats.max_wall = max(stats.max_wall, wall)
+
+    def summary(self) -> str:
+        lines = [
+            f"{'Phase':<32}{'Count':>8}{'Wall (s)':>12}{'Mean (ms)':>12}{'Max (ms)':>12}"
+            f"{'CPU (s)':>12}"
+        ]
+        with self._lock:
+            stats = sorted(self.stats.items(), key=lambda item: item[1].wall, reverse=True)
+        for name, phase_stats in stats:
+            lines.append(
+                f"{name:<32}{phase_stats.count:>8}{phase_stats.wall:>12.4f}"
+                f"{1000 * phase_stats.wall / phase_stats.count:>12.2f}"
+                f"{1000 * phase_stats.max_wall:>12.2f}{phase_stats.cpu:>12.4f}"
+            )
+        return "\n".join(lines)
+
+    def dump_stats(self):
+        if self._cprofile is not None and self.pstats_path:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.pstats_path)
+
+    def report(self, file=None):
+        """
+        Print the summary table and dump the cProfile statistics if requested.
+        """
+        self.dump_stats()
+        if self.stats:
+            print(self.summary(), file=file or sys.stderr)
+        if self.pstats_path:
+            print(f"cProfile statistics written in {self.pstats_path}", file=file or sys.stderr)
+
+
+profiler = Profiler()
+
+
+def enable_profiling(pstats_path: Optional[str] = None, report_at_exit: bool = True) -> Profiler:
+    """
+    Enable the profiling of the token fetching pipeline of the process and return the
+    profiler collecting the timings.
+    """
+    profiler.enable(pstats_path, report_at_exit)
+    return profiler
+
+
+def phase(name: str):
+    """
+    Return a context manager timing the enclosed code under the given phase name when
+    the profiling is enabled.
+    """
+    return profiler.phase(name)
+
+
+def _after_fork_in_child():
+    # the thread holding the lock during the fork does not exist in the child
+    profiler._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
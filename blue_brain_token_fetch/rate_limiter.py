@@ -0,0 +1,175 @@
+"""This class allows to bound the rate of the requests sent to a Keycloak realm by the
+token fetchers of a process, whatever the refresh period or the way the fetchers are
+called, with a token bucket per server and realm.
+When the bucket is empty, a request either waits for its turn or fails with a
+'RateLimitExceededError', depending on the configuration. Counters of the allowed,
+throttled and rejected requests are kept for each bucket.
+The buckets allow DEFAULT_RATE requests per second and bursts of DEFAULT_BURST, for the
+library as for the CLI, unless 'configure_rate_limit' sets another limit (or none).
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+DEFAULT_RATE = 10.0
+DEFAULT_BURST = 30
+DEFAULT_BLOCK = True
+
+
+class RateLimitExceededError(RuntimeError):
+    """
+    Raised when a request to Keycloak would exceed the rate limit in non-blocking mode.
+    """
+
+
+class TokenBucket:
+    """
+    A class to represent the request budget of a Keycloak realm.
+
+    Attributes
+    ----------
+    rate : float
+        Number of requests per second allowed in the long run, None for no limit.
+    burst : int
+        Number of requests that can be sent at once after an idle period.
+    block : bool
+        Whether a request exceeding the limit waits for its turn or fails.
+    allowed : int
+        Number of requests sent without waiting.
+    throttled : int
+        Number of requests that had to wait.
+    rejected : int
+        Number of requests refused in non-blocking mode.
+    waited : float
+        Total number of seconds spent waiting.
+    """
+
+    def __init__(self, rate: Optional[float] = DEFAULT_RATE, burst: int = DEFAULT_BURST,
+                 block: bool = DEFAULT_BLOCK):
+        self.allowed = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+        self.configure(rate, burst, block)
+
+    def configure(self, rate: Optional[float], burst: int, block: bool):
+        if rate is not None and rate <= 0:
+            raise ValueError("⚠️  ValueError. The rate limit needs to be positive.")
+        if burst < 1:
+            raise ValueError("⚠️  ValueError. The rate limit burst needs to be at least 1.")
+        with self._lock:
+            self.rate = rate
+            self.burst = burst
+            self.block = block
+            self._tokens = float(burst)
+            self._updated_at = time.monotonic()
+
+    def acquire(self) -> float:
+        """
+        Consume one request from the budget, waiting for it if needed, and return the
+        number of seconds waited.
+        """
+        with self._lock:
+            if self.rate is None:
+                self.allowed += 1
+                return 0.0
+
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.allowed += 1
+                return 0.0
+
+            delay = (1 - self._tokens) / self.rate
+            if not self.block:
+                self.rejected += 1
+                raise RateLimitExceededError(
+                    f"⚠️  RateLimitExceededError. More than {self.rate:g} requests per second "
+                    f"(burst {self.burst}) to the keycloak server, retry in {delay:.3f} seconds"
+                )
+
+            # the request is booked now, the following ones queue up behind it
+            self._tokens -= 1
+            self.throttled += 1
+            self.waited += delay
+
+        time.sleep(delay)
+        return delay
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "block": self.block,
+                "allowed": self.allowed,
+                "throttled": self.throttled,
+                "rejected": self.rejected,
+                "waited": self.waited,
+            }
+
+
+# a loop of fetcher creations in a library user cannot flood the server either
+_default_limit = {"rate": DEFAULT_RATE, "burst": DEFAULT_BURST, "block": DEFAULT_BLOCK}
+_buckets: Dict[Tuple[str, str], TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def _key(server_url: str, realm: str) -> Tuple[str, str]:
+    return server_url.rstrip("/"), realm
+
+
+def get_rate_limiter(server_url: str, realm: str) -> TokenBucket:
+    """
+    Return the token bucket shared by all the requests to the given server and realm.
+    """
+    with _buckets_lock:
+        key = _key(server_url, realm)
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(**_default_limit)
+        return _buckets[key]
+
+
+def configure_rate_limit(rate: Optional[float] = DEFAULT_RATE, burst: int = DEFAULT_BURST,
+                         block: bool = DEFAULT_BLOCK, server_url: Optional[str] = None,
+                         realm: Optional[str] = None):
+    """
+    Set the rate limit (requests per second, None for no limit), its burst and whether
+    the requests exceeding it wait or fail. Without 'server_url' and 'realm', the limit
+    applies to every server and realm, otherwise only to the given one.
+    """
+    if server_url is None or realm is None:
+        with _buckets_lock:
+            _default_limit.update(rate=rate, burst=burst, block=block)
+            buckets = list(_buckets.values())
+    else:
+        buckets = [get_rate_limiter(server_url, realm)]
+
+    for bucket in buckets:
+        bucket.configure(rate, burst, block)
+
+
+def rate_limit_stats() -> Dict[str, Dict]:
+    """
+    Return the counters of the token bucket of every server and realm contacted.
+    """
+    with _buckets_lock:
+        buckets = dict(_buckets)
+    return {f"{server_url} {realm}": bucket.stats() for (server_url, realm), bucket in buckets.items()}
+
+
+def _after_fork_in_child():
+    # the threads holding the locks during the fork do not exist in the child
+    global _buckets_lock  # pylint: disable=global-statement
+    _buckets_lock = threading.Lock()
+    for bucket in _buckets.values():
+        bucket._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
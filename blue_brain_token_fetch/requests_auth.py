@@ -0,0 +1,58 @@
+"""This class allows to authenticate the requests sent with the 'requests' library using
+the access token of a token fetcher.
+The token is cached by the fetcher and only refreshed when it is about to expire, so
+that sending a request does not imply any call to Keycloak. When a request is rejected
+with a 401 status, it is sent once more with a freshly fetched token, provided that its
+body can be sent again (no body, bytes, string or seekable file). Otherwise, the 401
+response is returned as it is.
+'requests' is an optional dependency, only imported along with this module.
+"""
+from requests.auth import AuthBase
+
+from blue_brain_token_fetch.token_fetcher_base import TokenFetcherBase
+
+
+class NexusRequestsAuth(AuthBase):
+    """
+    'requests' authentication adding the Nexus access token as a bearer token.
+
+    Ex: requests.Session().auth = NexusRequestsAuth(my_token_fetcher)
+    """
+
+    def __init__(self, token_fetcher: TokenFetcherBase,
+                 min_validity: float = TokenFetcherBase.TOKEN_REFRESH_MARGIN):
+        self.token_fetcher = token_fetcher
+        self.min_validity = min_validity
+
+    def __call__(self, request):
+        token = self.token_fetcher.get_valid_access_token(self.min_validity)
+        request.headers["Authorization"] = f"Bearer {token}"
+
+        body_position = None
+        if hasattr(request.body, "seek") and hasattr(request.body, "tell"):
+            body_position = request.body.tell()
+        replayable = body_position is not None or request.body is None or \
+            isinstance(request.body, (bytes, str))
+
+        def retry_on_401(response, **kwargs):
+            # a streamed body (generator, pipe...) is consumed and cannot be sent again
+            if response.status_code != 401 or not replayable:
+                return response
+
+            fresh_token = self.token_fetcher.renew_access_token(token)
+            if body_position is not None:
+                request.body.seek(body_position)
+
+            # consume the content so that the connection can be reused
+            response.content  # pylint: disable=pointless-statement
+            response.close()
+
+            retried_request = response.request.copy()
+            retried_request.headers["Authorization"] = f"Bearer {fresh_token}"
+            retried_response = response.connection.send(retried_request, **kwargs)
+            retried_response.history.append(response)
+            retried_response.request = retried_request
+            return retried_response
+
+        request.register_hook("response", retry_on_401)
+        return request
@@ -0,0 +1,384 @@
+"""
+This CLI allows to predict the keycloak load and the token validity produced by a fleet
+of token fetchers, without any keycloak server nor waiting: real fetchers are driven
+against a simulated token endpoint, time being a virtual clock moved from one scheduled
+event to the next. Each member of the fleet runs the loop of the CLI (a token written
+every refresh period, shortened to half the token life span, until the timeout) and,
+for the users, the refresh token rotations of their Job, so that days of operation take
+a fraction of a second.
+The report gives the request rates, the peak number of concurrent requests and the
+periods during which the last written token had expired (expiry gaps).
+"""
+import base64
+import heapq
+import itertools
+import json
+import logging
+import random
+import sys
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+import click
+from keycloak.exceptions import KeycloakAuthenticationError, KeycloakPostError
+
+from blue_brain_token_fetch.credential_provider import StaticCredentialProvider
+from blue_brain_token_fetch.duration_converter import convert_duration_to_sec
+from blue_brain_token_fetch.job import run_job_step
+from blue_brain_token_fetch.nexus_token_fetch import RefreshLoop
+from blue_brain_token_fetch.rate_limiter import TokenBucket
+from blue_brain_token_fetch.token_claims import decode_claims
+from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
+from blue_brain_token_fetch.token_fetcher_user import TokenFetcherUser
+
+SIMULATED_SERVER_URL = "http://keycloak.simulation/auth/"
+SIMULATED_REALM = "simulation"
+SIMULATED_CLIENT_ID = "simulation-client"
+SIMULATED_PASSWORD = "password"
+
+
+class VirtualClock:
+    """
+    A class to represent the time of a simulation, moved forward by the simulation
+    only. Its 'time' method is the clock of the simulated fetchers and CLI loops.
+    """
+
+    def __init__(self, start: Optional[float] = None):
+        self.now = time.time() if start is None else start
+
+    def time(self) -> float:
+        return self.now
+
+
+def _encode(content: Dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(content).encode()).rstrip(b"=").decode()
+
+
+class SimulatedTokenEndpoint:
+    """
+    A class to represent the token endpoint of a keycloak realm answering instantly on
+    the virtual clock, with unsigned tokens, and recording the time of each request.
+    The refresh tokens expire at the SSO session maximum, if any, whatever their
+    rotations.
+    """
+
+    def __init__(self, clock: VirtualClock, access_token_lifespan: float = 300,
+                 refresh_token_lifespan: float = 1800, session_max: Optional[float] = None):
+        self.clock = clock
+        self.access_token_lifespan = access_token_lifespan
+        self.refresh_token_lifespan = refresh_token_lifespan
+        self.session_max = session_max
+        self.connection = SimpleNamespace(base_url=SIMULATED_SERVER_URL)
+        self.request_times: List[float] = []
+        self.grant_types: Dict[str, int] = {}
+        self._header = _encode({"alg": "none", "typ": "JWT"})
+
+    def _record(self, grant_type: str):
+        self.request_times.append(self.clock.now)
+        self.grant_types[grant_type] = self.grant_types.get(grant_type, 0) + 1
+
+    def _sign(self, claims: Dict) -> str:
+        return f"{self._header}.{_encode(claims)}.simulated"
+
+    def _issue(self, subject: str, session_id: str, auth_time: int, refresh: bool) -> Dict:
+        now = int(self.clock.now)
+        claims = {"sub": subject, "iat": now, "auth_time": auth_time, "sid": session_id}
+        payload = {
+            "access_token": self._sign(dict(claims, exp=now + int(self.access_token_lifespan))),
+            "expires_in": int(self.access_token_lifespan),
+        }
+        if refresh:
+            refresh_expires_at = now + int(self.refresh_token_lifespan)
+            if self.session_max is not None:
+                refresh_expires_at = min(refresh_expires_at, auth_time + int(self.session_max))
+            payload.update(
+                refresh_token=self._sign(dict(claims, exp=refresh_expires_at)),
+                refresh_expires_in=refresh_expires_at - now,
+            )
+        return payload
+
+    def token(self, username="", password="", grant_type="password", **kwargs) -> Dict:
+        self._record(grant_type)
+        if grant_type == "client_credentials":
+            return self._issue(username or SIMULATED_CLIENT_ID, "", int(self.clock.now), False)
+        if password != SIMULATED_PASSWORD:
+            raise KeycloakAuthenticationError("401: invalid user credentials", response_code=401)
+        return self._issue(username, str(uuid.uuid4()), int(self.clock.now), True)
+
+    def refresh_token(self, refresh_token, grant_type="refresh_token") -> Dict:
+        self._record(grant_type)
+        claims = decode_claims(refresh_token)
+        if claims["exp"] <= self.clock.now:
+            raise KeycloakPostError("400: Token is not active", response_code=400)
+        return self._issue(claims["sub"], claims["sid"], claims["auth_time"], True)
+
+    def well_known(self) -> Dict:
+        return {"issuer": f"{SIMULATED_SERVER_URL}realms/{SIMULATED_REALM}"}
+
+
+class _SimulatedFetcher:
+    """
+    Connect a fetcher to the simulated endpoint and its virtual clock, leaving the
+    scheduling of its refreshing job to the simulation. Each member of a fleet standing
+    for a process of its own, it does not share the request budget of the others.
+    """
+
+    def __init__(self, endpoint: SimulatedTokenEndpoint, *args, **kwargs):
+        self._endpoint = endpoint
+        super().__init__(*args, clock=endpoint.clock.time, **kwargs)
+
+    def _connection_for(self, keycloak_config: Dict):
+        return super()._connection_for(keycloak_config)._replace(
+            rate_limiter=TokenBucket(rate=None)
+        )
+
+    def _create_keycloak_instance(self, username, password, keycloak_config):
+        return self._endpoint
+
+    def _refresh_perpetually(self):
+        return None
+
+    def _probe_perpetually(self):
+        return None
+
+
+class SimulatedTokenFetcherUser(_SimulatedFetcher, TokenFetcherUser):
+    pass
+
+
+class SimulatedTokenFetcherService(_SimulatedFetcher, TokenFetcherService):
+    pass
+
+
+class _Member:
+    """
+    A member of the fleet: the CLI loop of its fetcher and the expiry of its last
+    written token.
+    """
+
+    __slots__ = ("loop", "expires_at", "stopped")
+
+    def __init__(self, loop: RefreshLoop):
+        self.loop = loop
+        self.expires_at: Optional[float] = None
+        self.stopped = False
+
+    @property
+    def fetcher(self):
+        return self.loop.fetcher
+
+
+def _peak_concurrency(request_times: List[float], latency: float) -> int:
+    """
+    Return the maximal number of requests in progress at the same time, each request
+    lasting 'latency' seconds (the ones sent at the very same time for no latency).
+    """
+    if latency <= 0:
+        return max((len(list(group)) for _, group in itertools.groupby(sorted(request_times))),
+                   default=0)
+    # at equal times, the end of a request is counted before the start of another one
+    events = sorted(
+        [(start, 1) for start in request_times] + [(start + latency, -1) for start in request_times]
+    )
+    peak = current = 0
+    for _, change in events:
+        current += change
+        peak = max(peak, current)
+    return peak
+
+
+def _peak_rate(request_times: List[float], window: float = 1.0) -> float:
+    """
+    Return the maximal number of requests per second over windows of 'window' seconds.
+    """
+    counts: Dict[int, int] = {}
+    for request_time in request_times:
+        bucket = int(request_time // window)
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return max(counts.values(), default=0) / window
+
+
+def simulate(fleet_size: int = 1, refresh_period: float = 15, timeout: Optional[float] = None,
+             duration: Optional[float] = None, service: bool = False,
+             access_token_lifespan: float = 300, refresh_token_lifespan: float = 1800,
+             session_max: Optional[float] = None, reauthenticate: bool = False,
+             latency: float = 0.05, start_spread: float = 0.0, seed: int = 0) -> Dict:
+    """
+    Simulate a fleet of 'fleet_size' CLI fetchers, started at random times within
+    'start_spread' seconds, each writing a token every 'refresh_period' seconds until its
+    'timeout', and return the report of the 'duration' seconds simulated (the timeout,
+    or a day, by default).
+
+    The users authenticate again at the end of their session when 'reauthenticate'
+    (their credential provider) is given, and stop like the CLI otherwise. Each keycloak
+    request is considered to last 'latency' seconds.
+    """
+    if duration is None:
+        duration = timeout if timeout is not None else 86400
+    clock = VirtualClock()
+    start = clock.now
+    end = start + duration
+    endpoint = SimulatedTokenEndpoint(
+        clock, access_token_lifespan, refresh_token_lifespan, session_max
+    )
+    keycloak_config = {
+        "SERVER_URL": SIMULATED_SERVER_URL, "REALM_NAME": SIMULATED_REALM,
+        "CLIENT_ID": SIMULATED_CLIENT_ID,
+    }
+    randomness = random.Random(seed)
+    events: List = []
+    sequence = itertools.count()
+    gaps: List[float] = []
+    failures = 0
+    failed = 0
+
+    def schedule(at: float, action: Callable, *args):
+        if at < end:
+            heapq.heappush(events, (at, next(sequence), action, args))
+
+    def record_gap(member: _Member, until: float):
+        if member.expires_at is not None and until > member.expires_at:
+            gaps.append(until - member.expires_at)
+
+    def start_member(index: int):
+        if service:
+            fetcher = SimulatedTokenFetcherService(
+                endpoint, SIMULATED_CLIENT_ID, SIMULATED_PASSWORD, keycloak_config=keycloak_config
+            )
+        else:
+            provider = StaticCredentialProvider(SIMULATED_PASSWORD) if reauthenticate else None
+            fetcher = SimulatedTokenFetcherUser(
+                endpoint, f"user-{index}", SIMULATED_PASSWORD, keycloak_config=keycloak_config,
+                credential_provider=provider
+            )
+        member = _Member(RefreshLoop(fetcher, refresh_period, timeout, clock.time))
+        if fetcher.refresh_job_interval() is not None:
+            schedule_refresh_job(member)
+        cli_iteration(member)
+
+    def schedule_refresh_job(member: _Member):
+        # the Job waits its interval after each run
+        schedule(clock.now + latency + member.fetcher.refresh_job_interval(), run_job, member)
+
+    def run_job(member: _Member):
+        nonlocal failures
+        if member.stopped:
+            # the Job ended with the CLI
+            return
+        if not run_job_step(member.fetcher.run_refresh_job):
+            failures += 1
+        schedule_refresh_job(member)
+
+    def cli_iteration(member: _Member):
+        nonlocal failures, failed
+        loop = member.loop
+        # the CLI checks its timeout after each sleep
+        if loop.timed_out():
+            member.stopped = True
+            return
+        try:
+            access_token = loop.fetch()
+        except Exception:  # pylint: disable=broad-except
+            # the CLI exits, its last token lapses
+            failures += 1
+            failed += 1
+            member.stopped = True
+            record_gap(member, end)
+            return
+        if access_token is not None:
+            # the token is written
+            record_gap(member, clock.now)
+            member.expires_at = member.fetcher.expires_at()
+
+        next_iteration = clock.now + latency + loop.refresh_period
+        if next_iteration >= end and not loop.timed_out(next_iteration):
+            record_gap(member, end)
+        schedule(next_iteration, cli_iteration, member)
+
+    # the messages of the whole fleet (ex: session ends) are summarized by the report
+    package_logger = logging.getLogger("blue_brain_token_fetch")
+    level = package_logger.level
+    package_logger.setLevel(logging.CRITICAL)
+    wall_start = time.perf_counter()
+    try:
+        for index in range(fleet_size):
+            schedule(start + randomness.uniform(0, start_spread), start_member, index)
+        while events:
+            clock.now, _, action, args = heapq.heappop(events)
+            action(*args)
+    finally:
+        package_logger.setLevel(level)
+    wall_time = time.perf_counter() - wall_start
+
+    request_times = endpoint.request_times
+    return {
+        "fleet_size": fleet_size,
+        "duration": duration,
+        "requests": len(request_times),
+        "requests_by_grant": dict(endpoint.grant_types),
+        "requests_per_second": len(request_times) / duration,
+        "peak_requests_per_second": _peak_rate(request_times),
+        "peak_concurrency": _peak_concurrency(request_times, latency),
+        "failures": failures,
+        "failed_fetchers": failed,
+        "expiry_gaps": len(gaps),
+        "expired_seconds": sum(gaps),
+        "longest_expiry_gap": max(gaps, default=0.0),
+        "wall_time": wall_time,
+    }
+
+
+def _duration(value: Optional[str]) -> Optional[float]:
+    return None if value is None else convert_duration_to_sec(value)
+
+
+@click.command("simulate")
+@click.option("--fleet-size", "-n", default=1, show_default=True, type=click.IntRange(min=1),
+              help="Number of fetchers (processes) simulated.")
+@click.option("--refresh-period", "-rp", default="15", show_default=True,
+              help="Refresh period of the CLI. Ex: '-rp 30', '-rp 0.5min'")
+@click.option("--timeout", "-to", help="Timeout of the CLI, none by default.")
+@click.option("--duration", "-d", help="Simulated duration, the timeout or 1 day by default.")
+@click.option("--service", "-s", count=False,
+              help="Whether to simulate service accounts instead of users.")
+@click.option("--access-token-lifespan", default="5min", show_default=True,
+              help="Life span of the access tokens issued by the realm.")
+@click.option("--refresh-token-lifespan", default="30min", show_default=True,
+              help="Life span of the refresh tokens (SSO session idle) of the realm.")
+@click.option("--session-max", help="SSO session maximum of the realm, none by default.")
+@click.option("--reauthenticate", is_flag=True, default=False,
+              help="Authenticate again at the end of the sessions, as with --credential-provider.")
+@click.option("--latency", default=0.05, show_default=True, type=click.FloatRange(min=0),
+              help="Duration of each keycloak request, in seconds.")
+@click.option("--start-spread",
+              help="Duration over which the fetchers of the fleet are started, all at once by default.")
+@click.option("--seed", default=0, show_default=True, help="Seed of the start times.")
+@click.option("--json", "as_json", is_flag=True, default=False, help="Print the report as JSON.")
+def simulate_command(fleet_size, refresh_period, timeout, duration, service,
+                     access_token_lifespan, refresh_token_lifespan, session_max,
+                     reauthenticate, latency, start_spread, seed, as_json):
+    """
+    Predict the keycloak requests and token expiries of a fleet of fetchers on a virtual
+    clock, without contacting keycloak.
+    """
+    try:
+        report = simulate(
+            fleet_size, convert_duration_to_sec(refresh_period), _duration(timeout),
+            _duration(duration), bool(service), convert_duration_to_sec(access_token_lifespan),
+            convert_duration_to_sec(refresh_token_lifespan), _duration(session_max),
+            reauthenticate, latency, _duration(start_spread) or 0.0, seed
+        )
+    except Exception as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+    if as_json:
+        click.echo(json.dumps(report))
+    else:
+        for key, value in report.items():
+            if isinstance(value, float):
+                value = f"{value:.6g}"
+            click.echo(f"{key:>26}: {value}")
+    sys.exit(1 if report["expiry_gaps"] else 0)
@@ -0,0 +1,408 @@
+"""This module allows to test the code using the token fetchers without a keycloak server
+nor credentials: 'KeycloakStub' runs in-process an HTTP server implementing the token
+endpoint of a keycloak realm for the 'password', 'refresh_token', 'client_credentials'
+and token exchange grants, and issues JWTs signed with HS256 whose lifetimes, response
+latency and failures can be set by the test.
+With pytest, the 'keycloak_stub' fixture, made available by adding
+'pytest_plugins = ["blue_brain_token_fetch.testing"]' to a conftest.py, starts a stub
+and makes it the default keycloak configuration of 'TokenFetcherUser' and
+'TokenFetcherService'.
+"""
+import base64
+import collections
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Deque, Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+import yaml
+
+from blue_brain_token_fetch.token_exchange import ACCESS_TOKEN_TYPE, TOKEN_EXCHANGE_GRANT
+from blue_brain_token_fetch.token_fetcher_base import TokenFetcherBase
+
+DEFAULT_REALM = "BBP"
+DEFAULT_CLIENT_ID = "nexus-client"
+DEFAULT_USERNAME = "user"
+DEFAULT_PASSWORD = "password"
+DEFAULT_SERVICE_CLIENT_ID = "service-client"
+DEFAULT_SERVICE_SECRET = "secret"
+
+TOKEN_PATH = re.compile(r"/realms/(?P<realm>[^/]+)/protocol/openid-connect/token$")
+WELL_KNOWN_PATH = re.compile(r"/realms/(?P<realm>[^/]+)/\.well-known/openid-configuration$")
+
+
+class StubError(Exception):
+    """
+    Raised by the grant handlers to answer with an OAuth error.
+    """
+
+    def __init__(self, status: int, error: str, description: str):
+        super().__init__(description)
+        self.status = status
+        self.body = {"error": error, "error_description": description}
+
+
+def _b64encode(content: bytes) -> str:
+    return base64.urlsafe_b64encode(content).rstrip(b"=").decode()
+
+
+def _b64decode(content: str) -> bytes:
+    return base64.urlsafe_b64decode(content + "=" * (-len(content) % 4))
+
+
+class KeycloakStub:
+    """
+    A class to represent an in-process keycloak server with a single realm.
+
+    Attributes
+    ----------
+    realm : str
+        Name of the realm served.
+    access_token_lifespan : float
+        Life duration of the issued access tokens, in seconds.
+    refresh_token_lifespan : float
+        Life duration of the issued refresh tokens, in seconds.
+    session_max : float
+        SSO session maximum: number of seconds after the authentication at which the
+        refresh tokens of the session expire whatever their rotations, None for no limit.
+    latency : float
+        Number of seconds waited before answering each request.
+    failure_rate : float
+        Probability of answering a request with a 503 status.
+    requests : collections.Counter
+        Number of requests received, by grant type ('well_known' for the discovery).
+    clock : callable
+        Source of the issue times of the tokens.
+    """
+
+    def __init__(self, realm: str = DEFAULT_REALM, access_token_lifespan: float = 300,
+                 refresh_token_lifespan: float = 1800, signing_key: Optional[bytes] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.realm = realm
+        self.access_token_lifespan = access_token_lifespan
+        self.refresh_token_lifespan = refresh_token_lifespan
+        self.session_max: Optional[float] = None
+        self.signing_key = signing_key or os.urandom(32)
+        self.latency = 0.0
+        self.failure_rate = 0.0
+        self.requests: collections.Counter = collections.Counter()
+        self.clock: Callable[[], float] = time.time
+        self.users: Dict[str, str] = {}
+        # client identifier -> secret, None for the public clients
+        self.clients: Dict[str, Optional[str]] = {DEFAULT_CLIENT_ID: None}
+        self._failures: Deque[int] = collections.deque()
+        self._lock = threading.Lock()
+        self._address = (host, port)
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "KeycloakStub":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+    def start(self) -> "KeycloakStub":
+        stub = self
+
+        class Handler(_StubRequestHandler):
+            keycloak_stub = stub
+
+        self._server = ThreadingHTTPServer(self._address, Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    @property
+    def server_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/auth/"
+
+    @property
+    def issuer(self) -> str:
+        return f"{self.server_url}realms/{self.realm}"
+
+    def add_user(self, username: str, password: str):
+        self.users[username] = password
+
+    def add_client(self, client_id: str, secret: Optional[str] = None):
+        """
+        Register a client, confidential (allowed to use 'client_credentials') if a secret
+        is given.
+        """
+        self.clients[client_id] = secret
+
+    def fail_next(self, count: int = 1, status: int = 503):
+        """
+        Answer the next 'count' requests with the given HTTP status.
+        """
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def keycloak_config(self, client_id: str = DEFAULT_CLIENT_ID) -> Dict:
+        return {"SERVER_URL": self.server_url, "REALM_NAME": self.realm, "CLIENT_ID": client_id}
+
+    def write_keycloak_config(self, path, client_id: str = DEFAULT_CLIENT_ID) -> str:
+        """
+        Write a keycloak configuration file pointing to the stub and return its path.
+        """
+        with open(path, "w") as config_file:
+            yaml.dump(self.keycloak_config(client_id), config_file)
+        return str(path)
+
+    def sign(self, claims: Dict) -> str:
+        header = _b64encode(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+        payload = _b64encode(json.dumps(claims).encode())
+        signature = hmac.new(
+            self.signing_key, f"{header}.{payload}".encode(), hashlib.sha256
+        ).digest()
+        return f"{header}.{payload}.{_b64encode(signature)}"
+
+    def decode(self, token: str) -> Dict:
+        """
+        Return the claims of a token issued by the stub, checking its signature and
+        expiry.
+        """
+        try:
+            header, payload, signature = token.split(".")
+        except ValueError as error:
+            raise ValueError("⚠️  ValueError. The token is not a JWT") from error
+        expected = hmac.new(
+            self.signing_key, f"{header}.{payload}".encode(), hashlib.sha256
+        ).digest()
+        if not hmac.compare_digest(_b64decode(signature), expected):
+            raise ValueError("⚠️  ValueError. Invalid token signature")
+        claims = json.loads(_b64decode(payload))
+        if claims["exp"] <= self.clock():
+            raise ValueError("⚠️  ValueError. Token expired")
+        return claims
+
+    def issue(self, subject: str, client_id: str, session_id: Optional[str] = None,
+              auth_time: Optional[int] = None, refresh: bool = True,
+              scope: str = "openid profile", **claims) -> Dict:
+        """
+        Return the token payload of the given subject, as answered by keycloak.
+        """
+        now = int(self.clock())
+        session_id = session_id or str(uuid.uuid4())
+        common = {
+            "iss": self.issuer, "sub": subject, "azp": client_id, "iat": now,
+            "sid": session_id, "auth_time": auth_time or now, "scope": scope,
+        }
+        payload = {
+            "access_token": self.sign(dict(
+                common, exp=now + int(self.access_token_lifespan), typ="Bearer",
+                jti=str(uuid.uuid4()), preferred_username=subject, **claims
+            )),
+            "expires_in": int(self.access_token_lifespan),
+            "token_type": "Bearer",
+            "scope": common["scope"],
+            "session_state": session_id,
+        }
+        if refresh:
+            refresh_expires_at = now + int(self.refresh_token_lifespan)
+            if self.session_max is not None:
+                refresh_expires_at = min(
+                    refresh_expires_at, common["auth_time"] + int(self.session_max)
+                )
+            payload.update(
+                refresh_token=self.sign(dict(
+                    common, exp=refresh_expires_at, typ="Refresh", jti=str(uuid.uuid4())
+                )),
+                refresh_expires_in=refresh_expires_at - now,
+            )
+        return payload
+
+    def _injected_failure(self) -> Optional[int]:
+        with self._lock:
+            if self._failures:
+                return self._failures.popleft()
+        if self.failure_rate and random.random() < self.failure_rate:
+            return 503
+        return None
+
+    def _authenticate_client(self, form: Dict[str, str], confidential: bool = False) -> str:
+        client_id = form.get("client_id")
+        if client_id not in self.clients:
+            raise StubError(401, "invalid_client", "Invalid client credentials")
+        secret = self.clients[client_id]
+        if secret is None and confidential:
+            raise StubError(401, "unauthorized_client", "Public client not allowed")
+        if secret is not None and form.get("client_secret") != secret:
+            raise StubError(401, "unauthorized_client", "Invalid client secret")
+        return client_id
+
+    def grant(self, form: Dict[str, str]) -> Dict:
+        """
+        Answer a request of the token endpoint, raising StubError for the rejected ones.
+        """
+        grant_type = form.get("grant_type")
+        self.requests[grant_type] += 1
+        # 'urn:ietf:params:oauth:grant-type:token-exchange' -> '_grant_token_exchange'
+        handler_name = str(grant_type).rsplit(":", 1)[-1].replace("-", "_")
+        handler = getattr(self, f"_grant_{handler_name}", None)
+        if handler is None:
+            raise StubError(400, "unsupported_grant_type", f"Unsupported grant type {grant_type}")
+        return handler(form)
+
+    def _grant_password(self, form: Dict[str, str]) -> Dict:
+        client_id = self._authenticate_client(form)
+        username = form.get("username")
+        if username not in self.users or self.users[username] != form.get("password"):
+            raise StubError(401, "invalid_grant", "Invalid user credentials")
+        return self.issue(username, client_id)
+
+    def _grant_client_credentials(self, form: Dict[str, str]) -> Dict:
+        client_id = self._authenticate_client(form, confidential=True)
+        return self.issue(f"service-account-{client_id}", client_id, refresh=False)
+
+    def _grant_refresh_token(self, form: Dict[str, str]) -> Dict:
+        client_id = self._authenticate_client(form)
+        try:
+            claims = self.decode(form.get("refresh_token", ""))
+        except ValueError as error:
+            raise StubError(400, "invalid_grant", f"Invalid refresh token: {error}") from error
+        if claims.get("typ") != "Refresh" or claims.get("azp") != client_id:
+            raise StubError(400, "invalid_grant", "Invalid refresh token")
+        return self.issue(claims["sub"], client_id, claims["sid"], claims["auth_time"])
+
+    def _grant_token_exchange(self, form: Dict[str, str]) -> Dict:
+        """
+        Exchange an access token for one of the same subject and session, issued for the
+        requested audience (a registered client) with a subset of its scopes.
+        """
+        client_id = self._authenticate_client(form)
+        if form.get("subject_token_type", ACCESS_TOKEN_TYPE) != ACCESS_TOKEN_TYPE:
+            raise StubError(400, "invalid_request", "Unsupported subject token type")
+        try:
+            claims = self.decode(form.get("subject_token", ""))
+        except ValueError as error:
+            raise StubError(400, "invalid_token", f"Invalid subject token: {error}") from error
+        if claims.get("typ") != "Bearer":
+            raise StubError(400, "invalid_token", "Invalid subject token")
+        audience = form.get("audience")
+        if audience is not None and audience not in self.clients:
+            raise StubError(400, "invalid_client", f"Audience {audience} not found")
+        subject_scopes = claims["scope"].split()
+        scopes = form.get("scope", "openid").split()
+        if not set(scopes) <= set(subject_scopes):
+            raise StubError(400, "invalid_scope", "Scopes not granted to the subject token")
+        extra_claims = {} if audience is None else {"aud": audience}
+        return self.issue(
+            claims["sub"], client_id, claims["sid"], claims["auth_time"], refresh=False,
+            scope=" ".join(scopes), **extra_claims
+        )
+
+    def well_known(self) -> Dict:
+        self.requests["well_known"] += 1
+        return {
+            "issuer": self.issuer,
+            "token_endpoint": f"{self.issuer}/protocol/openid-connect/token",
+            "grant_types_supported": [
+                "password", "refresh_token", "client_credentials", TOKEN_EXCHANGE_GRANT
+            ],
+            "id_token_signing_alg_values_supported": ["HS256"],
+        }
+
+
+class _StubRequestHandler(BaseHTTPRequestHandler):
+
+    keycloak_stub: KeycloakStub = None
+
+    def log_message(self, *args):
+        pass
+
+    def _answer(self, status: int, body: Dict):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _route(self, pattern: re.Pattern) -> Tuple[bool, Optional[int]]:
+        """
+        Return whether the path matches the pattern and, if so, the status of the
+        injected failure or of the unknown realm, if any.
+        """
+        stub = self.keycloak_stub
+        match = pattern.search(self.path.split("?")[0])
+        if match is None:
+            return False, None
+        time.sleep(stub.latency)
+        failure = stub._injected_failure()
+        if failure is not None:
+            return True, failure
+        if match.group("realm") != stub.realm:
+            return True, 404
+        return True, None
+
+    def do_GET(self):
+        matched, status = self._route(WELL_KNOWN_PATH)
+        if not matched:
+            self._answer(404, {"error": "not_found"})
+        elif status is not None:
+            self._answer(status, {"error": "unavailable"})
+        else:
+            self._answer(200, self.keycloak_stub.well_known())
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = {
+            key: values[0]
+            for key, values in parse_qs(self.rfile.read(length).decode()).items()
+        }
+        matched, status = self._route(TOKEN_PATH)
+        if not matched:
+            self._answer(404, {"error": "not_found"})
+        elif status is not None:
+            self._answer(status, {"error": "temporarily_unavailable"})
+        else:
+            try:
+                self._answer(200, self.keycloak_stub.grant(form))
+            except StubError as error:
+                self._answer(error.status, error.body)
+
+
+try:
+    import pytest
+except ImportError:
+    pytest = None
+
+if pytest is not None:
+
+    @pytest.fixture
+    def keycloak_stub(tmp_path, monkeypatch):
+        """
+        Start a keycloak stub with the user 'user' (password 'password') and the service
+        account 'service-client' (secret 'secret'), and make it the default keycloak
+        configuration of the token fetchers.
+        """
+        with KeycloakStub() as stub:
+            stub.add_user(DEFAULT_USERNAME, DEFAULT_PASSWORD)
+            stub.add_client(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET)
+            config_file = stub.write_keycloak_config(tmp_path / "keycloak_config.yaml")
+            monkeypatch.setattr(
+                TokenFetcherBase, "_config_file_path",
+                staticmethod(lambda keycloak_config_file=None: keycloak_config_file or config_file)
+            )
+            yield stub
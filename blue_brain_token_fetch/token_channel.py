@@ -0,0 +1,95 @@
+"""This class allows a token fetcher to share its access token with the processes forked
+from the one that created it (multiprocessing, gunicorn preloading, Dask workers...).
+The token lives in an anonymous shared memory mapping inherited through fork: the owner
+process writes each new token in it, and the forked children read it without locking,
+a sequence counter letting them detect and retry the reads overlapping a write.
+The fetchers created with 'share_with_forks' own a channel from their authentication,
+and register themselves with 'track_fetcher' so that the fork hook resets the state
+the children inherit from the parent.
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+import weakref
+from typing import Tuple
+
+
+class SharedTokenChannel:
+    """
+    A class to represent the shared memory holding the latest access token of a fetcher.
+
+    Attributes
+    ----------
+    owner_pid : int
+        Identifier of the process writing the tokens.
+    """
+
+    # sequence number, local expiry timestamp, token length
+    HEADER = struct.Struct("<QdI")
+    DEFAULT_SIZE = 64 * 1024
+    MAX_READ_ATTEMPTS = 1000
+
+    def __init__(self, size: int = DEFAULT_SIZE):
+        self._mmap = mmap.mmap(-1, size)
+        self._capacity = size - self.HEADER.size
+        self._lock = threading.Lock()
+        self.owner_pid = os.getpid()
+
+    @property
+    def is_owner(self) -> bool:
+        return os.getpid() == self.owner_pid
+
+    def publish(self, access_token: str, expires_at: float):
+        """
+        Write the access token and its local expiry timestamp in the shared memory.
+        """
+        data = access_token.encode()
+        if len(data) > self._capacity:
+            raise ValueError(
+                f"⚠️  ValueError. The access token ({len(data)} bytes) does not fit in the "
+                f"shared token channel ({self._capacity} bytes)"
+            )
+
+        with self._lock:
+            sequence = self.HEADER.unpack_from(self._mmap)[0]
+            # an odd sequence number flags a write in progress
+            self.HEADER.pack_into(self._mmap, 0, sequence + 1, 0.0, 0)
+            self._mmap[self.HEADER.size:self.HEADER.size + len(data)] = data
+            self.HEADER.pack_into(self._mmap, 0, sequence + 2, expires_at, len(data))
+
+    def read(self) -> Tuple[str, float]:
+        """
+        Return the last published access token and its local expiry timestamp.
+        """
+        for _ in range(self.MAX_READ_ATTEMPTS):
+            sequence, expires_at, length = self.HEADER.unpack_from(self._mmap)
+            if sequence % 2 == 0:
+                data = self._mmap[self.HEADER.size:self.HEADER.size + length]
+                if self.HEADER.unpack_from(self._mmap)[0] == sequence:
+                    if sequence == 0:
+                        raise LookupError("⚠️  LookupError. No token published in the channel")
+                    return data.decode(), expires_at
+            time.sleep(0)
+
+        raise RuntimeError("⚠️  RuntimeError. The shared token channel is never stable")
+
+
+_fetchers: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def track_fetcher(fetcher):
+    """
+    Have the fork hook called on the given fetcher.
+    """
+    _fetchers.add(fetcher)
+
+
+def _after_fork_in_child():
+    for fetcher in list(_fetchers):
+        fetcher._after_fork_in_child()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
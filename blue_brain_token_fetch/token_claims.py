@@ -0,0 +1,30 @@
+"""This function allows to read the claims carried by a JWT token (such as 'exp', 'iat',
+'sub', 'azp' or 'scope') locally: the signature is not verified and the Keycloak server
+is never contacted.
+"""
+import base64
+import json
+from typing import Dict
+
+
+def decode_claims(token: str) -> Dict:
+    """
+    Take in input a JWT token and return the claims contained in its payload segment.
+
+    Parameters:
+        token : (string) JWT of the form '{header}.{payload}.{signature}'.
+
+    Returns:
+        claims of the token (dict).
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+    except (AttributeError, IndexError, ValueError) as error:
+        raise ValueError(f"⚠️  ValueError. The token is not a valid JWT: {error}") from error
+
+    if not isinstance(claims, dict):
+        raise ValueError("⚠️  ValueError. The token payload is not a JSON object")
+
+    return claims
@@ -0,0 +1,144 @@
+"""This class allows a token fetcher to obtain, with the OAuth 2.0 token exchange
+(RFC 8693), the tokens expected by the services needing another audience or narrower
+scopes: the access token of the fetcher is exchanged at keycloak for a downscoped one,
+without any new password grant, and the exchanged tokens are cached per audience and
+scopes until shortly before they expire, or until the fetcher opens a new session
+(switch to another realm, new authentication).
+The client of the fetcher must be allowed by keycloak to exchange its tokens for the
+requested audiences (token exchange feature and permissions of the realm).
+"""
+import itertools
+import threading
+from typing import Dict, Optional, Tuple
+
+from blue_brain_token_fetch.token_fetcher_base import TokenFetcherBase
+from blue_brain_token_fetch.token_record import TokenRecord
+from blue_brain_token_fetch.tracing import span
+
+TOKEN_EXCHANGE_GRANT = "urn:ietf:params:oauth:grant-type:token-exchange"
+ACCESS_TOKEN_TYPE = "urn:ietf:params:oauth:token-type:access_token"
+
+ExchangeKey = Tuple[Optional[str], Optional[str]]
+
+
+class TokenExchanger:
+    """
+    A class to represent the tokens derived from the session of a fetcher.
+
+    Attributes
+    ----------
+    fetcher : TokenFetcherBase
+        Fetcher whose access token is exchanged.
+    min_validity : float
+        Minimal validity, in seconds, of the cached tokens handed out.
+
+    Methods
+    -------
+    get_token(audience, scope):
+        Return the cached token of the audience and scopes, or a freshly exchanged one.
+    renew_token(rejected_token, audience, scope):
+        Return a freshly exchanged token replacing a rejected one.
+    cached():
+        Return the audiences and scopes of the cached tokens with their expiries.
+    clear():
+        Forget the cached tokens.
+    """
+
+    def __init__(self, fetcher: TokenFetcherBase,
+                 min_validity: float = TokenFetcherBase.TOKEN_REFRESH_MARGIN):
+        self.fetcher = fetcher
+        self.min_validity = min_validity
+        self._tokens: Dict[ExchangeKey, TokenRecord] = {}
+        self._locks: Dict[ExchangeKey, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._versions = itertools.count(1)
+        self._session = fetcher.session_generation()
+
+    @staticmethod
+    def _key(audience: Optional[str], scope: Optional[str]) -> ExchangeKey:
+        # the same scopes in another order are the same token
+        return audience, " ".join(sorted(set(scope.split()))) if scope else None
+
+    def _key_lock(self, key: ExchangeKey) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _current_tokens(self) -> Dict[ExchangeKey, TokenRecord]:
+        """
+        Return the cached tokens, forgotten when the fetcher opened a new session.
+        """
+        session = self.fetcher.session_generation()
+        if session != self._session:
+            with self._lock:
+                if session != self._session:
+                    self._tokens.clear()
+                    self._session = session
+        return self._tokens
+
+    def _is_valid(self, token: Optional[TokenRecord]) -> bool:
+        return token is not None and self.fetcher.time_to_expiry(token) > self.min_validity
+
+    def get_token(self, audience: Optional[str] = None, scope: Optional[str] = None) -> str:
+        """
+        Return the access token for the given audience (client identifier) and
+        space-separated scopes. The cached one is returned while it stays valid for at
+        least 'min_validity' seconds, otherwise the access token of the fetcher is
+        exchanged, only one thread doing so for the same audience and scopes.
+        """
+        key = self._key(audience, scope)
+        token = self._current_tokens().get(key)
+        if self._is_valid(token):
+            with span("TokenExchanger.get_token", audience=str(audience), scope=str(key[1]),
+                      cache_hit=True):
+                return token.access_token
+
+        with self._key_lock(key):
+            token = self._current_tokens().get(key)
+            if self._is_valid(token):
+                return token.access_token
+            return self._exchange(key).access_token
+
+    def renew_token(self, rejected_token: str, audience: Optional[str] = None,
+                    scope: Optional[str] = None) -> str:
+        """
+        Exchange again the token of the given audience and scopes to replace
+        'rejected_token' (ex: refused by a server with a 401 status), unless another
+        thread already replaced it.
+        """
+        key = self._key(audience, scope)
+        with self._key_lock(key):
+            token = self._current_tokens().get(key)
+            if token is not None and token.access_token != rejected_token:
+                return token.access_token
+            return self._exchange(key).access_token
+
+    def cached(self) -> Dict[ExchangeKey, float]:
+        """
+        Return the local expiry timestamps of the cached tokens, by audience and scopes.
+        """
+        return {
+            key: self.fetcher.expires_at(token)
+            for key, token in self._current_tokens().items()
+        }
+
+    def clear(self):
+        self._tokens.clear()
+
+    def _exchange(self, key: ExchangeKey) -> TokenRecord:
+        audience, scope = key
+        session = self.fetcher.session_generation()
+        options = {
+            "subject_token_type": ACCESS_TOKEN_TYPE,
+            "requested_token_type": ACCESS_TOKEN_TYPE,
+        }
+        if scope is not None:
+            options["scope"] = scope
+
+        with span("TokenExchanger.get_token", audience=str(audience), scope=str(scope),
+                  cache_hit=False):
+            payload, received_at = self.fetcher.exchange_token(audience, **options)
+        token = TokenRecord.from_payload(payload, received_at, next(self._versions))
+        # not cached if the fetcher opened a new session meanwhile
+        if self.fetcher.session_generation() == session:
+            self._tokens[key] = token
+        return token
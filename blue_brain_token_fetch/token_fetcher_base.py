@@ -4,9 +4,12 @@ It contains 2 public methods to get a fresh Nexus access token and to get its li
 duration.
 For more information about Nexus, see https://bluebrainnexus.io/
 """
+import itertools
 import os
+import threading
+import time
 from abc import abstractmethod, ABC
-from typing import Dict, Tuple, List
+from typing import Callable, Dict, Tuple, List, NamedTuple, Optional
 
 import getpass
 import logging
@@ -15,10 +18,44 @@ import yaml
 from keycloak import KeycloakOpenID
 from keycloak.exceptions import KeycloakError, KeycloakAuthenticationError
 
+from blue_brain_token_fetch.profiling import phase
+from blue_brain_token_fetch.tracing import span
+from blue_brain_token_fetch.job import Job
+from blue_brain_token_fetch.token_channel import SharedTokenChannel, track_fetcher
+from blue_brain_token_fetch.rate_limiter import TokenBucket, get_rate_limiter
+from blue_brain_token_fetch.clock_skew import ClockSkewEstimator, get_estimator
+from blue_brain_token_fetch.token_record import TokenRecord
+from blue_brain_token_fetch.token_lease import LeaseStats, TokenLease
+from blue_brain_token_fetch.config_watcher import ConfigWatcher
+from blue_brain_token_fetch.health import HealthRecorder
+from blue_brain_token_fetch.keycloak_config import (
+    ConfigProfileError, load_config_file, load_keycloak_config, missing_keys
+)
+from blue_brain_token_fetch.endpoint_pool import (
+    DEFAULT_PROBE_INTERVAL, EndpointPool, server_urls
+)
+
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
+class FetcherClosedError(RuntimeError):
+    """
+    Raised for the token of a lazy fetcher closed before its first access.
+    """
+
+
+class _Connection(NamedTuple):
+    """
+    The keycloak configuration of a fetcher with the realm, clock skew and rate limit
+    state of its server, replaced as a whole when switching to another configuration.
+    """
+    keycloak_config: Optional[Dict]
+    realm_name: Optional[str]
+    clock_skew: ClockSkewEstimator
+    rate_limiter: TokenBucket
+
+
 class TokenFetcherBase(ABC):
     """
     A class to represent a Token Fetcher.
@@ -38,6 +75,28 @@ class TokenFetcherBase(ABC):
         Return a fresh Nexus access token.
     get_access_token_duration():
         Return the access token life duration.
+    snapshot():
+        Return the immutable record of the current token.
+    claims():
+        Return the claims of the current access token.
+    expires_at():
+        Return the expiration timestamp of the current access token.
+    time_to_expiry():
+        Return the number of seconds left before the current access token expires.
+    clock_skew():
+        Return the estimated clock offset of the keycloak server.
+    get_valid_access_token(min_validity):
+        Return the cached access token, or a fresh one if it is about to expire.
+    lease(min_validity):
+        Return a lease on an access token staying valid for at least 'min_validity'.
+    lease_stats():
+        Return the statistics of the lease durations.
+    renew_access_token(rejected_token):
+        Return a fresh access token replacing a rejected one.
+    reload_keycloak_config():
+        Switch to the connection settings of the keycloak configuration file.
+    close():
+        Stop the perpetual refreshing.
     """
 
     DEFAULT_CONFIG_FILENAME = "keycloack_config.yaml"
@@ -52,7 +111,42 @@ class TokenFetcherBase(ABC):
     DEFAULT_CONFIG_FILEPATH_LABEL = os.path.join(DEFAULT_DIRECTORY, DEFAULT_CONFIG_FILENAME)
     DEFAULT_TOKEN_FILEPATH_LABEL = os.path.join(DEFAULT_DIRECTORY, DEFAULT_TOKEN_FILENAME)
 
-    def __init__(self, username=None, password=None, keycloak_config_file=None):
+    GRANT_TYPE = "password"
+    # section of the profiles of the keycloak configuration file for this kind of account
+    CONFIG_SECTION: Optional[str] = None
+    # minimal validity, in seconds, of the cached access token handed out
+    TOKEN_REFRESH_MARGIN = 30
+    # seconds before a keycloak request is abandoned, unless the configuration gives a
+    # 'TIMEOUT' (shorter timeouts fail over faster to the other servers of a list)
+    KEYCLOAK_TIMEOUT = 60
+
+    _connection: _Connection = _Connection(
+        None, None, ClockSkewEstimator(), TokenBucket(rate=None)
+    )
+    # connection of the configuration being validated, for the thread validating it
+    _candidate: threading.local = threading.local()
+    _token: Optional[TokenRecord] = None
+    _interrupt_callback: Optional[Callable] = None
+    _channel: Optional[SharedTokenChannel] = None
+    _publisher_callback: Optional[Callable] = None
+    _keycloak_config_file: Optional[str] = None
+    _config_profile: Optional[str] = None
+    _credentials: Optional[Tuple[str, str]] = None
+    _config_watcher: Optional[ConfigWatcher] = None
+    _probe_callback: Optional[Callable] = None
+    # local time of the fetcher, a virtual clock in a simulation
+    _clock: Callable[[], float] = staticmethod(time.time)
+    _health_recorder: Optional[HealthRecorder] = None
+    # credentials and settings of a lazy fetcher, until its first access to the token
+    _pending_initialization: Optional[Tuple] = None
+    _initialization_lock: Optional[threading.Lock] = None
+    _initializing_thread: Optional[int] = None
+    _closed = False
+    _session_generation = 0
+
+    def __init__(self, username=None, password=None, keycloak_config_file=None,
+                 keycloak_config=None, watch_config=False, state_file=None, lazy=False,
+                 config_profile=None, share_with_forks=False, clock=None):
         """
         Constructs all the necessary attributes for the TokenFetcher object. After
         that, call the appropriate method launching the perpetual token refreshing
@@ -66,17 +160,85 @@ class TokenFetcherBase(ABC):
                 gaspard identifier to access the Nexus token
             keycloak_config_file : str (file path)
                 Path of the keycloak configuration file
+            keycloak_config : dict
+                Keycloak configuration already loaded, in which case the configuration
+                file is not read
+            watch_config : bool
+                Whether to reload the keycloak configuration file when it changes, in
+                which case the credentials are kept in memory to authenticate against
+                the new connection settings
+            state_file : str (file path)
+                Path of the state record kept up to date for the 'health' subcommand:
+                time of the last refresh, expiry, consecutive failures and process id
+            lazy : bool
+                Whether to defer the authentication (and any network call) to the first
+                access to the token, the credentials being kept in memory until then
+            config_profile : str
+                Profile of the keycloak configuration file, its default profile if not
+                given
+            share_with_forks : bool
+                Whether to publish the access token in a shared memory channel, kept up
+                to date by a thread, from which the forked processes read it instead of
+                authenticating again
+            clock : callable
+                Function returning the local time of the fetcher, time.time by default
         """
 
-        username, password = self._get_credentials(username, password)
-        keycloak_config = self._load_keycloak_config(keycloak_config_file)
-
+        if clock is not None:
+            self._clock = clock
+        # re-entrant, the refreshing methods calling each other
+        self._refresh_lock = threading.RLock()
+        self._candidate = threading.local()
+        # numbers and publishes the tokens, the refreshing threads holding the refresh lock
+        self._token_lock = threading.Lock()
+        self._versions = itertools.count(1)
+        self._lease_stats = LeaseStats()
+        self._share_with_forks = share_with_forks
+        if state_file is not None:
+            self._health_recorder = HealthRecorder(state_file)
+
+        with span(f"{self.__class__.__name__}.__init__", grant_type=self.GRANT_TYPE) as init_span:
+            with phase("init.credentials"):
+                username, password = self._get_credentials(username, password)
+            with phase("init.config"):
+                if keycloak_config is None:
+                    self._keycloak_config_file = self._config_file_path(keycloak_config_file)
+                    self._config_profile = config_profile
+                    keycloak_config = self._load_keycloak_config(
+                        keycloak_config_file, config_profile
+                    )
+            self._connection = self._connection_for(keycloak_config)
+            init_span.set_attribute("realm", self._realm_name)
+
+            if lazy:
+                self._initialization_lock = threading.Lock()
+                self._pending_initialization = (username, password, keycloak_config, watch_config)
+            else:
+                self._initialize(username, password, keycloak_config, watch_config)
+
+    def _initialize(self, username, password, keycloak_config: Dict, watch_config: bool):
+        """
+        Authenticate, then start the perpetual refreshing (and the configuration watch).
+        """
         try:
-            self._keycloak_openid, self._keycloak_payload = self._get_keycloak_instance_and_payload(
-                username, password, keycloak_config
-            )
+            with phase("init.authentication"):
+                self._keycloak_openid, _ = \
+                    self._get_keycloak_instance_and_payload(username, password, keycloak_config)
 
-            self._interrupt_callback = self._refresh_perpetually()
+            with phase("init.refresh_scheduling"):
+                self._interrupt_callback = self._refresh_perpetually()
+                self._probe_callback = self._probe_perpetually()
+
+            track_fetcher(self)
+            if self._share_with_forks:
+                self._publish_to_forks()
+
+            if watch_config and self._keycloak_config_file is not None:
+                self._credentials = (username, password)
+                self._config_watcher = ConfigWatcher(
+                    self._keycloak_config_file, self._on_config_change
+                )
+                self._config_watcher.start()
 
             del password
 
@@ -84,10 +246,65 @@ class TokenFetcherBase(ABC):
             logger.error("⚠️ %s. Authentication failed, %s", error.__class__.__name__, error)
             raise error
 
+    def _complete_initialization(self) -> bool:
+        """
+        Run the deferred initialization of a lazy fetcher, once, whichever thread first
+        needs the token. Return whether this call authenticated.
+        """
+        if self._pending_initialization is None \
+                or self._initializing_thread == threading.get_ident():
+            # the grant itself reads the token being received
+            self._check_authenticated()
+            return False
+        with self._initialization_lock:
+            pending = self._pending_initialization
+            if pending is None:
+                # authenticated by another thread, or closed meanwhile
+                self._check_authenticated()
+                return False
+            self._initializing_thread = threading.get_ident()
+            try:
+                with span(f"{self.__class__.__name__}.deferred_initialization",
+                          grant_type=self.GRANT_TYPE, realm=self._realm_name):
+                    # kept on failure, so that the next access tries again
+                    self._initialize(*pending)
+            finally:
+                self._initializing_thread = None
+            self._pending_initialization = None
+            return True
+
+    def _check_authenticated(self):
+        """
+        Raise a FetcherClosedError for a lazy fetcher closed before authenticating.
+        """
+        if self._closed and self._token is None:
+            raise FetcherClosedError(
+                "⚠️  FetcherClosedError. The fetcher was closed before its first access "
+                "to the token"
+            )
+
+    def authenticate(self):
+        """
+        Authenticate a lazy fetcher now, if not done yet (nothing for the other ones).
+        """
+        self._complete_initialization()
+
     @abstractmethod
     def _refresh_perpetually(self):
         ...
 
+    def refresh_job_interval(self) -> Optional[float]:
+        """
+        Return the number of seconds between the runs of the refreshing job of the
+        fetcher, None if it has none.
+        """
+        return None
+
+    def run_refresh_job(self):
+        """
+        Run the refreshing job of the fetcher once, as its thread does at each interval.
+        """
+
     @classmethod
     @abstractmethod
     def config_keys(cls) -> Dict[str, bool]:
@@ -96,36 +313,41 @@ class TokenFetcherBase(ABC):
         """
         pass
 
-    @classmethod
-    def _load_keycloak_config(cls, keycloak_config_file=None):
+    @staticmethod
+    def _config_file_path(keycloak_config_file=None) -> str:
+        return keycloak_config_file or TokenFetcherBase.DEFAULT_TOKEN_FILEPATH
 
-        if keycloak_config_file:
-            file_name = keycloak_config_file
-        else:
-            file_name = TokenFetcherBase.DEFAULT_TOKEN_FILEPATH
-            logger.info('Keycloak configuration file found : %s', file_name)
+    @classmethod
+    def _parse_keycloak_config(cls, file_name: str, config_profile: Optional[str] = None,
+                               reload: bool = False) -> Dict:
+        """
+        Return the configuration of the given profile of the file for this kind of
+        account, the file being parsed once per process unless it changes (or 'reload'
+        is set).
+        """
+        if reload:
+            load_config_file(file_name, reload=True)
+        config_content = load_keycloak_config(file_name, config_profile, cls.CONFIG_SECTION)
+
+        missing = missing_keys(config_content, cls.config_keys())
+        if missing:
+            raise KeyError(
+                f"⚠️  KeyError {missing[0]!r}. Mandatory keys in the keycloak configuration "
+                f"file are {cls.config_keys()}"
+            )
 
-        try:
-            if not os.path.exists(file_name):
-                raise FileNotFoundError(f"⚠️  FileNotFoundError. Cannot find file {file_name}")
-            try:
-                with open(file_name) as config_file:
-                    config_content = yaml.safe_load(config_file.read().strip())
-            except OSError as error:
-                raise OSError(f"⚠️  OSError. {error}") from error
+        return config_content
 
-            if config_content is None:
-                raise ValueError("⚠️  Keycloak configuration file is empty")
+    @classmethod
+    def _load_keycloak_config(cls, keycloak_config_file=None,
+                              config_profile: Optional[str] = None):
 
-            try:
-                [config_content[key] for key, mandatory in cls.config_keys().items() if mandatory]
-            except KeyError as error:
-                raise KeyError(
-                    f"⚠️  KeyError {error}. Mandatory keys in the keycloak configuration file are"
-                    f" {cls.config_keys()}"
-                ) from error
+        file_name = cls._config_file_path(keycloak_config_file)
+        if not keycloak_config_file:
+            logger.info('Keycloak configuration file found : %s', file_name)
 
-            return config_content
+        try:
+            return cls._parse_keycloak_config(file_name, config_profile)
 
         except Exception as e:
 
@@ -133,7 +355,9 @@ class TokenFetcherBase(ABC):
                 "Error when extracting the keycloak configuration from %s. %s.", file_name, e
             )
 
-            if keycloak_config_file is not None:
+            # the profiles of a file are never replaced by a single prompted one
+            if keycloak_config_file is not None or config_profile is not None \
+                    or isinstance(e, ConfigProfileError):
                 raise e
 
             logger.info("This latter will be reset with the new given configuration:")
@@ -156,17 +380,499 @@ class TokenFetcherBase(ABC):
 
             return config_dict
 
+    def _connection_for(self, keycloak_config: Dict) -> _Connection:
+        """
+        Return the connection of the given configuration, with the realm, clock skew and
+        rate limit state of its server.
+        """
+        # the servers of a list are replicas of the same cluster, they share their state
+        server_url = server_urls(keycloak_config)[0]
+        realm_name = keycloak_config["REALM_NAME"]
+        return _Connection(
+            keycloak_config, realm_name, get_estimator(server_url),
+            get_rate_limiter(server_url, realm_name)
+        )
+
+    def _active_connection(self) -> _Connection:
+        return getattr(self._candidate, "connection", None) or self._connection
+
+    @property
+    def _keycloak_config(self) -> Optional[Dict]:
+        return self._active_connection().keycloak_config
+
+    @property
+    def _realm_name(self) -> Optional[str]:
+        return self._active_connection().realm_name
+
+    @property
+    def _clock_skew(self) -> ClockSkewEstimator:
+        return self._active_connection().clock_skew
+
+    @property
+    def _rate_limiter(self) -> TokenBucket:
+        return self._active_connection().rate_limiter
+
+    def _create_keycloak_connection(self, username, password, keycloak_config: Dict):
+        """
+        Return a keycloak instance for a single server URL, or a pool of instances
+        failing over to each other for a list of them.
+        """
+        urls = server_urls(keycloak_config)
+        if isinstance(keycloak_config["SERVER_URL"], str):
+            return self._create_keycloak_instance(username, password, keycloak_config)
+        pool = EndpointPool([
+            self._create_keycloak_instance(
+                username, password, dict(keycloak_config, SERVER_URL=url)
+            )
+            for url in urls
+        ])
+        pool.probe()
+        return pool
+
+    def _probe_perpetually(self) -> Optional[Callable]:
+        """
+        Launch the thread probing the servers of the pool, if any.
+        """
+        if not isinstance(self._keycloak_openid, EndpointPool):
+            return None
+        return Job.schedule(
+            self._keycloak_openid.probe, DEFAULT_PROBE_INTERVAL,
+            "stopping probing of the keycloak servers"
+        )
+
+    def _connection_settings(self, keycloak_config: Dict) -> Dict:
+        return {key: keycloak_config.get(key) for key in self.config_keys()}
+
+    def _on_config_change(self):
+        """
+        Called by the configuration watcher: parse the changed file and reload it if the
+        connection settings differ. An invalid file is ignored.
+        """
+        try:
+            keycloak_config = self._parse_keycloak_config(
+                self._keycloak_config_file, self._config_profile, reload=True
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            logger.warning(
+                "⚠️  The changed keycloak configuration file %s is ignored. %s",
+                self._keycloak_config_file, error
+            )
+            return
+        if self._connection_settings(keycloak_config) != \
+                self._connection_settings(self._keycloak_config):
+            self.reload_keycloak_config(keycloak_config)
+
+    def reload_keycloak_config(self, keycloak_config: Optional[Dict] = None) -> bool:
+        """
+        Authenticate against the connection settings of the given configuration (the
+        watched configuration file by default) with a new keycloak instance, and switch
+        to it only once it issued a token: until then, and if it fails, the current
+        instance and its cached token are kept. Return whether the switch happened.
+        """
+        if self._credentials is None:
+            raise RuntimeError(
+                "⚠️  RuntimeError. The credentials are only kept by the fetchers created "
+                "with 'watch_config=True'"
+            )
+        if keycloak_config is None:
+            keycloak_config = self._parse_keycloak_config(
+                self._keycloak_config_file, self._config_profile, reload=True
+            )
+        username, password = self._credentials
+
+        with self._refresh_lock:
+            connection = self._connection_for(keycloak_config)
+            with span(f"{self.__class__.__name__}.reload_keycloak_config",
+                      realm=connection.realm_name):
+                # the validation grant is rate limited and timed against the new server,
+                # its token is kept aside until the switch
+                self._candidate.connection = connection
+                try:
+                    instance = self._create_keycloak_connection(
+                        username, password, keycloak_config
+                    )
+                    self._authenticate(instance, username, password)
+                    payload, received_at = self._candidate.payload
+                except Exception as error:  # pylint: disable=broad-except
+                    logger.error(
+                        "⚠️ %s. Keeping the previous keycloak configuration, the new one "
+                        "failed: %s", error.__class__.__name__, error
+                    )
+                    return False
+                finally:
+                    self._candidate.connection = None
+                    self._candidate.payload = None
+                # the token of the new realm never goes with the instance of the old one
+                with self._token_lock:
+                    self._connection = connection
+                    self._keycloak_openid = instance
+                    self._session_generation += 1
+                    self._publish(
+                        TokenRecord.from_payload(payload, received_at, next(self._versions))
+                    )
+
+        logger.info(
+            "Switched to the realm %s of %s", self._realm_name, keycloak_config["SERVER_URL"]
+        )
+        # the refresh period depends on the new server
+        if self._interrupt_callback is not None:
+            self._interrupt_callback(wait=True)
+            self._interrupt_callback = self._refresh_perpetually()
+        if self._probe_callback is not None:
+            self._probe_callback(wait=True)
+        self._probe_callback = self._probe_perpetually()
+        return True
+
     def get_access_token_duration(self):
-        return self._keycloak_payload["expires_in"]
+        token = self.snapshot()
+        claims = token.claims()
+        if "exp" in claims and "iat" in claims:
+            return claims["exp"] - claims["iat"]
+        return token.expires_in
+
+    def snapshot(self) -> TokenRecord:
+        """
+        Return the record of the current token. It is immutable, its access token,
+        refresh token and expiries coming from the same keycloak payload, and is replaced
+        as a whole by the next one, so that it can be read without any lock.
+        """
+        if self._pending_initialization is not None or self._closed:
+            self._complete_initialization()
+        return self._token
+
+    def claims(self) -> Dict:
+        """
+        Return the claims of the current access token. They are decoded locally, only
+        once per access token, without any signature verification nor network call.
+        """
+        return self.snapshot().claims()
+
+    def expires_at(self, token: Optional[TokenRecord] = None) -> float:
+        """
+        Return the local timestamp at which the access token of the given record (the
+        current one by default) expires, the 'exp' claim being corrected by the estimated
+        clock skew of the server, or from 'expires_in' for an opaque access token.
+        """
+        token = token or self.snapshot()
+        claims = token.claims()
+        if "exp" in claims:
+            return self._clock_skew.local_time(float(claims["exp"]))
+        return token.received_at + token.expires_in
+
+    def time_to_expiry(self, token: Optional[TokenRecord] = None) -> float:
+        """
+        Return the number of seconds left before the access token of the given record
+        (the current one by default) expires.
+        """
+        return self.expires_at(token) - self._clock()
+
+    def clock_skew(self) -> float:
+        """
+        Return the estimated number of seconds to add to the local clock to get the clock
+        of the keycloak server.
+        """
+        return self._clock_skew.skew
+
+    def server_url(self) -> str:
+        """
+        Return the URL of the keycloak server of the fetcher, the first one of a list of
+        replicas.
+        """
+        return server_urls(self._keycloak_config)[0]
+
+    def _request_token(self, request: Callable[..., Dict], *args, **kwargs) -> Dict:
+        """
+        Send a token request to keycloak within the rate limit of the realm, keep the
+        returned payload as the current one and use the 'iat' claim of the new access
+        token, if it is a JWT, together with the measured round-trip time to update the
+        clock skew estimation of the server.
+        """
+        payload, sent_at, received_at = self._send_request(request, *args, **kwargs)
+
+        token = self._update_payload(payload, received_at)
+        issued_at = token.claims().get("iat")
+        if issued_at is not None:
+            self._clock_skew.add_sample(issued_at, sent_at, received_at)
+        if self._health_recorder is not None:
+            self._health_recorder.record_refresh(self.expires_at(token))
+
+        return payload
+
+    def _send_request(self, request: Callable[..., Dict], *args, record_failure: bool = True,
+                      **kwargs) -> Tuple[Dict, float, float]:
+        """
+        Send a token request to keycloak within the rate limit of the realm and return
+        the payload with the local times at which it has been sent and received, the
+        failure being recorded for the 'health' subcommand unless 'record_failure' is
+        False.
+        """
+        grant_type = self._grant_type(request, kwargs)
+        with phase("rate_limit"):
+            rate_limit_wait = self._rate_limiter.acquire()
+
+        with phase(f"grant.{grant_type}"), \
+                span("keycloak.grant", grant_type=grant_type, realm=self._realm_name,
+                     # increased by the endpoint pool when it fails over
+                     retry_count=0, rate_limit_wait=rate_limit_wait):
+            sent_at = self._clock()
+            try:
+                payload = request(*args, **kwargs)
+            except Exception as error:
+                if record_failure and self._health_recorder is not None:
+                    self._health_recorder.record_failure(error)
+                raise
+            received_at = self._clock()
+        return payload, sent_at, received_at
+
+    def exchange_token(self, audience: Optional[str] = None, **options) -> Tuple[Dict, float]:
+        """
+        Exchange the access token of the fetcher at keycloak (OAuth 2.0 token exchange)
+        for a token of the given audience, the other parameters of the exchange (ex:
+        'scope') being given as 'options', and return the payload with the local time at
+        which it has been received. The request is rate limited as the other ones, but
+        changes neither the current token nor the state record of the fetcher.
+        """
+        # the subject token stays valid during the exchange request
+        subject_token = self.get_valid_access_token()
+        payload, _, received_at = self._send_request(
+            self._keycloak_openid.exchange_token, subject_token, audience=audience,
+            record_failure=False, **options
+        )
+        return payload, received_at
+
+    def session_generation(self) -> int:
+        """
+        Return the number of keycloak sessions the fetcher opened after its first one
+        (switch to another realm, new authentication), so that the tokens derived from
+        a previous session are not handed out anymore.
+        """
+        return self._session_generation
+
+    def _new_session(self):
+        with self._token_lock:
+            self._session_generation += 1
+
+    @staticmethod
+    def _grant_type(request: Callable[..., Dict], kwargs: Dict) -> str:
+        if "grant_type" in kwargs:
+            return kwargs["grant_type"]
+        if request.__name__ == "exchange_token":
+            return "token_exchange"
+        return "refresh_token" if request.__name__ == "refresh_token" else "password"
+
+    def _update_payload(self, payload: Dict, received_at: Optional[float] = None) -> TokenRecord:
+        """
+        Keep the token of the last payload returned by keycloak as the current one, in a
+        compact record, so that the claims and the expiry of the latest access token are
+        exposed, and return the record. The payload of a configuration being validated is
+        only kept aside for the switch to it.
+        """
+        received_at = self._clock() if received_at is None else received_at
+        if getattr(self._candidate, "connection", None) is not None:
+            self._candidate.payload = (payload, received_at)
+            return TokenRecord.from_payload(payload, received_at)
+        with self._token_lock:
+            token = TokenRecord.from_payload(payload, received_at, next(self._versions))
+            self._publish(token)
+        return token
+
+    def _publish(self, token: TokenRecord):
+        """
+        Make the record the current one, the caller holding the token lock.
+        """
+        self._token = token
+        if self._channel is not None and self._channel.is_owner:
+            self._channel.publish(token.access_token, self.expires_at(token))
+
+    def _seconds_until(self, server_timestamp: float) -> float:
+        """
+        Return the number of seconds left before the server clock reaches the given
+        timestamp.
+        """
+        return server_timestamp - self._clock_skew.server_time(self._clock())
+
+    def close(self):
+        """
+        Stop the perpetual refreshing of the fetcher and wait for its thread to finish.
+        """
+        self._closed = True
+        if self._pending_initialization is not None:
+            # after an authentication in progress, whose threads are stopped below
+            with self._initialization_lock:
+                # a lazy fetcher closed before any access never authenticates
+                self._pending_initialization = None
+        if self._config_watcher is not None:
+            self._config_watcher.stop(wait=True)
+            self._config_watcher = None
+        if self._interrupt_callback is not None:
+            self._interrupt_callback(wait=True)
+            self._interrupt_callback = None
+        if self._publisher_callback is not None:
+            self._publisher_callback(wait=True)
+            self._publisher_callback = None
+        if self._probe_callback is not None:
+            self._probe_callback(wait=True)
+            self._probe_callback = None
+
+    def _publish_to_forks(self):
+        """
+        Share the access token with the processes forked later on through a shared
+        memory channel, kept up to date by a thread refreshing the access token before
+        it expires.
+        """
+        self._channel = SharedTokenChannel()
+        self._channel.publish(self._token.access_token, self.expires_at())
+        interval = max(self.get_access_token_duration() / 3, 1)
+        self._publisher_callback = Job.schedule(
+            lambda: self.get_valid_access_token(1.5 * interval), interval,
+            "stopping publishing of the access token to the forked processes"
+        )
+
+    def _after_fork_in_child(self):
+        """
+        Called in the child process after a fork: the refreshing threads of the parent do
+        not exist anymore, the tokens are read from the channel of the parent instead
+        when it shares them.
+        """
+        # the threads holding these locks during the fork do not exist in the child
+        self._refresh_lock = threading.RLock()
+        self._token_lock = threading.Lock()
+        if self._pending_initialization is not None:
+            self._initialization_lock = threading.Lock()
+        for shared in (self._clock_skew, self._rate_limiter, self._lease_stats,
+                       self._health_recorder):
+            if shared is not None:
+                shared._lock = threading.Lock()
+        self._interrupt_callback = None
+        self._publisher_callback = None
+        self._config_watcher = None
+        self._probe_callback = None
+
+    def _is_attached_to_parent(self) -> bool:
+        return self._channel is not None and not self._channel.is_owner
+
+    def _sync_from_channel(self) -> str:
+        """
+        Make the access token published by the parent process the current one.
+        """
+        access_token, expires_at = self._channel.read()
+        with self._token_lock:
+            if access_token != self._token.access_token:
+                now = self._clock()
+                self._token = TokenRecord(
+                    access_token, expires_at - now, now, version=next(self._versions)
+                )
+        return access_token
 
-    @abstractmethod
     def get_access_token(self):
-        pass
+        """
+        Return a fresh Nexus access token.
+        """
+        with span(f"{self.__class__.__name__}.get_access_token", grant_type=self.GRANT_TYPE,
+                  realm=self._realm_name, cache_hit=False) as access_span:
+            if self._is_attached_to_parent():
+                # the token published by the parent process, without any request
+                access_span.set_attribute("cache_hit", True)
+                return self._sync_from_channel()
+            if (self._pending_initialization is not None or self._closed) \
+                    and self._complete_initialization():
+                # the token of the deferred authentication is a fresh one
+                return self._token.access_token
+            # the refresh never mixes the token and the instance of two realms
+            with self._refresh_lock:
+                return self._fetch_access_token()
+
+    def get_valid_access_token(self, min_validity: float = TOKEN_REFRESH_MARGIN) -> str:
+        """
+        Return the current access token if it stays valid for at least 'min_validity'
+        seconds, without contacting keycloak. Otherwise, fetch a fresh one, only one
+        thread doing so when several of them need it at the same time.
+        """
+        return self._valid_token(min_validity).access_token
+
+    def _valid_token(self, min_validity: float) -> TokenRecord:
+        """
+        Return the record of the token handed out by 'get_valid_access_token'.
+        """
+        if self._is_attached_to_parent():
+            self._sync_from_channel()
+        if self._pending_initialization is not None or self._closed:
+            self._complete_initialization()
+
+        # a single read of the current record, the checked token is the returned one
+        token = self._token
+        if self.time_to_expiry(token) > min_validity:
+            return self._cached_token(token)
+
+        with self._refresh_lock:
+            token = self._token
+            if self.time_to_expiry(token) > min_validity:
+                # refreshed by another thread in the meantime
+                return self._cached_token(token)
+            self.get_access_token()
+            return self._token
+
+    def _cached_token(self, token: TokenRecord) -> TokenRecord:
+        with span(f"{self.__class__.__name__}.get_access_token", grant_type=self.GRANT_TYPE,
+                  realm=self._realm_name, cache_hit=True):
+            return token
+
+    def lease(self, min_validity: float = TOKEN_REFRESH_MARGIN) -> TokenLease:
+        """
+        Return a lease on an access token guaranteed to stay valid for at least
+        'min_validity' seconds, the current one if it does, a fresh one otherwise. Used
+        as a context manager, the lease records its duration in 'lease_stats()'.
+        Raise a ValueError if keycloak issues tokens valid for less than 'min_validity'.
+        """
+        token = self._valid_token(min_validity)
+        expires_at = self.expires_at(token)
+        if expires_at - self._clock() <= min_validity:
+            raise ValueError(
+                f"⚠️  ValueError. Keycloak issues access tokens valid for "
+                f"{self.get_access_token_duration()} seconds, a lease of {min_validity} "
+                "seconds cannot be guaranteed"
+            )
+        return TokenLease(
+            token.access_token, expires_at, min_validity, self._lease_stats, self._clock
+        )
+
+    def lease_stats(self) -> Dict:
+        """
+        Return the number of leases, the active ones, their total and maximal durations
+        and the number of the ones released after their token expired.
+        """
+        return self._lease_stats.as_dict()
+
+    def renew_access_token(self, rejected_token: str) -> str:
+        """
+        Fetch a fresh access token to replace 'rejected_token' (ex: refused by a server
+        with a 401 status), unless another thread already replaced it.
+        """
+        self._complete_initialization()
+        with self._refresh_lock:
+            if self._token.access_token != rejected_token:
+                return self._token.access_token
+            return self.get_access_token()
 
     @abstractmethod
+    def _fetch_access_token(self) -> str:
+        pass
+
     def _get_keycloak_instance_and_payload(
             self, username, password, keycloak_config
     ) -> Tuple[KeycloakOpenID, Dict]:
+        instance = self._create_keycloak_connection(username, password, keycloak_config)
+        return instance, self._authenticate(instance, username, password)
+
+    @abstractmethod
+    def _create_keycloak_instance(self, username, password, keycloak_config) -> KeycloakOpenID:
+        pass
+
+    @abstractmethod
+    def _authenticate(self, instance: KeycloakOpenID, username, password) -> Dict:
+        """
+        Send the initial grant with the given instance and return the payload.
+        """
         pass
 
     @staticmethod
@@ -4,7 +4,7 @@ It contains 2 public methods to get a fresh Nexus access token and to get its li
 duration.
 For more information about Nexus, see https://bluebrainnexus.io/
 """
-from typing import Tuple, Dict
+from typing import Dict
 
 from keycloak import KeycloakOpenID
 from blue_brain_token_fetch.token_fetcher_base import TokenFetcherBase
@@ -12,8 +12,12 @@ from blue_brain_token_fetch.token_fetcher_base import TokenFetcherBase
 
 class TokenFetcherService(TokenFetcherBase):
 
-    def get_access_token(self):
-        return self._keycloak_openid.token(grant_type="client_credentials")["access_token"]
+    GRANT_TYPE = "client_credentials"
+    CONFIG_SECTION = "service"
+
+    def _fetch_access_token(self):
+        payload = self._request_token(self._keycloak_openid.token, grant_type="client_credentials")
+        return payload["access_token"]
 
     @classmethod
     def config_keys(cls) -> Dict[str, bool]:
@@ -22,16 +26,14 @@ class TokenFetcherService(TokenFetcherBase):
     def _refresh_perpetually(self):
         pass
 
-    def _get_keycloak_instance_and_payload(
-            self, username, password, keycloak_config
-    ) -> Tuple[KeycloakOpenID, Dict]:
-
-        instance = KeycloakOpenID(
+    def _create_keycloak_instance(self, username, password, keycloak_config) -> KeycloakOpenID:
+        return KeycloakOpenID(
             server_url=keycloak_config["SERVER_URL"],
             realm_name=keycloak_config["REALM_NAME"],
             client_id=username,
             client_secret_key=password,
+            timeout=keycloak_config.get("TIMEOUT", self.KEYCLOAK_TIMEOUT),
         )
-        payload = instance.token(grant_type="client_credentials")
 
-        return instance, payload
+    def _authenticate(self, instance: KeycloakOpenID, username, password) -> Dict:
+        return self._request_token(instance.token, grant_type="client_credentials")
@@ -2,20 +2,49 @@
 Keycloak.
 It contains 2 public methods to get a fresh Nexus access token and to get its life
 duration.
+Keycloak ends a session at the SSO session maximum of the realm, whatever its refresh
+token rotations: given a credential provider, the fetcher authenticates again in the
+background before its session reaches that limit.
 For more information about Nexus, see https://bluebrainnexus.io/
 """
-from typing import Tuple, Dict, Callable
+import logging
+from typing import Dict, Callable, Optional
 
 from keycloak import KeycloakOpenID
+from keycloak.exceptions import KeycloakError
 
+from blue_brain_token_fetch.credential_provider import CredentialProvider
+from blue_brain_token_fetch.endpoint_pool import is_server_failure
 from blue_brain_token_fetch.job import Job
+from blue_brain_token_fetch.token_claims import decode_claims
 from blue_brain_token_fetch.token_fetcher_base import TokenFetcherBase
+from blue_brain_token_fetch.tracing import span
+
+logger = logging.getLogger(__name__)
 
 
 class TokenFetcherUser(TokenFetcherBase):
 
-    _refresh_token = None
+    CONFIG_SECTION = "user"
+
     _refresh_token_duration = None
+    _username: Optional[str] = None
+    _session_end_warned = False
+
+    def __init__(self, *args, credential_provider: Optional[CredentialProvider] = None,
+                 **kwargs):
+        """
+        Same parameters as TokenFetcherBase, and:
+
+        Parameters
+        ----------
+            credential_provider : CredentialProvider
+                Source of the password used to authenticate again when the session
+                reaches the SSO session maximum of the realm, or has ended. Without it,
+                the session ends at that limit.
+        """
+        self._credential_provider = credential_provider
+        super().__init__(*args, **kwargs)
 
     @classmethod
     def config_keys(cls) -> Dict[str, bool]:
@@ -26,37 +55,120 @@ class TokenFetcherUser(TokenFetcherBase):
             "CLIENT_PASSWORD": False
         }
 
-    def get_access_token(self):
-        return self._keycloak_openid.refresh_token(self._refresh_token)["access_token"]
+    def _fetch_access_token(self):
+        return self._rotate_refresh_token()["access_token"]
+
+    def session_started_at(self) -> Optional[float]:
+        """
+        Return the local timestamp of the authentication that opened the session, from
+        the 'auth_time' claim of the access token.
+        """
+        auth_time = self.claims().get("auth_time")
+        return None if auth_time is None else self._clock_skew.local_time(float(auth_time))
+
+    def session_expires_at(self) -> float:
+        """
+        Return the local timestamp at which the session ends unless its refresh token is
+        rotated, Keycloak capping the expiry of the refresh tokens at the SSO session
+        maximum: once reached, the expiry does not move anymore.
+        """
+        token = self.snapshot()
+        try:
+            return self._clock_skew.local_time(float(decode_claims(token.refresh_token)["exp"]))
+        except (KeyError, ValueError):
+            return token.received_at + token.refresh_expires_in
+
+    def _rotate_refresh_token(self) -> Dict:
+        """
+        Exchange the refresh token for a new payload, authenticating again when keycloak
+        rejects it (ex: the session has ended) and a credential provider is given.
+        """
+        try:
+            return self._request_token(
+                self._keycloak_openid.refresh_token, self._token.refresh_token
+            )
+        except KeycloakError as error:
+            if self._credential_provider is None or is_server_failure(error):
+                raise
+            logger.warning("⚠️  The refresh token was rejected (%s), authenticating again", error)
+            return self._reauthenticate()
+
+    def _reauthenticate(self) -> Dict:
+        """
+        Open a new session with the password of the credential provider.
+        """
+        logger.info(
+            "Authenticating %s again with the password of the %s",
+            self._username, self._credential_provider.location()
+        )
+        with span("TokenFetcherUser.reauthentication", realm=self._realm_name):
+            password = self._credential_provider.get_password(self._username)
+            payload = self._request_token(self._keycloak_openid.token, self._username, password)
+        del password
+        self._session_end_warned = False
+        self._new_session()
+        return payload
 
     def _refresh_perpetually(self) -> Callable:
         """
-        Launch the thread encapsulating '_periodically_refresh_token()'.
+        Launch the thread encapsulating 'run_refresh_job()'.
         """
         return Job.schedule(
-            self._refresh_refresh_token, self._refresh_token_duration / 2,
+            self.run_refresh_job, self.refresh_job_interval(),
             "stopping refreshing of refresh token"
         )
 
-    def _refresh_refresh_token(self):
+    def refresh_job_interval(self) -> float:
+        """
+        Return half the life duration of the refresh token.
+        """
+        return self._refresh_token_duration / 2
+
+    def run_refresh_job(self):
         """
         Periodically refresh the 'refresh token' every half of its life duration.
         """
-        print("Refresh token thingy")
-        self._refresh_token = self._keycloak_openid.refresh_token(self._refresh_token)["refresh_token"]
+        logger.debug("Refreshing the refresh token")
+        # the lock keeps the rotation away from a switch of keycloak instance
+        with self._refresh_lock, \
+                span("TokenFetcherUser.refresh_token_rotation", realm=self._realm_name):
+            # the new refresh token comes with the new record
+            self._rotate_refresh_token()
 
-    def _get_keycloak_instance_and_payload(
-            self, username, password, keycloak_config
-    ) -> Tuple[KeycloakOpenID, Dict]:
+            # the session must not end before the next rotation
+            time_to_session_end = self.session_expires_at() - self._clock()
+            if time_to_session_end > self.refresh_job_interval() + self.TOKEN_REFRESH_MARGIN:
+                return
+            if self._credential_provider is not None:
+                self._reauthenticate()
+            elif not self._session_end_warned:
+                self._session_end_warned = True
+                logger.warning(
+                    "⚠️  The keycloak session ends in %.0f seconds and cannot be extended "
+                    "without a credential provider", time_to_session_end
+                )
 
-        instance = KeycloakOpenID(
+    def _create_keycloak_instance(self, username, password, keycloak_config) -> KeycloakOpenID:
+        return KeycloakOpenID(
             server_url=keycloak_config["SERVER_URL"],
             client_id=keycloak_config["CLIENT_ID"],
             client_secret_key=keycloak_config.get("CLIENT_PASSWORD"),
             realm_name=keycloak_config["REALM_NAME"],
+            timeout=keycloak_config.get("TIMEOUT", self.KEYCLOAK_TIMEOUT),
         )
 
-        payload = instance.token(username, password)
-        self._refresh_token = payload["refresh_token"]
-        self._refresh_token_duration = payload["refresh_expires_in"]
-        return instance, payload
+    def _authenticate(self, instance: KeycloakOpenID, username, password) -> Dict:
+        payload = self._request_token(instance.token, username, password)
+        self._username = username
+        self._refresh_token_duration = self._get_refresh_token_duration(payload)
+        return payload
+
+    def _get_refresh_token_duration(self, payload: Dict) -> float:
+        """
+        Return the number of seconds left before the refresh token expires, using its
+        'exp' claim and the server clock skew when the refresh token is a JWT.
+        """
+        try:
+            return self._seconds_until(decode_claims(payload["refresh_token"])["exp"])
+        except (KeyError, ValueError):
+            return payload["refresh_expires_in"]
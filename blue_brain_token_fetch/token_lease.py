@@ -0,0 +1,104 @@
+"""This class allows a long operation (ex: a bulk upload to Nexus) to plan around the
+lifetime of the access token: a lease holds a token guaranteed to stay valid for at least
+the requested duration when it is taken, the fetcher refreshing it ahead of time only
+when the current one would not. Used as a context manager, a lease records how long it
+has been held, so that the operations outliving their token show up in the statistics
+of the fetcher.
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+class LeaseStats:
+    """
+    A class to represent the durations of the leases taken on a fetcher.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.active = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        # leases released after the expiry of their token
+        self.expired = 0
+        self._lock = threading.Lock()
+
+    def acquired(self):
+        with self._lock:
+            self.active += 1
+
+    def released(self, duration: float, expired: bool):
+        with self._lock:
+            self.active -= 1
+            self.count += 1
+            self.total_duration += duration
+            self.max_duration = max(self.max_duration, duration)
+            self.expired += expired
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "active": self.active,
+                "total_duration": self.total_duration,
+                "max_duration": self.max_duration,
+                "mean_duration": self.total_duration / self.count if self.count else None,
+                "expired": self.expired,
+            }
+
+
+class TokenLease:
+    """
+    A class to represent an access token leased for at least 'min_validity' seconds.
+
+    Attributes
+    ----------
+    access_token : str
+        Access token leased.
+    expires_at : float
+        Local timestamp at which the access token expires.
+    min_validity : float
+        Number of seconds the token was guaranteed to stay valid when leased.
+    acquired_at : float
+        Local timestamp at which the lease has been taken.
+    clock : Callable
+        Clock of the fetcher, against which the timestamps are taken.
+    """
+
+    def __init__(self, access_token: str, expires_at: float, min_validity: float,
+                 stats: Optional[LeaseStats] = None, clock: Callable[[], float] = time.time):
+        self.access_token = access_token
+        self.expires_at = expires_at
+        self.min_validity = min_validity
+        self._clock = clock
+        self.acquired_at = clock()
+        self.released_at: Optional[float] = None
+        self._stats = stats
+
+    def __repr__(self) -> str:
+        return f"TokenLease(expires_at={self.expires_at}, min_validity={self.min_validity})"
+
+    def __enter__(self) -> "TokenLease":
+        if self._stats is not None:
+            self._stats.acquired()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.released_at = self._clock()
+        if self._stats is not None:
+            self._stats.released(self.duration(), self.released_at >= self.expires_at)
+        return False
+
+    def time_left(self) -> float:
+        """
+        Return the number of seconds left before the leased token expires.
+        """
+        return self.expires_at - self._clock()
+
+    def duration(self) -> float:
+        """
+        Return the number of seconds the lease has been held, until now if its 'with'
+        block is not over.
+        """
+        return (self.released_at or self._clock()) - self.acquired_at
@@ -0,0 +1,86 @@
+"""This class allows to keep the token returned by Keycloak in a compact and immutable
+form: only the fields used by the fetchers are retained from the payload (the id token,
+session state and other entries are dropped) and the claims of the access token are
+decoded lazily, once per record.
+A record is never modified once created: a fetcher replaces its current record by a new
+one with a single reference assignment, so that the threads reading it always get an
+access token, a refresh token and expiries from the same payload, without any lock.
+"""
+from typing import Any, Dict, Optional
+
+from blue_brain_token_fetch.token_claims import decode_claims
+
+
+class TokenRecord:
+    """
+    A class to represent one version of the token issued by Keycloak.
+
+    Attributes
+    ----------
+    access_token : str
+        Access token.
+    expires_in : float
+        Life duration of the access token announced by Keycloak, in seconds.
+    refresh_token : str
+        Refresh token, if any.
+    refresh_expires_in : float
+        Life duration of the refresh token announced by Keycloak, in seconds.
+    received_at : float
+        Local timestamp at which the payload has been received.
+    version : int
+        Number of the record among the ones of its fetcher, increasing with each new
+        payload.
+    """
+
+    __slots__ = (
+        "access_token", "expires_in", "refresh_token", "refresh_expires_in", "received_at",
+        "version", "_claims",
+    )
+
+    def __init__(self, access_token: str, expires_in: float, received_at: float,
+                 refresh_token: Optional[str] = None,
+                 refresh_expires_in: Optional[float] = None, version: int = 0):
+        set_field = object.__setattr__
+        set_field(self, "access_token", access_token)
+        set_field(self, "expires_in", expires_in)
+        set_field(self, "received_at", received_at)
+        set_field(self, "refresh_token", refresh_token)
+        set_field(self, "refresh_expires_in", refresh_expires_in)
+        set_field(self, "version", version)
+        set_field(self, "_claims", None)
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"⚠️  AttributeError. A TokenRecord is immutable, cannot set {name}")
+
+    def __delattr__(self, name: str):
+        raise AttributeError(f"⚠️  AttributeError. A TokenRecord is immutable, cannot delete {name}")
+
+    def __repr__(self) -> str:
+        return f"TokenRecord(version={self.version}, received_at={self.received_at})"
+
+    @classmethod
+    def from_payload(cls, payload: Dict, received_at: float, version: int = 0) -> "TokenRecord":
+        return cls(
+            access_token=payload["access_token"],
+            expires_in=payload.get("expires_in"),
+            received_at=received_at,
+            refresh_token=payload.get("refresh_token"),
+            refresh_expires_in=payload.get("refresh_expires_in"),
+            version=version,
+        )
+
+    def claims(self) -> Dict:
+        """
+        Return the claims of the access token, decoded on the first call only. An opaque
+        (non-JWT) access token has no claims: an empty dict is returned and the expiry is
+        then computed from 'expires_in'.
+        """
+        claims = self._claims
+        if claims is None:
+            # concurrent first calls decode the same token, any of the results is kept
+            try:
+                claims = decode_claims(self.access_token)
+            except ValueError:
+                claims = {}
+            object.__setattr__(self, "_claims", claims)
+        return claims
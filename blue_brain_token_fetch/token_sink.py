@@ -0,0 +1,205 @@
+"""This class allows to write the same access token in several formats at once: the raw
+token, an env file ('NEXUS_TOKEN=...'), a netrc entry, a JSON document with its expiry or
+any custom template. Each sink renders the token with its format and writes it in its
+token store, the sinks whose content has not changed being skipped.
+A netrc sink only replaces the entry of its machine, keeping the other entries of the
+file.
+"""
+import json
+import re
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+from blue_brain_token_fetch.token_store import TokenStore, make_token_store
+
+Format = Union[str, Callable[[Dict], str]]
+
+
+def _render_json(fields: Dict) -> str:
+    return json.dumps({
+        "access_token": fields["token"],
+        "expires_at": fields["expires_at"],
+        "expires_at_iso": fields["expires_at_iso"],
+    }) + "\n"
+
+
+# templates are formatted with the fields given by 'render_fields'
+FORMATS: Dict[str, Format] = {
+    "raw": "{token}",
+    "env": "NEXUS_TOKEN={token}\n",
+    "netrc": "machine {machine} login {username} password {token}\n",
+    "json": _render_json,
+}
+
+
+def render_fields(access_token: str, expires_at: Optional[float] = None,
+                  **extra_fields) -> Dict:
+    """
+    Return the fields available to the format templates: 'token', 'expires_at' (Unix
+    timestamp), 'expires_at_iso', 'expires_in' (seconds left) and the extra ones.
+    """
+    fields = {"token": access_token, "expires_at": None, "expires_at_iso": None,
+              "expires_in": None}
+    if expires_at is not None:
+        fields.update(
+            expires_at=int(expires_at),
+            expires_at_iso=datetime.fromtimestamp(int(expires_at), timezone.utc).isoformat(),
+            expires_in=max(int(expires_at - time.time()), 0),
+        )
+    fields.update(extra_fields)
+    return fields
+
+
+class TokenSink:
+    """
+    A class to represent one output of the access token.
+
+    Attributes
+    ----------
+    store : TokenStore
+        Where the rendered token is written.
+    token_format : str or callable
+        Name of one of the FORMATS, template formatted with the render fields or
+        function of the render fields.
+    """
+
+    def __init__(self, store: TokenStore, token_format: Format = "raw"):
+        self.store = store
+        self.token_format = FORMATS.get(token_format, token_format) \
+            if isinstance(token_format, str) else token_format
+
+    def render(self, fields: Dict) -> str:
+        if callable(self.token_format):
+            return self.token_format(fields)
+        try:
+            return self.token_format.format(**fields)
+        except KeyError as error:
+            raise ValueError(
+                f"⚠️  ValueError. Unknown field {error} in the token format template "
+                f"'{self.token_format}', expected one of {', '.join(fields)}"
+            ) from error
+
+    def is_unchanged(self, content: str) -> bool:
+        try:
+            return self.store.read() == content
+        except (OSError, RuntimeError):
+            return False
+
+    def write(self, content: str, expires_at: Optional[float] = None) -> bool:
+        """
+        Write the rendered content unless the store holds it already, and return
+        whether it has been written.
+        """
+        if self.is_unchanged(content):
+            return False
+        self.store.write(content, expires_at)
+        return True
+
+
+class NetrcTokenSink(TokenSink):
+    """
+    A class to represent a netrc output, where the rendered entry replaces the one of
+    the same machine, or is appended, the rest of the netrc file being kept as is.
+    """
+
+    def __init__(self, store: TokenStore, token_format: Format = "netrc"):
+        super().__init__(store, token_format)
+
+    def render(self, fields: Dict) -> str:
+        entry = super().render(fields)
+        try:
+            content = self.store.read()
+        except (OSError, RuntimeError):
+            content = ""
+        return merge_netrc_entry(content, fields["machine"], entry)
+
+
+_NETRC_WORD = re.compile(r"\S+")
+
+
+def _netrc_entries(content: str) -> List[List]:
+    """
+    Return the [start, end, machine] spans of the entries of the netrc content ('machine'
+    being None for the 'default' entry), 'end' being the end of the line of their last
+    word or of their macro definitions. Comment lines are skipped.
+    """
+    entries: List[List] = []
+    expecting_machine = in_macro = False
+    position = 0
+    for line in content.splitlines(keepends=True):
+        line_start, position = position, position + len(line)
+        if in_macro:
+            # the body of a macro definition ends with an empty line
+            in_macro = bool(line.strip())
+            if entries:
+                entries[-1][1] = position
+            continue
+        if line.lstrip().startswith("#"):
+            continue
+        for match in _NETRC_WORD.finditer(line):
+            word, start = match.group(), line_start + match.start()
+            if expecting_machine:
+                entries[-1][2] = word
+                expecting_machine = False
+            elif word in ("machine", "default"):
+                if entries:
+                    # the next entry can start on the same line
+                    entries[-1][1] = min(entries[-1][1], start)
+                entries.append([start, position, None])
+                expecting_machine = word == "machine"
+                continue
+            if entries:
+                entries[-1][1] = position
+            in_macro = in_macro or word == "macdef"
+    return entries
+
+
+def merge_netrc_entry(content: str, machine: str, entry: str) -> str:
+    """
+    Return the netrc content with 'entry' replacing the entries of 'machine', or
+    appended if there is none, the other entries and comments being kept.
+    """
+    matching = [(start, end) for start, end, name in _netrc_entries(content) if name == machine]
+    if not matching:
+        if content and not content.endswith("\n"):
+            content += "\n"
+        return content + entry
+
+    merged, position = [], 0
+    for index, (start, end) in enumerate(matching):
+        merged.append(content[position:start])
+        if index == 0:
+            merged.append(entry)
+        position = end
+    merged.append(content[position:])
+    return "".join(merged)
+
+
+def write_sinks(sinks: Iterable[TokenSink], access_token: str,
+                expires_at: Optional[float] = None, **extra_fields) -> List[TokenSink]:
+    """
+    Render the access token for all the sinks first, then write the ones whose content
+    changed, and return them.
+    """
+    fields = render_fields(access_token, expires_at, **extra_fields)
+    rendered = [(sink, sink.render(fields)) for sink in sinks]
+    return [sink for sink, content in rendered if sink.write(content, expires_at)]
+
+
+def parse_sink(spec: str, store: str = "file",
+               templates: Optional[Dict[str, str]] = None) -> TokenSink:
+    """
+    Create a sink from a 'FORMAT:LOCATION' specification, FORMAT being one of the
+    FORMATS or of the given custom templates, and LOCATION the path or key description
+    of the token store.
+    """
+    token_format, separator, location = spec.partition(":")
+    formats = {**FORMATS, **(templates or {})}
+    if not separator or token_format not in formats or not location:
+        raise ValueError(
+            f"⚠️  ValueError. Invalid sink '{spec}', expected FORMAT:LOCATION with FORMAT "
+            f"one of {', '.join(formats)}"
+        )
+    sink_class = NetrcTokenSink if token_format == "netrc" else TokenSink
+    return sink_class(make_token_store(store, location), formats[token_format])
@@ -0,0 +1,279 @@
+"""This class allows to choose where the access token is kept for the other programs:
+a regular file, a file in a memory-backed filesystem (tmpfs, '/dev/shm') or the Linux
+kernel keyring. Each store gives a 'write' and a 'read' method, the file stores
+replacing the token file atomically so that a reader never sees a partial token, and
+'benchmark_read' measures the cost of a read for each of them.
+"""
+import ctypes
+import ctypes.util
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+from blue_brain_token_fetch.token_fetcher_base import TokenFetcherBase
+
+TMPFS_DIRECTORY = "/dev/shm"
+DEFAULT_KEY_DESCRIPTION = "nexus_token"
+
+# special keyring identifiers of the keyutils API
+KEYRINGS = {
+    "@t": -1,  # thread
+    "@p": -2,  # process
+    "@s": -3,  # session
+    "@u": -4,  # user
+    "@us": -5,  # user session
+}
+
+
+class TokenStore(ABC):
+    """
+    A class to represent the place where the access token is made available.
+    """
+
+    name = None
+
+    @abstractmethod
+    def write(self, access_token: str, expires_at: Optional[float] = None):
+        """
+        Replace the stored access token, 'expires_at' being its local expiry timestamp.
+        """
+
+    @abstractmethod
+    def read(self) -> str:
+        """
+        Return the stored access token.
+        """
+
+    @abstractmethod
+    def location(self) -> str:
+        """
+        Return a human readable description of where the token is stored.
+        """
+
+
+class FileTokenStore(TokenStore):
+    """
+    Store the access token in a file only readable by its owner.
+    """
+
+    name = "file"
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or TokenFetcherBase.DEFAULT_TOKEN_FILEPATH
+
+    def write(self, access_token: str, expires_at: Optional[float] = None):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # the temporary file is created with the 0600 mode in the same filesystem, so
+        # that the token is never readable by others nor seen partially written
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".token_")
+        try:
+            with os.fdopen(fd, "w") as tmp_file:
+                tmp_file.write(access_token)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def read(self) -> str:
+        with open(self.path) as token_file:
+            return token_file.read()
+
+    def location(self) -> str:
+        return self.path
+
+
+class TmpfsTokenStore(FileTokenStore):
+    """
+    Store the access token in a file of a memory-backed filesystem, which is never
+    written on a disk nor shared over the network.
+    """
+
+    name = "tmpfs"
+
+    def __init__(self, path: Optional[str] = None):
+        if path is None:
+            if not os.path.isdir(TMPFS_DIRECTORY):
+                raise FileNotFoundError(
+                    f"⚠️  FileNotFoundError. No tmpfs directory {TMPFS_DIRECTORY}, a path "
+                    "to a memory-backed filesystem needs to be given"
+                )
+            path = os.path.join(TMPFS_DIRECTORY, f"nexus_token_{os.getuid()}")
+        super().__init__(path)
+
+
+class _Keyutils:
+    """
+    Access to the keyring through libkeyutils, loaded with ctypes.
+    """
+
+    def __init__(self, library_path: str):
+        self._lib = ctypes.CDLL(library_path, use_errno=True)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"))
+        self._lib.add_key.restype = ctypes.c_int32
+        self._lib.add_key.argtypes = [
+            ctypes.c_char_p, ctypes.c_char_p, ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int32
+        ]
+        self._lib.keyctl_search.restype = ctypes.c_long
+        self._lib.keyctl_search.argtypes = [
+            ctypes.c_int32, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int32
+        ]
+        self._lib.keyctl_read_alloc.restype = ctypes.c_long
+        self._lib.keyctl_read_alloc.argtypes = [ctypes.c_int32, ctypes.POINTER(ctypes.c_void_p)]
+        self._lib.keyctl_set_timeout.restype = ctypes.c_long
+        self._lib.keyctl_set_timeout.argtypes = [ctypes.c_int32, ctypes.c_uint]
+
+    @staticmethod
+    def _check(result: int) -> int:
+        if result < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        return result
+
+    def add(self, description: str, payload: bytes, keyring: int) -> int:
+        return self._check(
+            self._lib.add_key(b"user", description.encode(), payload, len(payload), keyring)
+        )
+
+    def search(self, description: str, keyring: int) -> int:
+        return self._check(self._lib.keyctl_search(keyring, b"user", description.encode(), 0))
+
+    def read(self, key: int) -> bytes:
+        buffer = ctypes.c_void_p()
+        length = self._check(self._lib.keyctl_read_alloc(key, ctypes.byref(buffer)))
+        try:
+            return ctypes.string_at(buffer, length)
+        finally:
+            self._libc.free(buffer)
+
+    def set_timeout(self, key: int, timeout: int):
+        self._check(self._lib.keyctl_set_timeout(key, timeout))
+
+
+class _KeyctlCommand:
+    """
+    Access to the keyring through the 'keyctl' executable of the keyutils package.
+    """
+
+    def __init__(self, executable: str):
+        self._executable = executable
+
+    def _run(self, *args, payload: Optional[bytes] = None) -> bytes:
+        result = subprocess.run(
+            [self._executable, *args], input=payload, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, check=False
+        )
+        if result.returncode != 0:
+            raise OSError(f"keyctl {args[0]}: {result.stderr.decode().strip()}")
+        return result.stdout
+
+    def add(self, description: str, payload: bytes, keyring: int) -> int:
+        return int(self._run("padd", "user", description, str(keyring), payload=payload))
+
+    def search(self, description: str, keyring: int) -> int:
+        return int(self._run("search", str(keyring), "user", description))
+
+    def read(self, key: int) -> bytes:
+        return self._run("pipe", str(key))
+
+    def set_timeout(self, key: int, timeout: int):
+        self._run("timeout", str(key), str(timeout))
+
+
+class KeyringTokenStore(TokenStore):
+    """
+    Store the access token as a 'user' key of a Linux kernel keyring ('@u' for the user
+    keyring, '@s' for the session one). The key expires with the access token.
+    """
+
+    name = "keyring"
+
+    def __init__(self, description: Optional[str] = None, keyring: str = "@u"):
+        if keyring not in KEYRINGS:
+            raise ValueError(
+                f"⚠️  ValueError. Unknown keyring {keyring}, expected one of "
+                f"{', '.join(KEYRINGS)}"
+            )
+        self.description = description or DEFAULT_KEY_DESCRIPTION
+        self.keyring = keyring
+        self._keyctl = self._load_keyctl()
+        self._key: Optional[int] = None
+
+    @staticmethod
+    def _load_keyctl():
+        library_path = ctypes.util.find_library("keyutils")
+        if library_path is not None:
+            try:
+                return _Keyutils(library_path)
+            except (OSError, AttributeError):
+                pass
+        executable = shutil.which("keyctl")
+        if executable is not None:
+            return _KeyctlCommand(executable)
+        raise RuntimeError(
+            "⚠️  RuntimeError. The kernel keyring store needs libkeyutils or the keyctl "
+            "command of the keyutils package"
+        )
+
+    def write(self, access_token: str, expires_at: Optional[float] = None):
+        # adding a key with the same description updates it in place
+        self._key = self._keyctl.add(
+            self.description, access_token.encode(), KEYRINGS[self.keyring]
+        )
+        if expires_at is not None:
+            self._keyctl.set_timeout(self._key, max(int(expires_at - time.time()), 1))
+
+    def read(self) -> str:
+        if self._key is not None:
+            try:
+                return self._keyctl.read(self._key).decode()
+            except OSError:
+                # expired or revoked, another writer may have added a new key
+                self._key = None
+        self._key = self._keyctl.search(self.description, KEYRINGS[self.keyring])
+        return self._keyctl.read(self._key).decode()
+
+    def location(self) -> str:
+        return f"keyring {self.keyring}, key '{self.description}'"
+
+
+TOKEN_STORES = {
+    store.name: store for store in (FileTokenStore, TmpfsTokenStore, KeyringTokenStore)
+}
+
+
+def make_token_store(name: str, location: Optional[str] = None) -> TokenStore:
+    """
+    Create the store of the given name ('file', 'tmpfs' or 'keyring'), 'location' being
+    the file path or the key description.
+    """
+    if name not in TOKEN_STORES:
+        raise ValueError(
+            f"⚠️  ValueError. Unknown token store {name}, expected one of "
+            f"{', '.join(TOKEN_STORES)}"
+        )
+    return TOKEN_STORES[name](location)
+
+
+def benchmark_read(store: TokenStore, number: int = 1000) -> Dict[str, float]:
+    """
+    Read the token 'number' times from the store and return the mean, median, minimum
+    and maximum cost of a read, in microseconds.
+    """
+    durations = []
+    for _ in range(number):
+        start = time.perf_counter()
+        store.read()
+        durations.append((time.perf_counter() - start) * 1e6)
+    return {
+        "reads": number,
+        "mean_us": statistics.mean(durations),
+        "median_us": statistics.median(durations),
+        "min_us": min(durations),
+        "max_us": max(durations),
+    }
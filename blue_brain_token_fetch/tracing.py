@@ -0,0 +1,283 @@
+"""These classes allow to trace the token acquisition with OpenTelemetry-compatible spans
+(fetcher construction, access token requests, keycloak grants, refresh token rotation,
+token writes).
+Spans are only recorded once an exporter is configured with 'set_exporter'. The
+'OTLPJSONFileExporter' writes them as OTLP-JSON lines using the standard library only,
+the 'OpenTelemetryExporter' forwards them to the opentelemetry API, which is imported
+when this exporter is instantiated and never before.
+A W3C 'TRACEPARENT' environment variable, if set, is used as the parent of the root spans
+so that they are attached to the trace of the calling pipeline.
+"""
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+SERVICE_NAME = "blue-brain-token-fetch"
+SCOPE_NAME = "blue_brain_token_fetch"
+
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    """
+    A class to represent a timed operation of the token acquisition.
+    """
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_span_id", "start_time_ns", "end_time_ns",
+        "attributes", "status_code", "status_message",
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str],
+                 attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.start_time_ns = time.time_ns()
+        self.end_time_ns: Optional[int] = None
+        self.attributes = attributes
+        self.status_code = STATUS_UNSET
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_otlp(self) -> Dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_time_ns),
+            "endTimeUnixNano": str(self.end_time_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in self.attributes.items()
+            ],
+            "status": {"code": self.status_code, "message": self.status_message},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+def _otlp_value(value: Any) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class SpanExporter(ABC):
+    """
+    Interface of the span exporters. 'on_start' is called when a span starts and
+    'export' when it ends.
+    """
+
+    def on_start(self, span: Span):
+        pass
+
+    @abstractmethod
+    def export(self, span: Span):
+        pass
+
+    def shutdown(self):
+        pass
+
+
+class OTLPJSONFileExporter(SpanExporter):
+    """
+    Append every ended span to a file as an OTLP-JSON 'ExportTraceServiceRequest' line,
+    the format of the OpenTelemetry collector file exporter.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": SERVICE_NAME}}
+                ]},
+                "scopeSpans": [{"scope": {"name": SCOPE_NAME}, "spans": [span.to_otlp()]}],
+            }]
+        }
+        line = json.dumps(request, separators=(",", ":"))
+        with self._lock:
+            with open(self.path, "a") as trace_file:
+                trace_file.write(line + "\n")
+
+
+class OpenTelemetryExporter(SpanExporter):
+    """
+    Forward the spans to an opentelemetry tracer, the root spans being children of the
+    opentelemetry span active when they start.
+    """
+
+    def __init__(self, tracer_provider=None):
+        from opentelemetry import trace  # pylint: disable=import-outside-toplevel
+
+        self._trace = trace
+        self._tracer = trace.get_tracer(SCOPE_NAME, tracer_provider=tracer_provider)
+        self._spans: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def on_start(self, span: Span):
+        with self._lock:
+            parent = self._spans.get(span.parent_span_id)
+        context = self._trace.set_span_in_context(parent) if parent is not None else None
+        otel_span = self._tracer.start_span(
+            span.name, context=context, start_time=span.start_time_ns
+        )
+        with self._lock:
+            self._spans[span.span_id] = otel_span
+
+    def export(self, span: Span):
+        with self._lock:
+            otel_span = self._spans.pop(span.span_id, None)
+        if otel_span is None:
+            return
+        otel_span.set_attributes(span.attributes)
+        if span.status_code == STATUS_ERROR:
+            otel_span.set_status(
+                self._trace.Status(self._trace.StatusCode.ERROR, span.status_message)
+            )
+        otel_span.end(end_time=span.end_time_ns)
+
+
+class _NullSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _ActiveSpan:
+
+    __slots__ = ("_tracer", "_name", "_attributes", "_span")
+
+    def __init__(self, tracer, name, attributes):
+        self._tracer = tracer
+        self._name = name
+        self._attributes = attributes
+
+    def __enter__(self):
+        self._span = self._tracer.start_span(self._name, self._attributes)
+        return self._span
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self._span.status_code = STATUS_ERROR
+            self._span.status_message = f"{exc_type.__name__}: {exc_value}"
+        self._tracer.end_span(self._span)
+        return False
+
+
+class Tracer:
+    """
+    A class to create the spans of the token acquisition and hand them to the exporter.
+    """
+
+    def __init__(self):
+        self.exporter: Optional[SpanExporter] = None
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def span(self, name: str, **attributes):
+        if self.exporter is None:
+            return _NULL_SPAN
+        return _ActiveSpan(self, name, attributes)
+
+    def start_span(self, name: str, attributes: Dict[str, Any]) -> Span:
+        stack = self._stack()
+        if stack:
+            trace_id, parent_span_id = stack[-1].trace_id, stack[-1].span_id
+        else:
+            trace_id, parent_span_id = _traceparent()
+        span = Span(name, trace_id, parent_span_id, attributes)
+        stack.append(span)
+        self.exporter.on_start(span)
+        return span
+
+    def end_span(self, span: Span):
+        span.end_time_ns = time.time_ns()
+        stack = self._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+        exporter = self.exporter
+        if exporter is not None:
+            exporter.export(span)
+
+
+def _traceparent():
+    """
+    Return the trace id and the parent span id given by the 'TRACEPARENT' environment
+    variable, or a new trace id without parent.
+    """
+    parts = os.environ.get("TRACEPARENT", "").split("-")
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        return parts[1], parts[2]
+    return os.urandom(16).hex(), None
+
+
+tracer = Tracer()
+
+
+def set_exporter(exporter: Optional[SpanExporter]):
+    """
+    Configure the exporter receiving the spans, or disable the tracing with None.
+    """
+    previous, tracer.exporter = tracer.exporter, exporter
+    if previous is not None and previous is not exporter:
+        previous.shutdown()
+
+
+def span(name: str, **attributes):
+    """
+    Return a context manager recording the enclosed code as a span with the given
+    attributes when an exporter is configured.
+    """
+    return tracer.span(name, **attributes)
+
+
+def current_span():
+    """
+    Return the innermost span recorded by the calling thread, so that the code it
+    encloses can set its attributes (a span ignoring them when there is none).
+    """
+    stack = tracer._stack()
+    return stack[-1] if tracer.exporter is not None and stack else _NULL_SPAN
+
+
+def _after_fork_in_child():
+    # the thread holding the lock of the exporter during the fork does not exist in the
+    # child
+    if hasattr(tracer.exporter, "_lock"):
+        tracer.exporter._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,43 @@
+"""These functions allow a service building several token fetchers at startup to pay
+for the slowest authentication only, instead of the sum of all of them: the fetchers are
+created lazily (without any network call) and 'warm_up' runs their deferred
+authentications concurrently.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Optional, Sequence
+
+from blue_brain_token_fetch.token_fetcher_base import TokenFetcherBase
+
+DEFAULT_CONCURRENCY = 8
+
+
+def warm_up(fetchers: Sequence[TokenFetcherBase], concurrency: int = DEFAULT_CONCURRENCY,
+            timeout: Optional[float] = None) -> List[Optional[BaseException]]:
+    """
+    Authenticate the given lazy fetchers with at most 'concurrency' authentications in
+    flight, and return for each fetcher None if it is ready or the error it raised.
+
+    An authentication still running after 'timeout' seconds is reported as a
+    TimeoutError and left to finish in the background, the fetcher staying usable
+    (its first access to the token waits for it). The fetchers already authenticated
+    are ready immediately.
+    """
+    if not fetchers:
+        return []
+    started_at = time.monotonic()
+    executor = ThreadPoolExecutor(max_workers=min(concurrency, len(fetchers)))
+    futures = [executor.submit(fetcher.authenticate) for fetcher in fetchers]
+    done, not_done = wait(futures, timeout=timeout)
+    # do not wait for the authentications running late
+    executor.shutdown(wait=not not_done)
+
+    errors: List[Optional[BaseException]] = []
+    for future in futures:
+        if future in done:
+            errors.append(future.exception())
+        else:
+            errors.append(TimeoutError(
+                f"⚠️  TimeoutError. No token after {time.monotonic() - started_at:.3g} seconds"
+            ))
+    return errors
@@ -16,13 +16,15 @@ setup(
     long_description_content_type="text/markdown",
     url="https://github.com/BlueBrain/bbp-token-fetch",
     license="Apache-2.0",
-    python_requires=">=3.6.0",
+    python_requires=">=3.7.0",
     install_requires=[
         "click>=7.0",
-        "python-keycloak>=0.24.0",
+        "python-keycloak>=3.0.0",
         "PyYAML>=5.3.1",
     ],
     extras_require={
+        "requests": ["requests>=2.0"],
+        "httpx": ["httpx>=0.18"],
         "dev": [
             "pytest>=4.3.0",
             "pytest-cov==4.1.0",
@@ -34,7 +36,7 @@ setup(
     include_package_data=True,
     entry_points={
         "console_scripts": [
-            "blue-brain-token-fetch=blue_brain_token_fetch.nexus_token_fetch:start"
+            "blue-brain-token-fetch=blue_brain_token_fetch.commands:start"
         ]
     },
 )
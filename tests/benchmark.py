@@ -0,0 +1,132 @@
+"""This module allows to measure how the reads of the access token of a fetcher behave
+when many threads read it at the same time while it is being refreshed: each reader
+thread gets the valid access token as fast as it can, either from the immutable
+snapshot of the fetcher (without any lock) or, for comparison, under the refresh lock.
+The readers also check that the snapshots they get never go back to an older version.
+It can be run from a checkout of the repository against an in-process keycloak stub with:
+'python -m tests.benchmark --threads 1,8,64,128'
+"""
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import click
+
+from blue_brain_token_fetch.token_fetcher_base import TokenFetcherBase
+
+DEFAULT_THREAD_COUNTS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def concurrent_reads(fetcher: TokenFetcherBase, threads: int, duration: float = 1.0,
+                     refresh_interval: Optional[float] = 0.01, locked: bool = False) -> Dict:
+    """
+    Read the access token of the fetcher from 'threads' threads during 'duration'
+    seconds, while another thread fetches a new one every 'refresh_interval' seconds,
+    and return the read throughput and the number of inconsistent reads.
+    """
+    start = threading.Event()
+    stop = threading.Event()
+    reads = [0] * threads
+    inconsistencies = [0] * threads
+
+    def read(index: int):
+        last_version = 0
+        count = errors = 0
+        start.wait()
+        while not stop.is_set():
+            if locked:
+                with fetcher._refresh_lock:
+                    token = fetcher.snapshot()
+            else:
+                token = fetcher.snapshot()
+            if token.version < last_version or not token.access_token:
+                errors += 1
+            last_version = token.version
+            count += 1
+        reads[index], inconsistencies[index] = count, errors
+
+    def refresh():
+        start.wait()
+        while not stop.wait(refresh_interval):
+            with fetcher._refresh_lock:
+                fetcher.get_access_token()
+
+    workers = [threading.Thread(target=read, args=(index,)) for index in range(threads)]
+    if refresh_interval is not None:
+        workers.append(threading.Thread(target=refresh))
+    for worker in workers:
+        worker.start()
+    first_version = fetcher.snapshot().version
+    started_at = time.perf_counter()
+    start.set()
+    time.sleep(duration)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started_at
+
+    return {
+        "threads": threads,
+        "mode": "locked" if locked else "snapshot",
+        "reads": sum(reads),
+        "reads_per_second": sum(reads) / elapsed,
+        "refreshes": fetcher.snapshot().version - first_version,
+        "inconsistencies": sum(inconsistencies),
+    }
+
+
+def scaling(fetcher: TokenFetcherBase, thread_counts: Iterable[int] = DEFAULT_THREAD_COUNTS,
+            duration: float = 1.0, refresh_interval: Optional[float] = 0.01) -> List[Dict]:
+    """
+    Return the results of 'concurrent_reads' for each number of threads, lock-free and
+    locked.
+    """
+    return [
+        concurrent_reads(fetcher, threads, duration, refresh_interval, locked)
+        for threads in thread_counts
+        for locked in (False, True)
+    ]
+
+
+@click.command()
+@click.option("--threads", default=",".join(map(str, DEFAULT_THREAD_COUNTS)), show_default=True,
+              help="Comma separated numbers of reader threads.")
+@click.option("--duration", default=1.0, show_default=True,
+              help="Duration of each measure, in seconds.")
+@click.option("--refresh-interval", default=0.01, show_default=True,
+              help="Seconds between two refreshes of the token during the measures.")
+def main(threads, duration, refresh_interval):
+    """
+    Measure the concurrent reads of the token of a fetcher using a keycloak stub.
+    """
+    # imported here, the stub is only needed by this command
+    from blue_brain_token_fetch.testing import (
+        DEFAULT_PASSWORD, DEFAULT_USERNAME, KeycloakStub
+    )
+    from blue_brain_token_fetch.token_fetcher_user import TokenFetcherUser
+    from blue_brain_token_fetch.rate_limiter import configure_rate_limit
+
+    configure_rate_limit(None)
+    with KeycloakStub() as stub:
+        stub.add_user(DEFAULT_USERNAME, DEFAULT_PASSWORD)
+        fetcher = TokenFetcherUser(
+            DEFAULT_USERNAME, DEFAULT_PASSWORD, keycloak_config=stub.keycloak_config()
+        )
+        try:
+            results = scaling(
+                fetcher, [int(count) for count in threads.split(",")], duration,
+                refresh_interval
+            )
+        finally:
+            fetcher.close()
+
+    print(f"{'threads':>8} {'mode':>9} {'reads/s':>12} {'refreshes':>10} {'inconsistent':>13}")
+    for result in results:
+        print(
+            f"{result['threads']:>8} {result['mode']:>9} {result['reads_per_second']:>12.0f} "
+            f"{result['refreshes']:>10} {result['inconsistencies']:>13}"
+        )
+
+
+if __name__ == "__main__":
+    main()
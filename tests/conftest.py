@@ -1,37 +1,93 @@
+import base64
+import json
+
 import pytest
 
+from blue_brain_token_fetch import rate_limiter
 from blue_brain_token_fetch.job import InterruptionStack
 
+# registered as a plugin, and thus imported by pytest, so that its assertions are rewritten
+pytest_plugins = ["blue_brain_token_fetch.testing"]
+
 SERVICE_CONFIG = "./tests/tests_data/service_keycloak_config.yaml"
 REGULAR_CONFIG_WITH_CLIENT_PWD = "./tests/tests_data/regular_keycloak_config_with_password.yaml"
 REGULAR_CONFIG = "./tests/tests_data/regular_keycloak_config.yaml"
 
+# a local port without any server, refusing the connections
+UNREACHABLE_URL = "http://127.0.0.1:1/auth/"
+
 
 def pytest_addoption(parser):
-    parser.addoption("--regular_username", action="store", required=True)
-    parser.addoption("--regular_password", action="store", required=True)
-    parser.addoption("--service_username", action="store", required=True)
-    parser.addoption("--service_password", action="store", required=True)
+    # credentials of the BBP keycloak server, the tests needing them are skipped otherwise
+    parser.addoption("--regular_username", action="store")
+    parser.addoption("--regular_password", action="store")
+    parser.addoption("--service_username", action="store")
+    parser.addoption("--service_password", action="store")
+
+
+def _credential(pytestconfig, name):
+    value = pytestconfig.getoption(name)
+    if value is None:
+        pytest.skip(f"needs the --{name} option and the BBP keycloak server")
+    return value
 
 
 @pytest.fixture(scope="session")
 def regular_username(pytestconfig):
-    return pytestconfig.getoption("regular_username")
+    return _credential(pytestconfig, "regular_username")
 
 
 @pytest.fixture(scope="session")
 def regular_password(pytestconfig):
-    return pytestconfig.getoption("regular_password")
+    return _credential(pytestconfig, "regular_password")
 
 
 @pytest.fixture(scope="session")
 def service_username(pytestconfig):
-    return pytestconfig.getoption("service_username")
+    return _credential(pytestconfig, "service_username")
 
 
 @pytest.fixture(scope="session")
 def service_password(pytestconfig):
-    return pytestconfig.getoption("service_password")
+    return _credential(pytestconfig, "service_password")
+
+
+def make_jwt(claims):
+    def encode(content):
+        return base64.urlsafe_b64encode(json.dumps(content).encode()).rstrip(b"=").decode()
+
+    return ".".join([encode({"alg": "none", "typ": "JWT"}), encode(claims), "signature"])
+
+
+@pytest.fixture
+def start_stub():
+    """
+    Start additional keycloak stubs, with the user and service account of the
+    'keycloak_stub' fixture, stopped at the end of the test.
+    """
+    from blue_brain_token_fetch.testing import (
+        DEFAULT_PASSWORD, DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, DEFAULT_USERNAME,
+        KeycloakStub
+    )
+    stubs = []
+
+    def start(**kwargs) -> KeycloakStub:
+        stub = KeycloakStub(**kwargs).start()
+        stub.add_user(DEFAULT_USERNAME, DEFAULT_PASSWORD)
+        stub.add_client(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET)
+        stubs.append(stub)
+        return stub
+
+    yield start
+    for stub in stubs:
+        stub.stop()
+
+
+@pytest.fixture(autouse=True)
+def fresh_rate_limiters(monkeypatch):
+    # each test starts with full request budgets, and the limit of the library
+    monkeypatch.setattr(rate_limiter, "_buckets", {})
+    monkeypatch.setattr(rate_limiter, "_default_limit", dict(rate_limiter._default_limit))
 
 
 def pytest_sessionfinish(session, exitstatus):
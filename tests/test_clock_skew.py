@@ -0,0 +1,44 @@
+import time
+
+import pytest
+
+from blue_brain_token_fetch.clock_skew import ClockSkewEstimator, get_estimator, clock_skews
+from blue_brain_token_fetch.testing import DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET
+from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
+
+
+def test_add_sample():
+    estimator = ClockSkewEstimator(smoothing=0.5)
+
+    # issued in the middle of a 2 seconds round trip, by a server 60 seconds ahead
+    assert estimator.add_sample(1060.5, 999, 1001) == 61
+    assert estimator.last_round_trip == 2
+    assert estimator.add_sample(1059.5, 1000, 1000) == 60.5
+    assert estimator.samples == 2
+
+    assert estimator.server_time(1000) == 1060.5
+    assert estimator.local_time(1060.5) == 1000
+
+
+def test_get_estimator():
+    assert get_estimator("https://server/auth/") is get_estimator("https://server/auth")
+    assert get_estimator("https://server/auth") is not get_estimator("https://other/auth")
+
+
+@pytest.mark.parametrize("clock_offset", [-120, 0, 300])
+def test_fetcher_clock_skew(keycloak_stub, monkeypatch, clock_offset):
+    keycloak_stub.clock = lambda: time.time() + clock_offset
+    monkeypatch.setattr(
+        "blue_brain_token_fetch.token_fetcher_base.get_estimator",
+        lambda server_url: ClockSkewEstimator()
+    )
+
+    fetcher = TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET)
+
+    assert fetcher.clock_skew() == pytest.approx(clock_offset, abs=1)
+    assert fetcher.time_to_expiry() == pytest.approx(keycloak_stub.access_token_lifespan, abs=1)
+
+
+def test_clock_skews(keycloak_stub):
+    TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET)
+    assert keycloak_stub.server_url.rstrip("/") in clock_skews()
@@ -0,0 +1,207 @@
+import os
+import threading
+
+import pytest
+import yaml
+
+from blue_brain_token_fetch.config_watcher import ConfigWatcher
+from blue_brain_token_fetch.testing import (
+    DEFAULT_CLIENT_ID, DEFAULT_PASSWORD, DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET,
+    DEFAULT_USERNAME,
+)
+from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
+from blue_brain_token_fetch.token_fetcher_user import TokenFetcherUser
+from tests.conftest import UNREACHABLE_URL
+
+
+def unwatched(fetcher):
+    # the reloads are triggered by the test itself
+    fetcher._config_watcher.stop(wait=True)
+    return fetcher
+
+
+def write_config(path, **config):
+    # replaced like editors do, through a temporary file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as config_file:
+        yaml.dump(config, config_file)
+    os.replace(tmp_path, path)
+
+
+def write_stub_config(path, stub, **config):
+    write_config(path, SERVER_URL=stub.server_url, REALM_NAME=stub.realm, **config)
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_watcher(tmp_path, use_inotify):
+    path = tmp_path / "config.yaml"
+    path.write_text("a: 1\n")
+    changed = threading.Event()
+
+    watcher = ConfigWatcher(str(path), changed.set, poll_interval=0.05, use_inotify=use_inotify)
+    if not use_inotify:
+        assert watcher.mode == "poll"
+    watcher.start()
+    try:
+        (tmp_path / "other.yaml").write_text("b: 2\n")
+        assert not changed.wait(0.3)
+
+        write_config(path, a=2)
+        assert changed.wait(5)
+    finally:
+        watcher.stop(wait=True)
+    assert not watcher.is_alive()
+
+
+def test_service_fetcher_reload(keycloak_stub, start_stub, tmp_path):
+    server_2 = start_stub(realm="realm_2")
+    path = tmp_path / "config.yaml"
+    write_stub_config(path, keycloak_stub)
+
+    fetcher = unwatched(TokenFetcherService(
+        DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, str(path), watch_config=True
+    ))
+    try:
+        old_instance = fetcher._keycloak_openid
+
+        # an unchanged connection does not create a new instance
+        write_stub_config(path, keycloak_stub, OTHER=1)
+        fetcher._on_config_change()
+        assert fetcher._keycloak_openid is old_instance
+
+        write_stub_config(path, server_2)
+        fetcher._on_config_change()
+        assert fetcher.server_url() == server_2.server_url
+        assert fetcher._realm_name == "realm_2"
+        assert keycloak_stub.requests["client_credentials"] == 1
+        assert server_2.requests["client_credentials"] == 1
+    finally:
+        fetcher.close()
+
+
+def test_failed_reload_keeps_token(keycloak_stub, start_stub, tmp_path):
+    server_3 = start_stub(realm="realm_3")
+    path = tmp_path / "config.yaml"
+    write_stub_config(path, keycloak_stub, CLIENT_ID=DEFAULT_CLIENT_ID)
+
+    fetcher = unwatched(TokenFetcherUser(
+        DEFAULT_USERNAME, DEFAULT_PASSWORD, str(path), watch_config=True
+    ))
+    try:
+        instance, token, connection = fetcher._keycloak_openid, fetcher._token, fetcher._connection
+
+        write_config(path, SERVER_URL=UNREACHABLE_URL, REALM_NAME="realm_2",
+                     CLIENT_ID=DEFAULT_CLIENT_ID)
+        fetcher._on_config_change()
+        assert fetcher._keycloak_openid is instance
+        assert fetcher._token is token
+        assert fetcher._connection is connection
+        assert fetcher._realm_name == keycloak_stub.realm
+
+        # an invalid file is ignored
+        path.write_text("REALM_NAME: realm_3\n")
+        fetcher._on_config_change()
+        assert fetcher._keycloak_openid is instance
+
+        write_stub_config(path, server_3, CLIENT_ID=DEFAULT_CLIENT_ID)
+        assert fetcher.reload_keycloak_config()
+        assert fetcher._realm_name == "realm_3"
+        assert fetcher._token is not token
+        assert fetcher._interrupt_callback is not None
+    finally:
+        fetcher.close()
+
+
+def test_connection_swapped_after_validation(keycloak_stub, start_stub, tmp_path):
+    server_2 = start_stub(realm="realm_2")
+    path = tmp_path / "config.yaml"
+    write_stub_config(path, keycloak_stub)
+
+    fetcher = unwatched(TokenFetcherService(
+        DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, str(path), watch_config=True
+    ))
+    authenticate, realms = fetcher._authenticate, {}
+
+    def validate(instance, username, password):
+        realms["validation"] = fetcher._realm_name
+        other = threading.Thread(target=lambda: realms.update(other=fetcher._realm_name))
+        other.start()
+        other.join()
+        return authenticate(instance, username, password)
+
+    fetcher._authenticate = validate
+    try:
+        write_stub_config(path, server_2)
+        assert fetcher.reload_keycloak_config()
+        # the other threads only see the new realm once it issued a token
+        assert realms == {"validation": "realm_2", "other": keycloak_stub.realm}
+        assert fetcher._realm_name == "realm_2"
+    finally:
+        fetcher.close()
+
+
+def test_refresh_during_switch(keycloak_stub, start_stub, tmp_path):
+    server_2 = start_stub(realm="realm_2")
+    path = tmp_path / "config.yaml"
+    write_stub_config(path, keycloak_stub, CLIENT_ID=DEFAULT_CLIENT_ID)
+
+    fetcher = unwatched(
+        TokenFetcherUser(DEFAULT_USERNAME, DEFAULT_PASSWORD, str(path), watch_config=True)
+    )
+    authenticate, results = fetcher._authenticate, []
+
+    def refresh():
+        try:
+            results.append(fetcher.get_access_token())
+        except Exception as error:  # pylint: disable=broad-except
+            results.append(error)
+
+    other = threading.Thread(target=refresh)
+
+    def validate(instance, username, password):
+        payload = authenticate(instance, username, password)
+        # the refresh of another thread waits for the end of the switch
+        other.start()
+        other.join(0.2)
+        return payload
+
+    fetcher._authenticate = validate
+    try:
+        write_stub_config(path, server_2, CLIENT_ID=DEFAULT_CLIENT_ID)
+        assert fetcher.reload_keycloak_config()
+        other.join()
+        # the refresh token of the new realm went to the new realm only
+        assert server_2.decode(results[0])
+        assert keycloak_stub.requests["refresh_token"] == 0
+        assert server_2.requests["refresh_token"] == 1
+    finally:
+        fetcher.close()
+
+
+def test_watched_fetcher(keycloak_stub, start_stub, tmp_path):
+    server_2 = start_stub(realm="realm_2")
+    path = tmp_path / "config.yaml"
+    write_stub_config(path, keycloak_stub)
+
+    fetcher = TokenFetcherService(
+        DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, str(path), watch_config=True
+    )
+    reloaded = threading.Event()
+    reload = fetcher.reload_keycloak_config
+    fetcher.reload_keycloak_config = lambda config: reload(config) and reloaded.set()
+    try:
+        write_stub_config(path, server_2)
+        assert reloaded.wait(5)
+        assert fetcher._realm_name == "realm_2"
+    finally:
+        fetcher.close()
+
+
+def test_reload_needs_watch_config(keycloak_stub, tmp_path):
+    path = tmp_path / "config.yaml"
+    write_stub_config(path, keycloak_stub)
+
+    fetcher = TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, str(path))
+    assert fetcher._config_watcher is None
+    with pytest.raises(RuntimeError):
+        fetcher.reload_keycloak_config()
@@ -0,0 +1,156 @@
+import logging
+import os
+import socket
+import threading
+import time
+
+import pytest
+from keycloak import KeycloakPostError
+
+from blue_brain_token_fetch.credential_provider import (
+    AgentCredentialProvider, FileDescriptorCredentialProvider, KeyringCredentialProvider,
+    StaticCredentialProvider, make_credential_provider
+)
+from blue_brain_token_fetch.testing import DEFAULT_PASSWORD, DEFAULT_USERNAME
+from blue_brain_token_fetch.token_claims import decode_claims
+from blue_brain_token_fetch.token_fetcher_user import TokenFetcherUser
+from blue_brain_token_fetch.token_store import KeyringTokenStore
+
+
+def test_file_descriptor_provider(tmp_path):
+    path = tmp_path / "password"
+    path.write_text("first\n")
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        provider = FileDescriptorCredentialProvider(fd)
+        assert provider.get_password("user") == "first"
+        # a regular file is read again at each call
+        path.write_text("second\n")
+        assert provider.get_password("user") == "second"
+    finally:
+        os.close(fd)
+
+
+def test_file_descriptor_provider_pipe():
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, b"secret\n")
+    os.close(write_fd)
+    try:
+        provider = FileDescriptorCredentialProvider(read_fd)
+        assert provider.get_password("user") == "secret"
+        assert provider.get_password("user") == "secret"
+    finally:
+        os.close(read_fd)
+
+
+def test_agent_provider(tmp_path):
+    path = str(tmp_path / "agent.sock")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+    usernames = []
+
+    def answer():
+        connection, _ = server.accept()
+        with connection:
+            usernames.append(connection.makefile().readline().strip())
+            connection.sendall(b"agent-secret\n")
+
+    thread = threading.Thread(target=answer)
+    thread.start()
+    try:
+        assert AgentCredentialProvider(path).get_password("user") == "agent-secret"
+        assert usernames == ["user"]
+    finally:
+        thread.join()
+        server.close()
+
+
+def test_keyring_provider():
+    description = f"nexus_password_test_{os.getpid()}"
+    try:
+        KeyringTokenStore(description).write("keyring-secret", expires_at=time.time() + 60)
+    except (RuntimeError, OSError) as error:
+        pytest.skip(f"kernel keyring not available: {error}")
+    assert KeyringCredentialProvider(description).get_password("user") == "keyring-secret"
+
+
+def test_make_credential_provider():
+    assert isinstance(make_credential_provider("fd:3"), FileDescriptorCredentialProvider)
+    assert make_credential_provider("agent:/run/agent.sock").path == "/run/agent.sock"
+    for spec in ("fd:x", "agent", "vault:secret"):
+        with pytest.raises(ValueError):
+            make_credential_provider(spec)
+
+
+def make_fetcher(**kwargs):
+    fetcher = TokenFetcherUser(DEFAULT_USERNAME, DEFAULT_PASSWORD, **kwargs)
+    # the rotations are run by the tests
+    fetcher._interrupt_callback(wait=True)
+    fetcher._interrupt_callback = None
+    return fetcher
+
+
+def session_id(fetcher):
+    return decode_claims(fetcher.snapshot().refresh_token)["sid"]
+
+
+def test_session_lifetime(keycloak_stub):
+    keycloak_stub.session_max = 600
+    fetcher = make_fetcher()
+    try:
+        assert fetcher.session_expires_at() - fetcher.session_started_at() == \
+            pytest.approx(600, abs=1)
+    finally:
+        fetcher.close()
+
+
+def test_reauthentication_before_session_max(keycloak_stub):
+    keycloak_stub.session_max = 100
+    fetcher = make_fetcher(credential_provider=StaticCredentialProvider(DEFAULT_PASSWORD))
+    try:
+        first_session = session_id(fetcher)
+        fetcher.run_refresh_job()
+        assert session_id(fetcher) == first_session
+        assert keycloak_stub.requests["password"] == 1
+
+        # the next rotation would come after the end of the session
+        fetcher.TOKEN_REFRESH_MARGIN = 60
+        fetcher.run_refresh_job()
+        assert keycloak_stub.requests["password"] == 2
+        assert session_id(fetcher) != first_session
+    finally:
+        fetcher.close()
+
+
+def test_session_end_without_provider(keycloak_stub, caplog):
+    keycloak_stub.session_max = 100
+    fetcher = make_fetcher()
+    try:
+        fetcher.TOKEN_REFRESH_MARGIN = 60
+        with caplog.at_level(logging.WARNING):
+            fetcher.run_refresh_job()
+            fetcher.run_refresh_job()
+        assert keycloak_stub.requests["password"] == 1
+        assert len([record for record in caplog.records if "session ends" in record.message]) == 1
+    finally:
+        fetcher.close()
+
+
+def test_ended_session(keycloak_stub):
+    keycloak_stub.session_max = 100
+    provider_fetcher = make_fetcher(
+        credential_provider=StaticCredentialProvider(DEFAULT_PASSWORD)
+    )
+    fetcher = make_fetcher()
+    try:
+        clock = keycloak_stub.clock
+        keycloak_stub.clock = lambda: clock() + 200
+
+        with pytest.raises(KeycloakPostError):
+            fetcher.get_access_token()
+        assert keycloak_stub.decode(provider_fetcher.get_access_token())["sub"] == DEFAULT_USERNAME
+        assert keycloak_stub.requests["password"] == 3
+    finally:
+        fetcher.close()
+        provider_fetcher.close()
@@ -0,0 +1,101 @@
+import pytest
+import yaml
+from keycloak import (
+    KeycloakAuthenticationError, KeycloakConnectionError, KeycloakGetError, KeycloakOpenID
+)
+
+from blue_brain_token_fetch.endpoint_pool import EndpointPool, is_server_failure, server_urls
+from blue_brain_token_fetch.testing import (
+    DEFAULT_REALM, DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET
+)
+from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
+from tests.conftest import UNREACHABLE_URL
+
+DOWN = UNREACHABLE_URL
+
+
+@pytest.fixture
+def fast(start_stub):
+    return start_stub()
+
+
+@pytest.fixture
+def slow(start_stub):
+    stub = start_stub()
+    stub.latency = 0.05
+    return stub
+
+
+def make_pool(*urls, secret=DEFAULT_SERVICE_SECRET):
+    return EndpointPool([
+        KeycloakOpenID(url, DEFAULT_REALM, DEFAULT_SERVICE_CLIENT_ID, secret) for url in urls
+    ])
+
+
+def test_server_urls():
+    assert server_urls({"SERVER_URL": "https://a/auth/"}) == ["https://a/auth/"]
+    assert server_urls({"SERVER_URL": ["https://a/auth/", "https://b/auth/"]}) == \
+        ["https://a/auth/", "https://b/auth/"]
+    with pytest.raises(ValueError):
+        server_urls({"SERVER_URL": []})
+
+
+def test_server_failures():
+    assert is_server_failure(KeycloakConnectionError("Can't connect to server"))
+    assert is_server_failure(KeycloakGetError("unavailable", response_code=503))
+    assert not is_server_failure(KeycloakAuthenticationError("invalid", response_code=401))
+
+
+def test_fastest_server(fast, slow):
+    pool = make_pool(slow.server_url, fast.server_url)
+
+    pool.probe()
+    assert pool.best.url == fast.server_url
+    pool.token(grant_type="client_credentials")
+    assert fast.requests["client_credentials"] == 1
+    assert slow.requests["client_credentials"] == 0
+    assert pool.connection.base_url == fast.server_url
+
+
+def test_failover(fast):
+    pool = make_pool(DOWN, fast.server_url)
+
+    assert pool.token(grant_type="client_credentials")["access_token"]
+    assert [stats["url"] for stats in pool.stats()] == [fast.server_url, DOWN]
+    assert pool.stats()[1]["healthy"] is False
+
+    # the failed server is set aside
+    pool.token(grant_type="client_credentials")
+    assert fast.requests["client_credentials"] == 2
+    assert pool.stats()[1]["failures"] == 1
+
+
+def test_no_failover_on_rejection(fast, slow):
+    pool = make_pool(fast.server_url, slow.server_url, secret="invalid")
+
+    with pytest.raises(KeycloakAuthenticationError):
+        pool.token(grant_type="client_credentials")
+    assert slow.requests["client_credentials"] == 0
+
+
+def test_all_servers_down():
+    pool = make_pool(DOWN, DOWN)
+
+    with pytest.raises(KeycloakConnectionError):
+        pool.token(grant_type="client_credentials")
+    assert all(not stats["healthy"] for stats in pool.stats())
+
+
+def test_fetcher_with_server_list(fast, tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text(yaml.dump({"SERVER_URL": [DOWN, fast.server_url], "REALM_NAME": fast.realm}))
+
+    fetcher = TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, str(path))
+    try:
+        assert isinstance(fetcher._keycloak_openid, EndpointPool)
+        assert fetcher._probe_callback is not None
+        assert fetcher.get_access_token()
+        assert fetcher._keycloak_openid.best.url == fast.server_url
+    finally:
+        fetcher.close()
+    assert fetcher._probe_callback is None
@@ -0,0 +1,153 @@
+import os
+import signal
+import sys
+import tempfile
+import threading
+
+from click.testing import CliRunner
+
+from blue_brain_token_fetch import exec_command as exec_module
+from blue_brain_token_fetch.exec_command import exec_command
+from blue_brain_token_fetch.testing import DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET
+
+SERVICE_OPTIONS = [
+    "--username", DEFAULT_SERVICE_CLIENT_ID, "--password", DEFAULT_SERVICE_SECRET, "--service", "1",
+]
+
+
+def run(*args):
+    return CliRunner().invoke(exec_command, [*SERVICE_OPTIONS, *args])
+
+
+def test_exec_token_file(keycloak_stub, tmp_path, monkeypatch):
+    monkeypatch.setattr(exec_module, "TMPFS_DIRECTORY", str(tmp_path / "missing"))
+    output = tmp_path / "output"
+    script = (
+        "import os, sys; "
+        f"open({str(output)!r}, 'w').write(open(os.environ['NEXUS_TOKEN_FILE']).read()); "
+        "sys.exit(3)"
+    )
+    temporary_files = set(os.listdir(tempfile.gettempdir()))
+    result = run("--", sys.executable, "-c", script)
+
+    assert result.exit_code == 3
+    claims = keycloak_stub.decode(output.read_text())
+    assert claims["azp"] == DEFAULT_SERVICE_CLIENT_ID
+    # the temporary token file is removed
+    assert set(os.listdir(tempfile.gettempdir())) == temporary_files
+
+
+def test_exec_refreshes_token(keycloak_stub, tmp_path):
+    keycloak_stub.access_token_lifespan = 31
+    token_file = tmp_path / "token"
+    script = (
+        "import os, sys, time; "
+        "read = lambda: open(os.environ['NEXUS_TOKEN_FILE']).read(); "
+        "first = read(); time.sleep(2); "
+        "sys.exit(0 if read() != first else 1)"
+    )
+    result = run("-rp", "0.2", "--token-file", str(token_file), "--",
+                 sys.executable, "-c", script)
+
+    assert result.exit_code == 0
+    # an explicit token file is kept
+    assert keycloak_stub.decode(token_file.read_text())
+    assert keycloak_stub.requests["client_credentials"] > 2
+
+
+def test_exec_refresh_period_shortened(keycloak_stub, tmp_path):
+    keycloak_stub.access_token_lifespan = 4
+    token_file = tmp_path / "token"
+    # the token file is read after the expiry of the first token
+    script = (
+        "import os, time; time.sleep(5); "
+        "print(open(os.environ['NEXUS_TOKEN_FILE']).read())"
+    )
+    result = run("-rp", "1h", "--token-file", str(token_file), "--",
+                 sys.executable, "-c", script)
+
+    assert result.exit_code == 0
+    assert keycloak_stub.decode(token_file.read_text())
+    assert keycloak_stub.requests["client_credentials"] > 2
+
+
+def test_exec_socket_and_env(keycloak_stub, tmp_path):
+    socket_path = str(tmp_path / "token.sock")
+    script = (
+        "import os, socket, sys; "
+        "client = socket.socket(socket.AF_UNIX); client.connect(os.environ['NEXUS_TOKEN_SOCKET']); "
+        "token = client.recv(65536).decode(); "
+        "sys.exit(0 if token == os.environ['NEXUS_TOKEN'] else 1)"
+    )
+    result = run("--socket", socket_path, "--env-token", "--", sys.executable, "-c", script)
+
+    assert result.exit_code == 0
+    assert not os.path.exists(socket_path)
+
+
+def test_exec_forwards_signals(keycloak_stub, tmp_path):
+    ready = tmp_path / "ready"
+    script = (
+        "import signal, sys, time; "
+        "signal.signal(signal.SIGTERM, lambda *args: sys.exit(7)); "
+        f"open({str(ready)!r}, 'w').close(); time.sleep(30)"
+    )
+
+    def terminate():
+        while not ready.exists():
+            threading.Event().wait(0.05)
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    threading.Thread(target=terminate, daemon=True).start()
+    result = run("-rp", "0.1", "--", sys.executable, "-c", script)
+
+    assert result.exit_code == 7
+
+
+def test_exec_terminal_signals_not_forwarded(keycloak_stub, tmp_path):
+    ready = tmp_path / "ready"
+    # interrupted twice, the command would exit with 3
+    script = (
+        "import signal, sys, time; "
+        "interrupts = []; "
+        "signal.signal(signal.SIGINT, lambda *args: interrupts.append(args)); "
+        f"open({str(ready)!r}, 'w').close(); time.sleep(1); "
+        "sys.exit(3 if interrupts else 0)"
+    )
+
+    def interrupt():
+        while not ready.exists():
+            threading.Event().wait(0.05)
+        # as the terminal would send it to the command as well
+        os.kill(os.getpid(), signal.SIGINT)
+
+    threading.Thread(target=interrupt, daemon=True).start()
+    result = run("-rp", "0.1", "--", sys.executable, "-c", script)
+
+    assert result.exit_code == 0
+    assert signal.getsignal(signal.SIGINT) is not signal.SIG_IGN
+
+
+def test_exec_errors(keycloak_stub, tmp_path):
+    assert run("--", "/nonexistent/command").exit_code == 127
+
+    not_executable = tmp_path / "not_executable"
+    not_executable.write_text("#!/bin/sh\n")
+    assert run("--", str(not_executable)).exit_code == 126
+
+    # executable, but neither a binary nor a script
+    exec_format = tmp_path / "exec_format"
+    exec_format.write_bytes(b"\x00\x01")
+    exec_format.chmod(0o755)
+    assert run("--", str(exec_format)).exit_code == 126
+
+    result = CliRunner().invoke(exec_command, [
+        "--username", DEFAULT_SERVICE_CLIENT_ID, "--password", "wrong", "--service", "1",
+        "--", "true"
+    ])
+    assert result.exit_code == 1
+
+    # a token file that cannot be written is not a command that cannot be started
+    not_a_directory = tmp_path / "file"
+    not_a_directory.write_text("")
+    assert run("--token-file", str(not_a_directory / "token"), "--", "true").exit_code == 1
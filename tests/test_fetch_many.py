@@ -0,0 +1,168 @@
+import json
+import threading
+import time
+
+import pytest
+import yaml
+from click.testing import CliRunner
+
+from blue_brain_token_fetch.fetch_many import (
+    ServiceIdentity, fetch_many, fetch_many_command, load_identities
+)
+from blue_brain_token_fetch.rate_limiter import get_rate_limiter
+from blue_brain_token_fetch.token_fetcher_base import TokenFetcherBase
+from blue_brain_token_fetch.token_fetcher_service import KeycloakOpenID, TokenFetcherService
+from tests.conftest import SERVICE_CONFIG
+
+
+@pytest.fixture
+def config(keycloak_stub, tmp_path):
+    for client_id in ["a", "b"] + [f"client{i}" for i in range(20)]:
+        keycloak_stub.add_client(client_id, "secret")
+    return keycloak_stub.write_keycloak_config(tmp_path / "keycloak_config.yaml")
+
+
+def test_resolve_secret(monkeypatch, tmp_path):
+    monkeypatch.setenv("CLIENT_SECRET", "from_env")
+    (tmp_path / "secret").write_text("from_file\n")
+
+    assert ServiceIdentity("client", secret="literal").resolve_secret() == "literal"
+    assert ServiceIdentity("client", secret_env="CLIENT_SECRET").resolve_secret() == "from_env"
+    assert ServiceIdentity(
+        "client", secret_file=str(tmp_path / "secret")
+    ).resolve_secret() == "from_file"
+    with pytest.raises(ValueError):
+        ServiceIdentity("client").resolve_secret()
+
+
+def test_load_identities(tmp_path):
+    identities_file = tmp_path / "identities.yaml"
+    identities_file.write_text(yaml.dump([
+        {"client_id": "a", "secret": "s"},
+        {"client_id": "b", "secret_env": "B", "keycloak_config_file": "other.yaml"},
+    ]))
+
+    identities = load_identities(str(identities_file), SERVICE_CONFIG)
+    assert identities == [
+        ServiceIdentity("a", secret="s", keycloak_config_file=SERVICE_CONFIG),
+        ServiceIdentity("b", secret_env="B", keycloak_config_file="other.yaml"),
+    ]
+
+    # the same default configuration file as the main command
+    assert load_identities(str(identities_file))[0].keycloak_config_file == \
+        TokenFetcherBase._config_file_path()
+
+    identities_file.write_text(yaml.dump([{"client": "a"}]))
+    with pytest.raises(ValueError):
+        load_identities(str(identities_file))
+
+
+def test_fetch_many(keycloak_stub, config):
+    keycloak_stub.latency = 0.5
+    identities = [
+        ServiceIdentity(f"client{i}", secret="secret", keycloak_config_file=config)
+        for i in range(20)
+    ] + [ServiceIdentity("bad", secret="invalid", keycloak_config_file=config)]
+
+    start = time.monotonic()
+    results = list(fetch_many(identities, concurrency=10, timeout=5))
+
+    # 21 grants of 500ms with 10 in flight, rather than one after the other
+    assert time.monotonic() - start < 5
+    assert sorted(result["client_id"] for result in results) == sorted(
+        identity.client_id for identity in identities
+    )
+    failures = [result for result in results if result["status"] != "ok"]
+    assert [failure["client_id"] for failure in failures] == ["bad"]
+    assert failures[0]["error"].startswith("KeycloakAuthenticationError")
+    assert all(result["access_token"] for result in results if result["status"] == "ok")
+
+
+def test_fetch_many_closes_fetchers(config, monkeypatch):
+    closed = []
+    close = TokenFetcherService.close
+
+    def recording_close(fetcher):
+        close(fetcher)
+        closed.append(fetcher._closed)
+
+    monkeypatch.setattr(TokenFetcherService, "close", recording_close)
+    identities = [ServiceIdentity(client_id, secret="secret", keycloak_config_file=config)
+                  for client_id in ["a", "b"]]
+
+    results = list(fetch_many(identities))
+
+    assert all(result["status"] == "ok" for result in results)
+    assert closed == [True, True]
+
+
+def test_fetch_many_timeout(keycloak_stub, config):
+    keycloak_stub.latency = 0.5
+    threads = threading.active_count()
+
+    results = list(fetch_many(
+        [ServiceIdentity("a", secret="secret", keycloak_config_file=config)],
+        timeout=0.1
+    ))
+
+    assert results[0]["status"] == "error"
+    assert results[0]["error"].startswith("TimeoutError")
+
+    # the late grant finishes in the background
+    while threading.active_count() > threads:
+        time.sleep(0.05)
+
+
+def test_fetch_many_request_timeout(config, monkeypatch):
+    timeouts = []
+
+    class TimedKeycloakOpenID(KeycloakOpenID):
+        def __init__(self, *args, timeout=None, **kwargs):
+            timeouts.append(timeout)
+            super().__init__(*args, timeout=timeout, **kwargs)
+
+    monkeypatch.setattr(
+        "blue_brain_token_fetch.token_fetcher_service.KeycloakOpenID", TimedKeycloakOpenID
+    )
+    results = list(fetch_many(
+        [ServiceIdentity("a", secret="secret", keycloak_config_file=config)],
+        timeout=2
+    ))
+
+    assert results[0]["status"] == "ok"
+    # the keycloak requests are bounded by the timeout of the grant
+    assert timeouts and all(timeout == 2 for timeout in timeouts)
+
+
+def test_fetch_many_command(config, tmp_path):
+    identities_file = tmp_path / "identities.json"
+    identities_file.write_text(json.dumps([
+        {"client_id": "a", "secret": "secret"}, {"client_id": "b", "secret": "invalid"}
+    ]))
+
+    result = CliRunner().invoke(
+        fetch_many_command, [str(identities_file), "-kcf", config, "-c", "2"]
+    )
+
+    lines = [json.loads(line) for line in result.output.splitlines() if line.startswith("{")]
+    assert {line["client_id"]: line["status"] for line in lines} == {"a": "ok", "b": "error"}
+    assert result.exit_code == 1
+
+
+@pytest.mark.parametrize("options, rate, burst", [
+    pytest.param([], 10, 30, id="default"),
+    pytest.param(["--rate-limit", "2", "--rate-limit-burst", "4"], 2, 4, id="limit"),
+    pytest.param(["--rate-limit", "0"], None, 30, id="no_limit"),
+])
+def test_fetch_many_command_rate_limit(keycloak_stub, config, tmp_path, options, rate,
+                                       burst):
+    identities_file = tmp_path / "identities.json"
+    identities_file.write_text(json.dumps([{"client_id": "a", "secret": "secret"}]))
+
+    result = CliRunner().invoke(
+        fetch_many_command, [str(identities_file), "-kcf", config] + options
+    )
+
+    assert result.exit_code == 0
+    bucket = get_rate_limiter(keycloak_stub.server_url, keycloak_stub.realm)
+    assert (bucket.rate, bucket.burst, bucket.allowed) == (rate, burst, 1)
@@ -0,0 +1,123 @@
+import threading
+
+import pytest
+from keycloak import KeycloakAuthenticationError
+
+from blue_brain_token_fetch import fetcher_registry
+from blue_brain_token_fetch.fetcher_registry import get_fetcher, registered_fetchers
+from blue_brain_token_fetch.testing import (
+    DEFAULT_CLIENT_ID, DEFAULT_PASSWORD, DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET,
+    DEFAULT_USERNAME
+)
+
+
+def get_user_fetcher(stub, server_url=None, **kwargs):
+    return get_fetcher(
+        server_url or stub.server_url, stub.realm, DEFAULT_CLIENT_ID, DEFAULT_USERNAME,
+        kwargs.pop("password", DEFAULT_PASSWORD), **kwargs
+    )
+
+
+def test_one_fetcher_per_identity(keycloak_stub):
+    first = get_user_fetcher(keycloak_stub)
+    # the trailing slash of the server URL is not part of the identity
+    second = get_user_fetcher(keycloak_stub, keycloak_stub.server_url.rstrip("/"))
+    try:
+        assert first.fetcher is second.fetcher
+        assert first.get_valid_access_token() == second.get_valid_access_token()
+        assert keycloak_stub.requests["password"] == 1
+        assert [entry["references"] for entry in registered_fetchers()] == [2]
+    finally:
+        first.close()
+        second.close()
+    assert registered_fetchers() == []
+
+
+def test_closed_with_last_handle(keycloak_stub):
+    first = get_user_fetcher(keycloak_stub)
+    with get_user_fetcher(keycloak_stub):
+        pass
+    # closing a handle twice releases it once only
+    assert first.fetcher._interrupt_callback is not None
+    first.close()
+    first.close()
+    assert first.fetcher._interrupt_callback is None
+
+    with get_user_fetcher(keycloak_stub) as other:
+        assert other.fetcher is not first.fetcher
+    assert keycloak_stub.requests["password"] == 2
+
+
+def test_distinct_identities(keycloak_stub):
+    keycloak_stub.add_user("other", "other-password")
+    with get_user_fetcher(keycloak_stub) as user, \
+            get_fetcher(keycloak_stub.server_url, keycloak_stub.realm, DEFAULT_CLIENT_ID,
+                        "other", "other-password") as other, \
+            get_fetcher(keycloak_stub.server_url, keycloak_stub.realm,
+                        DEFAULT_SERVICE_CLIENT_ID, password=DEFAULT_SERVICE_SECRET,
+                        service=True) as service:
+        assert len({id(user.fetcher), id(other.fetcher), id(service.fetcher)}) == 3
+        assert keycloak_stub.decode(service.get_access_token())["sub"] == \
+            f"service-account-{DEFAULT_SERVICE_CLIENT_ID}"
+        assert len(registered_fetchers()) == 3
+
+
+def test_password_checked(keycloak_stub):
+    with get_user_fetcher(keycloak_stub) as handle:
+        with pytest.raises(ValueError):
+            get_user_fetcher(keycloak_stub, password="wrong")
+        assert registered_fetchers()[0]["references"] == 1
+        with get_user_fetcher(keycloak_stub, password=None) as shared:
+            assert shared.fetcher is handle.fetcher
+
+
+def test_prompted_password_checked(keycloak_stub, monkeypatch):
+    monkeypatch.setattr(fetcher_registry.getpass, "getpass", lambda prompt: DEFAULT_PASSWORD)
+    with get_user_fetcher(keycloak_stub, password=None) as handle:
+        # the digest is the one of the password prompted for, not of the missing one
+        with pytest.raises(ValueError):
+            get_user_fetcher(keycloak_stub, password="wrong")
+        with get_user_fetcher(keycloak_stub) as shared:
+            assert shared.fetcher is handle.fetcher
+    assert keycloak_stub.requests["password"] == 1
+
+
+def test_close_from_several_threads(keycloak_stub):
+    first = get_user_fetcher(keycloak_stub)
+    with get_user_fetcher(keycloak_stub) as second:
+        threads = [threading.Thread(target=first.close) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # released once only, the other handle keeping the fetcher open
+        assert registered_fetchers()[0]["references"] == 1
+        assert second.fetcher._interrupt_callback is not None
+    assert registered_fetchers() == []
+
+
+def test_failed_creation_not_registered(keycloak_stub):
+    with pytest.raises(KeycloakAuthenticationError):
+        get_user_fetcher(keycloak_stub, password="wrong")
+    assert registered_fetchers() == []
+
+
+def test_concurrent_first_calls(keycloak_stub):
+    keycloak_stub.latency = 0.05
+    handles = []
+
+    def get():
+        handles.append(get_user_fetcher(keycloak_stub))
+
+    threads = [threading.Thread(target=get) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    try:
+        assert len({id(handle.fetcher) for handle in handles}) == 1
+        assert keycloak_stub.requests["password"] == 1
+    finally:
+        for handle in handles:
+            handle.close()
+    assert registered_fetchers() == []
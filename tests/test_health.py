@@ -0,0 +1,149 @@
+import json
+import subprocess
+import sys
+import time
+
+import pytest
+from click.testing import CliRunner
+from keycloak import KeycloakError
+
+from blue_brain_token_fetch.health import (
+    DEGRADED, EXPIRED, HEALTHY, UNKNOWN, HealthRecorder, check_health, health_command,
+    read_state
+)
+from blue_brain_token_fetch.testing import DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET
+from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
+
+
+def test_recorder(tmp_path):
+    path = str(tmp_path / "state" / "state.json")
+    recorder = HealthRecorder(path)
+    recorder.record_failure(ValueError("boom"))
+    recorder.record_failure(ValueError("boom"))
+    state = read_state(path)
+    assert state["consecutive_failures"] == 2
+    assert state["last_error"] == "ValueError: boom"
+    assert state["expires_at"] is None
+
+    recorder.record_refresh(1000.0)
+    state = read_state(path)
+    assert state["consecutive_failures"] == 0
+    assert state["last_error"] is None
+    assert state["expires_at"] == 1000.0
+    assert state["last_refresh"] is not None
+    assert list(tmp_path.joinpath("state").iterdir()) == [tmp_path / "state" / "state.json"]
+
+
+def test_read_state_missing_or_invalid(tmp_path):
+    assert read_state(str(tmp_path / "missing.json")) is None
+    tmp_path.joinpath("invalid.json").write_text("{")
+    assert read_state(str(tmp_path / "invalid.json")) is None
+
+
+def test_check_health():
+    state = {"pid": None, "expires_at": 1000, "consecutive_failures": 0}
+    assert check_health(None)[0] == UNKNOWN
+    assert check_health(dict(state, expires_at=None))[0] == UNKNOWN
+    assert check_health(state, now=900)[0] == HEALTHY
+    assert check_health(state, now=990)[0] == DEGRADED
+    assert check_health(state, now=990, min_validity=5)[0] == HEALTHY
+    assert check_health(state, now=1000)[0] == EXPIRED
+    assert check_health(dict(state, consecutive_failures=3), now=900)[0] == DEGRADED
+    assert check_health(dict(state, consecutive_failures=3), now=900, max_failures=4)[0] == \
+        HEALTHY
+
+
+def test_check_health_dead_process():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    state = {"pid": process.pid, "expires_at": 1000, "consecutive_failures": 0}
+    status, reason = check_health(state, now=900)
+    assert status == DEGRADED
+    assert str(process.pid) in reason
+
+
+@pytest.mark.parametrize("expires_in, expected", [(600, HEALTHY), (10, DEGRADED), (-10, EXPIRED)])
+def test_health_command(tmp_path, expires_in, expected):
+    path = str(tmp_path / "state.json")
+    HealthRecorder(path).record_refresh(time.time() + expires_in)
+
+    result = CliRunner().invoke(health_command, ["--state-file", path, "--json"])
+    assert result.exit_code == expected
+    assert json.loads(result.output)["consecutive_failures"] == 0
+
+    result = CliRunner().invoke(health_command, ["--state-file", str(tmp_path / "missing")])
+    assert result.exit_code == UNKNOWN
+    assert result.output.startswith("unknown")
+
+
+def test_health_command_without_state_file():
+    # there is no default record shared by the fetchers of the user
+    result = CliRunner().invoke(health_command, [])
+    assert result.exit_code == UNKNOWN
+    assert "--state-file" in result.output
+
+
+def test_recorder_write_error(tmp_path, caplog):
+    tmp_path.joinpath("file").write_text("")
+    recorder = HealthRecorder(str(tmp_path / "file" / "state.json"))
+    recorder.record_refresh(1000.0)
+    recorder.record_failure(ValueError("boom"))
+    assert "Cannot write the state record" in caplog.text
+
+
+def test_fetcher_with_unwritable_state(keycloak_stub, tmp_path):
+    tmp_path.joinpath("file").write_text("")
+    fetcher = TokenFetcherService(
+        DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET,
+        state_file=str(tmp_path / "file" / "state.json")
+    )
+    try:
+        assert keycloak_stub.decode(fetcher.get_access_token())
+        # the keycloak error is raised, not the one of the state record
+        keycloak_stub.fail_next(1)
+        with pytest.raises(KeycloakError):
+            fetcher.get_access_token()
+    finally:
+        fetcher.close()
+
+
+def test_fetcher_records_state(keycloak_stub, tmp_path):
+    path = str(tmp_path / "state.json")
+    fetcher = TokenFetcherService(
+        DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, state_file=path
+    )
+    try:
+        state = read_state(path)
+        assert state["expires_at"] == pytest.approx(fetcher.expires_at())
+        assert check_health(state)[0] == HEALTHY
+
+        keycloak_stub.fail_next(3)
+        for _ in range(3):
+            with pytest.raises(Exception):
+                fetcher.get_access_token()
+        state = read_state(path)
+        assert state["consecutive_failures"] == 3
+        assert check_health(state)[0] == DEGRADED
+
+        fetcher.get_access_token()
+        assert read_state(path)["consecutive_failures"] == 0
+    finally:
+        fetcher.close()
+
+
+def test_health_subcommand_without_keycloak(tmp_path):
+    path = str(tmp_path / "state.json")
+    HealthRecorder(path).record_refresh(time.time() + 600)
+    script = (
+        "import sys\n"
+        "from blue_brain_token_fetch.commands import start\n"
+        f"sys.argv = ['blue-brain-token-fetch', 'health', '--state-file', {path!r}]\n"
+        "try:\n"
+        "    start()\n"
+        "except SystemExit as exit:\n"
+        "    assert not any(name.startswith('keycloak') for name in sys.modules)\n"
+        "    raise\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True)
+    assert result.returncode == HEALTHY, result.stderr
+    assert result.stdout.startswith("healthy")
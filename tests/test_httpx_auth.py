@@ -0,0 +1,72 @@
+import pytest
+
+from blue_brain_token_fetch.testing import DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET
+from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
+
+httpx = pytest.importorskip("httpx")
+
+from blue_brain_token_fetch.httpx_auth import NexusHttpxAuth  # noqa: E402
+
+
+@pytest.fixture
+def client(keycloak_stub):
+    fetcher = TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET)
+    received, rejected_tokens = [], set()
+
+    def handler(request):
+        token = request.headers["Authorization"][len("Bearer "):]
+        received.append(token)
+        return httpx.Response(401 if {token, "*"} & rejected_tokens else 200)
+
+    client = httpx.Client(transport=httpx.MockTransport(handler), auth=NexusHttpxAuth(fetcher))
+    return client, fetcher, received, rejected_tokens
+
+
+def test_cached_bearer_token(keycloak_stub, client):
+    client, fetcher, received, _ = client
+    grants = keycloak_stub.requests["client_credentials"]
+
+    for _ in range(10):
+        assert client.get("https://nexus/resources").status_code == 200
+
+    assert keycloak_stub.requests["client_credentials"] == grants
+    assert set(received) == {fetcher._token.access_token}
+
+
+def test_retry_once_on_401(client):
+    client, fetcher, received, rejected_tokens = client
+    rejected_token = fetcher._token.access_token
+    rejected_tokens.add(rejected_token)
+
+    assert client.post("https://nexus/files", content=b"content").status_code == 200
+    assert received == [rejected_token, fetcher._token.access_token]
+
+    # retried only once
+    rejected_tokens.add("*")
+    assert client.get("https://nexus/resources").status_code == 401
+    assert len(received) == 4
+
+
+def test_no_retry_streamed_body(keycloak_stub):
+    fetcher = TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET)
+    rejected_token = fetcher._token.access_token
+    bodies = []
+
+    class StreamingTransport(httpx.BaseTransport):
+        # consumes the request stream as a network transport would
+        def handle_request(self, request):
+            bodies.append(b"".join(request.stream))
+            token = request.headers["Authorization"][len("Bearer "):]
+            return httpx.Response(401 if token == rejected_token else 200)
+
+    def chunks():
+        yield b"con"
+        yield b"tent"
+
+    client = httpx.Client(transport=StreamingTransport(), auth=NexusHttpxAuth(fetcher))
+    # the streamed body has been consumed, so the 401 is returned as it is
+    assert client.post("https://nexus/files", content=chunks()).status_code == 401
+    assert bodies == [b"content"]
+
+    assert client.post("https://nexus/files", content=b"content").status_code == 200
+    assert bodies == [b"content", b"content", b"content"]
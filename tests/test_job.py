@@ -0,0 +1,30 @@
+import threading
+
+from blue_brain_token_fetch.job import Job, run_job_step
+
+
+def test_job_survives_failures():
+    runs = []
+    done = threading.Event()
+
+    def execute():
+        runs.append(None)
+        if len(runs) == 3:
+            done.set()
+        raise RuntimeError("keycloak unreachable")
+
+    interrupt = Job.schedule(execute, 0.01)
+    try:
+        assert done.wait(5)
+    finally:
+        interrupt(wait=True)
+
+
+def test_run_job_step(caplog):
+    assert run_job_step(lambda: None)
+
+    def rotate():
+        raise RuntimeError("keycloak unreachable")
+
+    assert not run_job_step(rotate)
+    assert "The job rotate failed" in caplog.text
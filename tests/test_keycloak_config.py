@@ -0,0 +1,134 @@
+import os
+
+import pytest
+import yaml
+
+from blue_brain_token_fetch import keycloak_config
+from blue_brain_token_fetch.keycloak_config import (
+    ConfigProfileError, load_config_file, load_keycloak_config
+)
+from blue_brain_token_fetch.testing import (
+    DEFAULT_PASSWORD, DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, DEFAULT_USERNAME,
+)
+from blue_brain_token_fetch.token_fetcher_base import TokenFetcherBase
+from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
+from blue_brain_token_fetch.token_fetcher_user import TokenFetcherUser
+from tests.conftest import REGULAR_CONFIG
+
+PROFILES = {
+    "default": "prod",
+    "profiles": {
+        "dev": {
+            "SERVER_URL": "https://dev.example.org/auth/",
+            "REALM_NAME": "DEV",
+            "user": {"CLIENT_ID": "dev-cli"},
+            "service": {"TIMEOUT": 5},
+        },
+        "prod": {
+            "SERVER_URL": ["https://a.example.org/auth/", "https://b.example.org/auth/"],
+            "REALM_NAME": "BBP",
+            "CLIENT_ID": "nexus-cli",
+        },
+    },
+}
+
+
+def write_config(path, content):
+    with open(path, "w") as config_file:
+        yaml.dump(content, config_file)
+    return str(path)
+
+
+def test_flat_file():
+    assert load_keycloak_config(REGULAR_CONFIG) == yaml.safe_load(open(REGULAR_CONFIG))
+    assert load_config_file(REGULAR_CONFIG).profile_names() == ["default"]
+
+
+def test_profiles(tmp_path):
+    path = write_config(tmp_path / "config.yaml", PROFILES)
+    assert load_keycloak_config(path)["REALM_NAME"] == "BBP"
+    assert load_keycloak_config(path, "dev", "user") == {
+        "SERVER_URL": "https://dev.example.org/auth/", "REALM_NAME": "DEV",
+        "CLIENT_ID": "dev-cli",
+    }
+    assert load_keycloak_config(path, "dev", "service")["TIMEOUT"] == 5
+    assert "CLIENT_ID" not in load_keycloak_config(path, "dev", "service")
+
+    with pytest.raises(ConfigProfileError, match="staging"):
+        load_keycloak_config(path, "staging")
+    # no default profile among several ones
+    path = write_config(tmp_path / "no_default.yaml", dict(PROFILES, default=None))
+    with pytest.raises(ConfigProfileError):
+        load_keycloak_config(path)
+
+
+def test_parsed_once(tmp_path, monkeypatch):
+    path = write_config(tmp_path / "config.yaml", PROFILES)
+    parsed = []
+    parse_config_file = keycloak_config.parse_config_file
+    monkeypatch.setattr(
+        keycloak_config, "parse_config_file",
+        lambda file_name: parsed.append(file_name) or parse_config_file(file_name)
+    )
+    config_file = load_config_file(path)
+    assert load_config_file(path) is config_file
+    # the returned configurations can be modified without altering the cached one
+    load_keycloak_config(path, "prod")["REALM_NAME"] = "changed"
+    assert load_keycloak_config(path, "prod")["REALM_NAME"] == "BBP"
+    assert len(parsed) == 1
+
+    write_config(path, dict(PROFILES, default="dev"))
+    assert load_keycloak_config(path)["REALM_NAME"] == "DEV"
+    assert len(parsed) == 2
+    reloaded = load_config_file(path, reload=True)
+    assert load_config_file(path) is reloaded
+    assert len(parsed) == 3
+
+
+@pytest.mark.parametrize("content", [
+    pytest.param(["SERVER_URL"], id="not_a_mapping"),
+    pytest.param({"profiles": {"dev": {"REALM_NAME": 1}}}, id="realm_type"),
+    pytest.param({"profiles": {"dev": {"SERVER_URL": []}}}, id="empty_servers"),
+    pytest.param({"profiles": {"dev": {"user": {"TIMEOUT": "soon"}}}}, id="section_timeout"),
+    pytest.param({"profiles": {"dev": {"service": "client"}}}, id="section_type"),
+    pytest.param(dict(PROFILES, default="staging"), id="default_profile"),
+])
+def test_validated_up_front(tmp_path, content):
+    path = write_config(tmp_path / "config.yaml", content)
+    with pytest.raises(ValueError):
+        load_config_file(path)
+
+
+def test_fetcher_profile(tmp_path, start_stub):
+    dev = start_stub(realm="DEV")
+    profiles = {"profiles": dict(PROFILES["profiles"])}
+    profiles["profiles"]["dev"] = dict(profiles["profiles"]["dev"], SERVER_URL=dev.server_url)
+    path = write_config(tmp_path / "config.yaml", profiles)
+    fetcher = TokenFetcherService(
+        DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, path, config_profile="dev"
+    )
+    try:
+        assert fetcher._realm_name == "DEV"
+        assert fetcher.server_url() == dev.server_url
+        assert dev.requests["client_credentials"] == 1
+    finally:
+        fetcher.close()
+
+    # the user section is missing the mandatory client identifier
+    path = write_config(tmp_path / "no_client.yaml", {"profiles": {"dev": {
+        "SERVER_URL": "https://dev.example.org/auth/", "REALM_NAME": "DEV"
+    }}})
+    with pytest.raises(KeyError, match="CLIENT_ID"):
+        TokenFetcherUser(DEFAULT_USERNAME, DEFAULT_PASSWORD, path, config_profile="dev")
+
+
+def test_default_file_with_profiles_not_prompted(tmp_path, monkeypatch):
+    path = write_config(tmp_path / "config.yaml", PROFILES)
+    monkeypatch.setattr(TokenFetcherBase, "DEFAULT_TOKEN_FILEPATH", path)
+    monkeypatch.setattr("builtins.input", lambda prompt: pytest.fail("prompted"))
+
+    with pytest.raises(ConfigProfileError):
+        TokenFetcherUser._load_keycloak_config(None, "staging")
+    assert TokenFetcherUser._load_keycloak_config(None, "dev")["CLIENT_ID"] == "dev-cli"
+    assert os.path.exists(path)
+    assert yaml.safe_load(open(path)) == PROFILES
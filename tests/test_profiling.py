@@ -0,0 +1,44 @@
+import pstats
+
+from blue_brain_token_fetch.profiling import Profiler, _NULL_PHASE
+from blue_brain_token_fetch.testing import DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET
+from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
+
+
+def test_disabled_profiler():
+    profiler = Profiler()
+
+    assert profiler.phase("phase") is _NULL_PHASE
+    with profiler.phase("phase"):
+        pass
+    assert profiler.stats == {}
+
+
+def test_phase_timing():
+    profiler = Profiler()
+    profiler.enable(report_at_exit=False)
+
+    for _ in range(3):
+        with profiler.phase("phase"):
+            sum(range(10000))
+
+    stats = profiler.stats["phase"]
+    assert stats.count == 3
+    assert 0 < stats.max_wall <= stats.wall
+    assert stats.cpu > 0
+    assert "phase" in profiler.summary()
+
+
+def test_fetcher_phases(keycloak_stub, monkeypatch, tmp_path):
+    profiler = Profiler()
+    monkeypatch.setattr("blue_brain_token_fetch.profiling.profiler", profiler)
+    profiler.enable(str(tmp_path / "fetch.pstats"), report_at_exit=False)
+
+    TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET).get_access_token()
+    profiler.dump_stats()
+
+    assert {
+        "init.credentials", "init.config", "init.authentication", "init.refresh_scheduling"
+    } <= set(profiler.stats)
+    assert profiler.stats["grant.client_credentials"].count == 2
+    assert pstats.Stats(str(tmp_path / "fetch.pstats")).total_calls > 0
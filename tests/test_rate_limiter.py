@@ -0,0 +1,102 @@
+import pytest
+
+from blue_brain_token_fetch import rate_limiter
+from blue_brain_token_fetch.rate_limiter import (
+    RateLimitExceededError, TokenBucket, configure_rate_limit, get_rate_limiter, rate_limit_stats
+)
+from blue_brain_token_fetch.testing import DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET
+from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, duration):
+        self.sleeps.append(duration)
+        self.now += duration
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    return clock
+
+
+def test_wait_mode(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+
+    for _ in range(3):
+        assert bucket.acquire() == 0
+    assert bucket.acquire() == 0.5
+    assert bucket.acquire() == 0.5
+    assert clock.sleeps == [0.5, 0.5]
+
+    clock.now += 10
+    assert bucket.acquire() == 0
+    assert bucket.stats() == {
+        "rate": 2, "burst": 3, "block": True, "allowed": 4, "throttled": 2, "rejected": 0,
+        "waited": 1.0,
+    }
+
+
+def test_fail_mode(clock):
+    bucket = TokenBucket(rate=1, burst=1, block=False)
+
+    bucket.acquire()
+    with pytest.raises(RateLimitExceededError):
+        bucket.acquire()
+    clock.now += 1
+    bucket.acquire()
+
+    assert (bucket.allowed, bucket.rejected) == (2, 1)
+
+
+def test_no_limit(clock):
+    bucket = TokenBucket(rate=None)
+    for _ in range(1000):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+
+def test_invalid_limit():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+    with pytest.raises(ValueError):
+        TokenBucket(burst=0)
+
+
+def test_registry(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_default_limit", dict(rate_limiter._default_limit))
+
+    bucket = get_rate_limiter("https://server/auth/", "realm")
+    assert bucket is get_rate_limiter("https://server/auth", "realm")
+    assert bucket is not get_rate_limiter("https://server/auth", "other")
+
+    configure_rate_limit(5, 2, block=False, server_url="https://server/auth", realm="realm")
+    assert (bucket.rate, bucket.burst, bucket.block) == (5, 2, False)
+    # the default limit of the library for the other ones
+    other = get_rate_limiter("https://server/auth", "other")
+    assert (other.rate, other.burst) == (rate_limiter.DEFAULT_RATE, rate_limiter.DEFAULT_BURST)
+
+    configure_rate_limit(None)
+    assert get_rate_limiter("https://new/auth", "realm").rate is None
+    assert "https://server/auth realm" in rate_limit_stats()
+
+
+def test_fetcher_rate_limit(keycloak_stub, clock):
+    fetcher = TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET)
+    configure_rate_limit(1, 2, block=False, server_url=keycloak_stub.server_url,
+                         realm=keycloak_stub.realm)
+
+    fetcher.get_access_token()
+    fetcher.get_access_token()
+    with pytest.raises(RateLimitExceededError):
+        fetcher.get_access_token()
+
+    assert keycloak_stub.requests["client_credentials"] == 3
@@ -0,0 +1,104 @@
+import io
+
+import pytest
+
+from blue_brain_token_fetch.testing import DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET
+from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
+
+requests = pytest.importorskip("requests")
+
+from blue_brain_token_fetch.requests_auth import NexusRequestsAuth  # noqa: E402
+
+
+class NexusAdapter(requests.adapters.BaseAdapter):
+    """
+    Answers 401 to the requests authenticated with a rejected token, 200 otherwise.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.rejected_tokens = set()
+        self.received = []
+
+    def send(self, request, **kwargs):
+        token = request.headers["Authorization"][len("Bearer "):]
+        body = request.body
+        if hasattr(body, "read"):
+            body = body.read()
+        elif body is not None and not isinstance(body, (bytes, str)):
+            body = b"".join(body)
+        self.received.append((token, body))
+
+        response = requests.Response()
+        response.status_code = 401 if {token, "*"} & self.rejected_tokens else 200
+        response.request = request
+        response.connection = self
+        response._content = b""
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def session(keycloak_stub):
+    fetcher = TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET)
+    adapter = NexusAdapter()
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.auth = NexusRequestsAuth(fetcher)
+    return session, adapter, fetcher
+
+
+def test_cached_bearer_token(keycloak_stub, session):
+    session, adapter, fetcher = session
+    grants = keycloak_stub.requests["client_credentials"]
+
+    for _ in range(10):
+        assert session.get("https://nexus/resources").status_code == 200
+
+    assert keycloak_stub.requests["client_credentials"] == grants
+    assert {token for token, _ in adapter.received} == {fetcher._token.access_token}
+
+
+def test_refresh_before_expiry(session, monkeypatch):
+    session, adapter, fetcher = session
+    first_token = fetcher._token.access_token
+    monkeypatch.setattr(fetcher, "time_to_expiry", lambda token=None: 10)
+
+    session.get("https://nexus/resources")
+
+    assert adapter.received[0][0] != first_token
+
+
+def test_retry_once_on_401(session):
+    session, adapter, fetcher = session
+    rejected_token = fetcher._token.access_token
+    adapter.rejected_tokens.add(rejected_token)
+
+    response = session.post("https://nexus/files", data=io.BytesIO(b"content"))
+
+    assert response.status_code == 200
+    assert [response.status_code for response in response.history] == [401]
+    assert adapter.received == [(rejected_token, b"content"), (fetcher._token.access_token, b"content")]
+
+    # retried only once
+    adapter.rejected_tokens.add("*")
+    assert session.get("https://nexus/resources").status_code == 401
+    assert len(adapter.received) == 4
+
+
+def test_no_retry_streamed_body(session):
+    session, adapter, fetcher = session
+    rejected_token = fetcher._token.access_token
+    adapter.rejected_tokens.add(rejected_token)
+
+    def chunks():
+        yield b"con"
+        yield b"tent"
+
+    # the generator has been consumed, so the 401 is returned as it is
+    response = session.post("https://nexus/files", data=chunks())
+
+    assert response.status_code == 401
+    assert adapter.received == [(rejected_token, b"content")]
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from blue_brain_token_fetch.simulation import (
+    SIMULATED_CLIENT_ID, SIMULATED_PASSWORD, SIMULATED_REALM, SIMULATED_SERVER_URL,
+    SimulatedTokenEndpoint, SimulatedTokenFetcherUser, VirtualClock, simulate,
+    simulate_command
+)
+from blue_brain_token_fetch.testing import DEFAULT_PASSWORD, DEFAULT_USERNAME
+from blue_brain_token_fetch.token_fetcher_user import TokenFetcherUser
+
+DAY = 86400
+
+
+def test_day_of_one_user():
+    report = simulate(refresh_period=15, duration=DAY, latency=0)
+    # a refresh grant per CLI iteration and per rotation of the refresh token
+    iterations, rotations = DAY // 15, DAY // 900
+    assert report["requests_by_grant"]["password"] == 1
+    assert abs(report["requests_by_grant"]["refresh_token"] - iterations - rotations) <= 2
+    assert report["expiry_gaps"] == 0
+    assert report["failed_fetchers"] == 0
+    assert report["wall_time"] < 10
+
+
+def test_refresh_period_shortened_to_half_life_span():
+    report = simulate(refresh_period=3600, duration=DAY, service=True, latency=0)
+    # the initial grant, then one every half of the remaining life span rounded down
+    assert abs(report["requests"] - 1 - DAY // 149) <= 1
+    assert report["expiry_gaps"] == 0
+
+
+def test_timeout():
+    report = simulate(refresh_period=60, timeout=3600, duration=DAY, service=True, latency=0)
+    assert abs(report["requests"] - 61) <= 1
+    # the token lapsing after the timeout is expected
+    assert report["expiry_gaps"] == 0
+
+
+def test_session_max():
+    report = simulate(fleet_size=2, duration=DAY, session_max=36000)
+    assert report["failed_fetchers"] == 2
+    assert report["expiry_gaps"] == 2
+    assert report["longest_expiry_gap"] > DAY - 36000 - 300
+
+    report = simulate(fleet_size=2, duration=DAY, session_max=36000, reauthenticate=True)
+    assert report["failed_fetchers"] == 0
+    assert report["expiry_gaps"] == 0
+    assert report["requests_by_grant"]["password"] == 2 * 3
+
+
+def test_peak_concurrency():
+    synchronous = simulate(fleet_size=20, duration=3600, service=True, latency=0.05)
+    spread = simulate(fleet_size=20, duration=3600, service=True, latency=0.05, start_spread=15)
+    assert synchronous["peak_concurrency"] == 40
+    assert spread["peak_concurrency"] < synchronous["peak_concurrency"]
+    assert abs(spread["requests"] - synchronous["requests"]) <= 20
+
+
+def test_virtual_clock_injected(keycloak_stub):
+    clock = VirtualClock(start=0)
+    simulated = SimulatedTokenFetcherUser(
+        SimulatedTokenEndpoint(clock), "user", SIMULATED_PASSWORD, keycloak_config={
+            "SERVER_URL": SIMULATED_SERVER_URL, "REALM_NAME": SIMULATED_REALM,
+            "CLIENT_ID": SIMULATED_CLIENT_ID,
+        }
+    )
+    # a fetcher of the process running meanwhile keeps the system clock
+    fetcher = TokenFetcherUser(DEFAULT_USERNAME, DEFAULT_PASSWORD)
+    try:
+        assert simulated.time_to_expiry() == pytest.approx(300, abs=1)
+        clock.now += 100
+        assert simulated.time_to_expiry() == pytest.approx(200, abs=1)
+        assert simulated.refresh_job_interval() == pytest.approx(900, abs=1)
+        assert fetcher.time_to_expiry() == pytest.approx(
+            keycloak_stub.access_token_lifespan, abs=5
+        )
+    finally:
+        simulated.close()
+        fetcher.close()
+
+
+def test_simulate_command():
+    result = CliRunner().invoke(
+        simulate_command, ["-n", "2", "--duration", "1d", "--session-max", "10h", "--json"]
+    )
+    assert result.exit_code == 1
+    assert json.loads(result.output)["expiry_gaps"] == 2
+
+    result = CliRunner().invoke(simulate_command, ["-n", "2", "-to", "1h"])
+    assert result.exit_code == 0
+    assert "peak_concurrency" in result.output
+
+    # as for the main command, the option takes a value
+    result = CliRunner().invoke(simulate_command, ["-s", "1", "-to", "1h", "--json"])
+    assert result.exit_code == 0
+    assert "password" not in json.loads(result.output)["requests_by_grant"]
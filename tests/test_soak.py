@@ -0,0 +1,107 @@
+"""
+Soak tests running long-lived fetchers against the keycloak stub with a virtual clock,
+and asserting that memory, threads and interruption handlers stay flat.
+The number of refresh cycles can be raised with the SOAK_CYCLES environment variable,
+ex: SOAK_CYCLES=500000 to cover decades of refresh token rotations. Each cycle being an
+HTTP request to the stub, the default only covers about ten days of rotations: the
+'soak_test' CI job runs the 500000 cycles in the scheduled pipelines, or on demand.
+"""
+import os
+import threading
+import tracemalloc
+from datetime import timedelta
+
+import pytest
+
+from blue_brain_token_fetch.job import InterruptionStack, Job
+from blue_brain_token_fetch.rate_limiter import TokenBucket
+from blue_brain_token_fetch.simulation import VirtualClock
+from blue_brain_token_fetch.testing import DEFAULT_PASSWORD, DEFAULT_USERNAME
+from blue_brain_token_fetch.token_fetcher_user import TokenFetcherUser
+
+SOAK_CYCLES = int(os.environ.get("SOAK_CYCLES", 1000))
+MAX_MEMORY_GROWTH = 64 * 1024
+
+
+class VirtualStopEvent:
+    """
+    Replaces the stop event of a Job: waiting advances the virtual clock instead of
+    sleeping, and the job is stopped after the given number of cycles.
+    """
+
+    def __init__(self, clock, cycles):
+        self.clock = clock
+        self.cycles = cycles
+
+    def wait(self, timeout):
+        self.cycles -= 1
+        if self.cycles < 0:
+            return True
+        self.clock.now += timeout
+        return False
+
+    def set(self):
+        self.cycles = 0
+
+
+def traced_memory_growth(run, warm_up):
+    tracemalloc.start()
+    try:
+        warm_up()
+        baseline = tracemalloc.get_traced_memory()[0]
+        run()
+        return tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+def test_refresh_cycles(keycloak_stub, monkeypatch, tmp_path):
+    # an explicit file, as the log of the default one is kept by pytest
+    config = keycloak_stub.write_keycloak_config(tmp_path / "keycloak_config.yaml")
+    clock = VirtualClock()
+    monkeypatch.setattr(keycloak_stub, "clock", clock.time)
+    monkeypatch.setattr(
+        "blue_brain_token_fetch.token_fetcher_base.get_rate_limiter",
+        lambda server_url, realm: TokenBucket(rate=None)
+    )
+
+    fetcher = TokenFetcherUser(DEFAULT_USERNAME, DEFAULT_PASSWORD, config, clock=clock.time)
+    fetcher.close()
+    threads, handlers = threading.active_count(), len(InterruptionStack.stack)
+
+    job = Job(
+        interval=timedelta(seconds=fetcher.refresh_job_interval()),
+        execute=fetcher.run_refresh_job
+    )
+
+    def run_cycles(cycles):
+        job.stopped = VirtualStopEvent(clock, cycles)
+        job.run()
+
+    start = clock.now
+    growth = traced_memory_growth(lambda: run_cycles(SOAK_CYCLES), lambda: run_cycles(100))
+
+    assert growth < MAX_MEMORY_GROWTH
+    assert clock.now - start == pytest.approx((SOAK_CYCLES + 100) * job.interval.total_seconds())
+    assert keycloak_stub.requests["refresh_token"] == SOAK_CYCLES + 100
+    assert threading.active_count() == threads
+    assert len(InterruptionStack.stack) == handlers
+
+
+def test_fetcher_lifecycles(keycloak_stub, monkeypatch, tmp_path):
+    config = keycloak_stub.write_keycloak_config(tmp_path / "keycloak_config.yaml")
+    monkeypatch.setattr(
+        "blue_brain_token_fetch.token_fetcher_base.get_rate_limiter",
+        lambda server_url, realm: TokenBucket(rate=None)
+    )
+    threads, handlers = threading.active_count(), len(InterruptionStack.stack)
+
+    def create_and_close(count):
+        for _ in range(count):
+            TokenFetcherUser(DEFAULT_USERNAME, DEFAULT_PASSWORD, config).close()
+
+    growth = traced_memory_growth(lambda: create_and_close(100), lambda: create_and_close(20))
+
+    assert growth < MAX_MEMORY_GROWTH
+    assert threading.active_count() == threads
+    assert len(InterruptionStack.stack) == handlers
@@ -0,0 +1,93 @@
+import time
+
+import pytest
+import yaml
+from keycloak import KeycloakAuthenticationError, KeycloakOpenID, KeycloakPostError
+
+from blue_brain_token_fetch.testing import (
+    DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, KeycloakStub
+)
+from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
+from blue_brain_token_fetch.token_fetcher_user import TokenFetcherUser
+
+
+def test_user_fetcher(keycloak_stub):
+    fetcher = TokenFetcherUser("user", "password")
+    try:
+        claims = keycloak_stub.decode(fetcher.get_access_token())
+        assert claims["sub"] == "user"
+        assert claims["iss"] == keycloak_stub.issuer
+        assert fetcher.get_access_token_duration() == keycloak_stub.access_token_lifespan
+        assert keycloak_stub.requests["password"] == 1
+        assert keycloak_stub.requests["refresh_token"] == 1
+    finally:
+        fetcher.close()
+
+
+def test_service_fetcher(keycloak_stub):
+    fetcher = TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET)
+
+    claims = keycloak_stub.decode(fetcher.get_access_token())
+    assert claims["sub"] == f"service-account-{DEFAULT_SERVICE_CLIENT_ID}"
+    assert keycloak_stub.requests["client_credentials"] == 2
+
+
+def test_invalid_credentials(keycloak_stub):
+    with pytest.raises(KeycloakAuthenticationError):
+        TokenFetcherUser("user", "wrong")
+    with pytest.raises(KeycloakAuthenticationError):
+        TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, "wrong")
+
+
+def test_lifetimes_and_latency(keycloak_stub):
+    keycloak_stub.access_token_lifespan = 60
+    keycloak_stub.latency = 0.05
+
+    start = time.monotonic()
+    fetcher = TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET)
+    assert time.monotonic() - start >= 0.05
+    assert fetcher.get_access_token_duration() == 60
+
+
+def test_failure_injection(keycloak_stub):
+    keycloak_stub.fail_next(1)
+    with pytest.raises(KeycloakPostError) as error:
+        TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET)
+    assert error.value.response_code == 503
+
+    assert TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET)
+
+
+def test_refresh_token_checks(keycloak_stub):
+    instance = KeycloakOpenID(keycloak_stub.server_url, keycloak_stub.realm, "nexus-client")
+    payload = instance.token("user", "password")
+
+    # the refresh tokens are signed
+    header, claims, _ = payload["refresh_token"].split(".")
+    with pytest.raises(KeycloakPostError):
+        instance.refresh_token(f"{header}.{claims}.forged")
+
+    keycloak_stub.clock = lambda: time.time() + keycloak_stub.refresh_token_lifespan
+    with pytest.raises(KeycloakPostError):
+        instance.refresh_token(payload["refresh_token"])
+
+
+def test_failover_between_stubs(keycloak_stub, tmp_path):
+    with KeycloakStub() as other_stub:
+        other_stub.add_client(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET)
+        other_stub.signing_key = keycloak_stub.signing_key
+        path = tmp_path / "config.yaml"
+        path.write_text(yaml.dump({
+            "SERVER_URL": [keycloak_stub.server_url, other_stub.server_url],
+            "REALM_NAME": keycloak_stub.realm,
+        }))
+
+        fetcher = TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, str(path))
+        try:
+            keycloak_stub.failure_rate = 1
+            other_stub.latency = 0
+            for _ in range(3):
+                assert keycloak_stub.decode(fetcher.get_access_token())
+            assert other_stub.requests["client_credentials"] >= 3
+        finally:
+            fetcher.close()
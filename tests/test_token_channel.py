@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+
+import pytest
+
+from blue_brain_token_fetch.job import InterruptionStack
+from blue_brain_token_fetch.profiling import profiler
+from blue_brain_token_fetch.testing import (
+    DEFAULT_PASSWORD, DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, DEFAULT_USERNAME,
+)
+from blue_brain_token_fetch.token_channel import SharedTokenChannel
+from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
+from blue_brain_token_fetch.token_fetcher_user import TokenFetcherUser
+
+
+def test_publish_and_read():
+    channel = SharedTokenChannel(size=1024)
+    assert channel.is_owner
+
+    with pytest.raises(LookupError):
+        channel.read()
+
+    channel.publish("token1", 1000.5)
+    channel.publish("token", 2000.5)
+    assert channel.read() == ("token", 2000.5)
+
+    with pytest.raises(ValueError):
+        channel.publish("t" * 1024, 0)
+
+
+def run_in_child(function):
+    """
+    Run the function in a forked child and return what it returned.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            result = function()
+        except Exception as error:  # pylint: disable=broad-except
+            result = repr(error)
+        os.write(write_fd, json.dumps(result).encode())
+        os._exit(0)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd) as pipe:
+        result = json.loads(pipe.read())
+    os.waitpid(pid, 0)
+    return result
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="fork is not available")
+@pytest.mark.parametrize("fetcher_class, username, password", [
+    pytest.param(TokenFetcherService, DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET,
+                 id="service"),
+    pytest.param(TokenFetcherUser, DEFAULT_USERNAME, DEFAULT_PASSWORD, id="user"),
+])
+def test_forked_children_share_the_parent_token(keycloak_stub, fetcher_class, username,
+                                                password):
+    fetcher = fetcher_class(username, password, share_with_forks=True)
+
+    def child():
+        return [fetcher.get_access_token(), fetcher.get_valid_access_token()]
+
+    # the stub serving the children runs in the parent
+    grants = sum(keycloak_stub.requests.values())
+    first_token, valid_token = run_in_child(child)
+    assert first_token == valid_token == fetcher._token.access_token
+    assert sum(keycloak_stub.requests.values()) == grants
+
+    # refreshed once in the parent, seen by the next children
+    refreshed_token = fetcher.get_access_token()
+    grants = sum(keycloak_stub.requests.values())
+    assert run_in_child(child) == [refreshed_token, refreshed_token]
+    assert sum(keycloak_stub.requests.values()) == grants
+
+    fetcher.close()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="fork is not available")
+def test_running_children_see_parent_refreshes(keycloak_stub):
+    fetcher = TokenFetcherService(
+        DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, share_with_forks=True
+    )
+    go_read, go_write = os.pipe()
+
+    def child():
+        os.read(go_read, 1)
+        return fetcher.get_access_token()
+
+    result_read, result_write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.write(result_write, child().encode())
+        os._exit(0)
+
+    refreshed_token = fetcher.get_access_token()
+    os.write(go_write, b"1")
+    os.close(result_write)
+    with os.fdopen(result_read) as pipe:
+        assert pipe.read() == refreshed_token
+    os.waitpid(pid, 0)
+
+    fetcher.close()
+
+
+def test_channel_is_opt_in(keycloak_stub):
+    threads = threading.active_count()
+    fetcher = TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET)
+
+    assert fetcher._channel is None
+    assert threading.active_count() == threads
+
+    fetcher.close()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="fork is not available")
+def test_child_resets_inherited_locks(keycloak_stub):
+    fetcher = TokenFetcherService(
+        DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, share_with_forks=True
+    )
+    assert InterruptionStack.stack
+
+    def locks():
+        return [
+            InterruptionStack._lock, profiler._lock, fetcher._refresh_lock, fetcher._token_lock,
+            fetcher._rate_limiter._lock, fetcher._clock_skew._lock,
+        ]
+
+    def child():
+        acquired = [lock.acquire(timeout=1) for lock in locks()]
+        # the publisher of the parent does not run in the child
+        return acquired + [len(InterruptionStack.stack)]
+
+    # held by threads of the parent when it forks
+    held = locks()
+    for lock in held:
+        lock.acquire()
+    try:
+        assert run_in_child(child) == [True] * len(held) + [0]
+    finally:
+        for lock in held:
+            lock.release()
+
+    fetcher.close()
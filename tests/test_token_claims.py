@@ -0,0 +1,15 @@
+import pytest
+
+from blue_brain_token_fetch.token_claims import decode_claims
+from tests.conftest import make_jwt
+
+
+def test_decode_claims():
+    claims = {"exp": 1700000300, "iat": 1700000000, "sub": "user", "azp": "client"}
+    assert decode_claims(make_jwt(claims)) == claims
+
+
+@pytest.mark.parametrize("token", ["not a jwt", "a.b.c", "a.WzFd.c", None])
+def test_decode_claims_invalid_token(token):
+    with pytest.raises(ValueError):
+        decode_claims(token)
@@ -0,0 +1,138 @@
+import threading
+
+import pytest
+from keycloak import KeycloakPostError
+
+from blue_brain_token_fetch.credential_provider import StaticCredentialProvider
+from blue_brain_token_fetch.health import read_state
+from blue_brain_token_fetch.testing import (
+    DEFAULT_PASSWORD, DEFAULT_SERVICE_CLIENT_ID, DEFAULT_USERNAME
+)
+from blue_brain_token_fetch.token_exchange import TOKEN_EXCHANGE_GRANT, TokenExchanger
+from blue_brain_token_fetch.token_fetcher_user import TokenFetcherUser
+
+
+@pytest.fixture
+def fetcher(keycloak_stub):
+    keycloak_stub.add_client("search-api")
+    fetcher = TokenFetcherUser(DEFAULT_USERNAME, DEFAULT_PASSWORD)
+    yield fetcher
+    fetcher.close()
+
+
+def test_exchange_per_audience(keycloak_stub, fetcher):
+    exchanger = TokenExchanger(fetcher)
+    token = exchanger.get_token(audience="search-api", scope="profile openid")
+    claims = keycloak_stub.decode(token)
+    assert claims["aud"] == "search-api"
+    assert claims["sub"] == DEFAULT_USERNAME
+    assert claims["sid"] == fetcher.claims()["sid"]
+    assert claims["scope"] == "openid profile"
+
+    # cached, whatever the order of the scopes
+    assert exchanger.get_token(audience="search-api", scope="openid profile") == token
+    assert keycloak_stub.requests[TOKEN_EXCHANGE_GRANT] == 1
+
+    other_token = exchanger.get_token(audience=DEFAULT_SERVICE_CLIENT_ID, scope="openid")
+    assert keycloak_stub.decode(other_token)["aud"] == DEFAULT_SERVICE_CLIENT_ID
+    assert keycloak_stub.requests[TOKEN_EXCHANGE_GRANT] == 2
+    assert set(exchanger.cached()) == {
+        ("search-api", "openid profile"), (DEFAULT_SERVICE_CLIENT_ID, "openid")
+    }
+    # no other authentication than the one of the fetcher
+    assert keycloak_stub.requests["password"] == 1
+
+
+def test_exchange_before_expiry(keycloak_stub, fetcher):
+    # the tokens of the stub never stay valid that long
+    exchanger = TokenExchanger(fetcher, min_validity=keycloak_stub.access_token_lifespan + 1)
+    first_token = exchanger.get_token(audience="search-api")
+    assert exchanger.get_token(audience="search-api") != first_token
+    assert keycloak_stub.requests[TOKEN_EXCHANGE_GRANT] == 2
+
+
+def test_renew_token(keycloak_stub, fetcher):
+    exchanger = TokenExchanger(fetcher)
+    token = exchanger.get_token(audience="search-api")
+    renewed_token = exchanger.renew_token(token, audience="search-api")
+    assert renewed_token != token
+    # already replaced by another thread
+    assert exchanger.renew_token(token, audience="search-api") == renewed_token
+    assert keycloak_stub.requests[TOKEN_EXCHANGE_GRANT] == 2
+
+
+def test_concurrent_exchanges(keycloak_stub, fetcher):
+    keycloak_stub.latency = 0.05
+    exchanger = TokenExchanger(fetcher)
+    tokens = []
+    threads = [
+        threading.Thread(target=lambda: tokens.append(exchanger.get_token("search-api")))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(tokens)) == 1
+    assert keycloak_stub.requests[TOKEN_EXCHANGE_GRANT] == 1
+
+
+def test_rejected_exchanges(keycloak_stub, fetcher):
+    exchanger = TokenExchanger(fetcher)
+    with pytest.raises(KeycloakPostError):
+        exchanger.get_token(audience="unknown-api")
+    # scopes the session was not granted
+    with pytest.raises(KeycloakPostError):
+        exchanger.get_token(audience="search-api", scope="openid admin")
+    assert exchanger.cached() == {}
+
+
+def test_exchange_failures_not_recorded(keycloak_stub, tmp_path):
+    path = str(tmp_path / "state.json")
+    fetcher = TokenFetcherUser(DEFAULT_USERNAME, DEFAULT_PASSWORD, state_file=path)
+    try:
+        exchanger = TokenExchanger(fetcher)
+        for _ in range(3):
+            with pytest.raises(KeycloakPostError):
+                exchanger.get_token(audience="unknown-api")
+        # the exchanges do not make the fetcher unhealthy
+        assert read_state(path)["consecutive_failures"] == 0
+    finally:
+        fetcher.close()
+
+
+def test_forgotten_after_authentication(keycloak_stub):
+    keycloak_stub.add_client("search-api")
+    fetcher = TokenFetcherUser(
+        DEFAULT_USERNAME, DEFAULT_PASSWORD,
+        credential_provider=StaticCredentialProvider(DEFAULT_PASSWORD)
+    )
+    try:
+        exchanger = TokenExchanger(fetcher)
+        token = exchanger.get_token(audience="search-api")
+        fetcher._reauthenticate()
+        assert exchanger.cached() == {}
+        new_token = exchanger.get_token(audience="search-api")
+        assert keycloak_stub.decode(new_token)["sid"] == fetcher.claims()["sid"]
+        assert keycloak_stub.decode(new_token)["sid"] != keycloak_stub.decode(token)["sid"]
+        assert keycloak_stub.requests[TOKEN_EXCHANGE_GRANT] == 2
+    finally:
+        fetcher.close()
+
+
+def test_forgotten_after_realm_switch(keycloak_stub, start_stub, tmp_path):
+    config = keycloak_stub.write_keycloak_config(tmp_path / "keycloak_config.yaml")
+    other_stub = start_stub(realm="realm_2")
+    for stub in (keycloak_stub, other_stub):
+        stub.add_client("search-api")
+    fetcher = TokenFetcherUser(DEFAULT_USERNAME, DEFAULT_PASSWORD, config, watch_config=True)
+    try:
+        exchanger = TokenExchanger(fetcher)
+        exchanger.get_token(audience="search-api")
+        assert fetcher.reload_keycloak_config(other_stub.keycloak_config())
+        assert exchanger.cached() == {}
+        # exchanged by the server of the new realm
+        assert other_stub.decode(exchanger.get_token(audience="search-api"))
+        assert other_stub.requests[TOKEN_EXCHANGE_GRANT] == 1
+    finally:
+        fetcher.close()
@@ -4,10 +4,15 @@ from contextlib import nullcontext as does_not_raise
 
 import pytest
 
+from blue_brain_token_fetch.testing import (
+    DEFAULT_PASSWORD, DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, DEFAULT_USERNAME,
+)
 from blue_brain_token_fetch.token_fetcher_user import TokenFetcherUser
 from blue_brain_token_fetch.token_fetcher_base import TokenFetcherBase
 from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
-from tests.conftest import SERVICE_CONFIG, REGULAR_CONFIG, REGULAR_CONFIG_WITH_CLIENT_PWD
+from tests.conftest import (
+    SERVICE_CONFIG, REGULAR_CONFIG, REGULAR_CONFIG_WITH_CLIENT_PWD, UNREACHABLE_URL,
+)
 
 
 @pytest.mark.parametrize("class_to_use, keycloak_config_filepath, expected_size, exception", [
@@ -59,3 +64,65 @@ def test_non_existing_default_file(monkeypatch):
 
     assert os.path.exists(TokenFetcherBase.DEFAULT_TOKEN_FILEPATH)
     os.remove(TokenFetcherBase.DEFAULT_TOKEN_FILEPATH)
+
+
+def test_claims_introspection(keycloak_stub, monkeypatch):
+    fetcher = TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET)
+
+    claims = fetcher.claims()
+    assert claims["azp"] == DEFAULT_SERVICE_CLIENT_ID
+    assert fetcher.expires_at() == pytest.approx(claims["exp"], abs=1)
+    assert fetcher.time_to_expiry() == pytest.approx(keycloak_stub.access_token_lifespan, abs=1)
+    assert fetcher.get_access_token_duration() == keycloak_stub.access_token_lifespan
+
+    # decoded once per token version
+    monkeypatch.setattr(
+        "blue_brain_token_fetch.token_record.decode_claims",
+        lambda token: pytest.fail("claims decoded twice")
+    )
+    assert fetcher.claims() is claims
+
+
+def test_opaque_access_token(keycloak_stub, monkeypatch):
+    issue = keycloak_stub.issue
+
+    def issue_opaque(*args, **kwargs):
+        payload = issue(*args, **kwargs)
+        payload["access_token"] = "opaque-" + payload["access_token"][-16:]
+        return payload
+
+    monkeypatch.setattr(keycloak_stub, "issue", issue_opaque)
+    fetcher = TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET)
+
+    assert fetcher.get_access_token().startswith("opaque-")
+    assert fetcher.claims() == {}
+    assert fetcher.clock_skew() == 0
+    # the expiry comes from 'expires_in'
+    token = fetcher.snapshot()
+    assert fetcher.expires_at() == token.received_at + keycloak_stub.access_token_lifespan
+    assert fetcher.get_access_token_duration() == keycloak_stub.access_token_lifespan
+    assert fetcher.get_valid_access_token(10) == token.access_token
+
+
+def test_claims_follow_refreshed_token(keycloak_stub, monkeypatch):
+    fetcher = TokenFetcherUser(DEFAULT_USERNAME, DEFAULT_PASSWORD)
+    fetcher.close()
+    first_claims = fetcher.claims()
+
+    monkeypatch.setattr(keycloak_stub, "access_token_lifespan", 60)
+    fetcher.get_access_token()
+
+    assert fetcher.claims() != first_claims
+    assert fetcher.claims()["sub"] == DEFAULT_USERNAME
+    assert fetcher.get_access_token_duration() == 60
+
+
+def test_server_url(keycloak_stub):
+    fetcher = TokenFetcherService(
+        DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, keycloak_config={
+            "SERVER_URL": [keycloak_stub.server_url, UNREACHABLE_URL],
+            "REALM_NAME": keycloak_stub.realm,
+        }
+    )
+    assert fetcher.server_url() == keycloak_stub.server_url
+    fetcher.close()
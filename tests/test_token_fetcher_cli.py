@@ -1,7 +1,9 @@
 from pathlib import Path
 from click.testing import CliRunner
 
-from blue_brain_token_fetch.nexus_token_fetch import token_fetcher
+from blue_brain_token_fetch.nexus_token_fetch import RefreshLoop, token_fetcher
+from blue_brain_token_fetch.testing import DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET
+from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
 
 TEST_PATH = Path(Path(__file__).parent.parent)
 
@@ -23,3 +25,22 @@ def test_token_fetcher_cli():
             ],
         )
         assert result.exit_code == 1
+
+
+def test_refresh_loop(keycloak_stub):
+    now = [1000.0]
+    fetcher = TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET)
+    try:
+        loop = RefreshLoop(fetcher, 3600, timeout=60, clock=lambda: now[0])
+        assert keycloak_stub.decode(loop.fetch())
+        # half the remaining life span of the token
+        assert loop.shortened
+        assert 140 <= loop.refresh_period <= 150
+
+        assert not loop.timed_out()
+        now[0] += 60
+        assert not loop.timed_out()
+        assert loop.timed_out(now[0] + 1)
+        assert not RefreshLoop(fetcher, 15).timed_out(now[0] + 86400)
+    finally:
+        fetcher.close()
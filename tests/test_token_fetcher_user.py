@@ -1,7 +1,8 @@
 from keycloak import KeycloakAuthenticationError, KeycloakPostError, KeycloakConnectionError
 
+from blue_brain_token_fetch.testing import DEFAULT_PASSWORD, DEFAULT_USERNAME
 from blue_brain_token_fetch.token_fetcher_user import TokenFetcherUser
-from tests.conftest import REGULAR_CONFIG
+from tests.conftest import REGULAR_CONFIG, UNREACHABLE_URL
 
 import pytest
 
@@ -39,23 +40,20 @@ def test_invalid_config_file():
             "password",
             "./tests/tests_data/service_keycloak_config.yaml",
         )
-    with pytest.raises(KeycloakPostError):  # Invalid realm
-        TokenFetcherUser(
-            "username",
-            "password",
-            "./tests/tests_data/regular_keycloak_config_invalid_realm.yaml",
-        )
-    with pytest.raises(KeycloakConnectionError):  # Invalid server url
-        TokenFetcherUser(
-            "username",
-            "password",
-            "./tests/tests_data/regular_keycloak_config_invalid_server_url.yaml",
-        )
-    with pytest.raises(KeycloakAuthenticationError):  # Invalid client id
+
+
+@pytest.mark.parametrize("settings, error", [
+    pytest.param({"REALM_NAME": "BBP2"}, KeycloakPostError, id="invalid_realm"),
+    pytest.param({"SERVER_URL": UNREACHABLE_URL}, KeycloakConnectionError, id="invalid_server_url"),
+    pytest.param({"CLIENT_ID": "unknown-client"}, KeycloakAuthenticationError,
+                 id="invalid_client_id"),
+])
+def test_invalid_keycloak_config(keycloak_stub, settings, error):
+    with pytest.raises(error):
         TokenFetcherUser(
-            "username",
-            "password",
-            "./tests/tests_data/regular_keycloak_config_invalid_client_id.yaml",
+            DEFAULT_USERNAME,
+            DEFAULT_PASSWORD,
+            keycloak_config=dict(keycloak_stub.keycloak_config(), **settings),
         )
 
 
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from blue_brain_token_fetch.testing import DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET
+from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
+from blue_brain_token_fetch.token_lease import LeaseStats, TokenLease
+
+
+@pytest.fixture
+def fetcher(keycloak_stub, monkeypatch):
+    monkeypatch.setattr(keycloak_stub, "access_token_lifespan", 100)
+    fetcher = TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET)
+    yield fetcher
+    fetcher.close()
+
+
+def test_lease_current_token(keycloak_stub, fetcher):
+    lease = fetcher.lease(min_validity=60)
+    assert lease.access_token == fetcher.snapshot().access_token
+    assert lease.time_left() > 60
+    assert keycloak_stub.requests["client_credentials"] == 1
+
+
+def test_lease_refreshed_ahead(keycloak_stub, fetcher, monkeypatch):
+    first_token = fetcher.snapshot().access_token
+    monkeypatch.setattr(keycloak_stub, "access_token_lifespan", 300)
+
+    # the current token only stays valid for 100 seconds
+    lease = fetcher.lease(min_validity=200)
+    assert lease.access_token != first_token
+    assert lease.time_left() > 200
+    assert keycloak_stub.requests["client_credentials"] == 2
+
+
+def test_lease_longer_than_token_lifespan(fetcher):
+    with pytest.raises(ValueError, match="cannot be guaranteed"):
+        fetcher.lease(min_validity=150)
+
+
+def test_lease_durations(fetcher):
+    with fetcher.lease() as lease:
+        assert fetcher.lease_stats()["active"] == 1
+        time.sleep(0.05)
+    assert lease.duration() >= 0.05
+
+    def upload():
+        with fetcher.lease():
+            pass
+
+    threads = [threading.Thread(target=upload) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = fetcher.lease_stats()
+    assert stats["count"] == 5
+    assert stats["active"] == 0
+    assert stats["max_duration"] == pytest.approx(lease.duration())
+    assert stats["expired"] == 0
+
+
+def test_lease_outliving_its_token():
+    stats = LeaseStats()
+    with TokenLease("token", time.time() - 1, 30, stats) as lease:
+        assert lease.time_left() < 0
+    assert stats.as_dict()["expired"] == 1
+
+
+def test_lease_on_fetcher_clock(keycloak_stub):
+    now = [time.time()]
+    fetcher = TokenFetcherService(
+        DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, clock=lambda: now[0]
+    )
+    try:
+        with fetcher.lease(min_validity=60) as lease:
+            assert lease.acquired_at == now[0]
+            now[0] += 120
+            lifespan = keycloak_stub.access_token_lifespan
+            assert lease.time_left() == pytest.approx(lifespan - 120, abs=1)
+        assert lease.duration() == 120
+        assert fetcher.lease_stats()["max_duration"] == 120
+    finally:
+        fetcher.close()
@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+from blue_brain_token_fetch.testing import DEFAULT_CLIENT_ID, DEFAULT_PASSWORD, DEFAULT_USERNAME
+from blue_brain_token_fetch.token_fetcher_user import TokenFetcherUser
+from blue_brain_token_fetch.token_record import TokenRecord
+from tests.benchmark import concurrent_reads, scaling
+from tests.conftest import make_jwt
+
+
+def test_record_is_immutable():
+    record = TokenRecord.from_payload(
+        {"access_token": make_jwt({"exp": 10}), "expires_in": 10, "refresh_token": "r"}, 0, 3
+    )
+    assert (record.version, record.refresh_token) == (3, "r")
+    with pytest.raises(AttributeError):
+        record.access_token = "other"
+    with pytest.raises(AttributeError):
+        del record.refresh_token
+    # the lazily decoded claims are cached all the same
+    assert record.claims() is record.claims()
+
+
+def test_opaque_access_token():
+    record = TokenRecord.from_payload({"access_token": "opaque", "expires_in": 10}, 5)
+    assert record.claims() == {}
+    assert record.claims() is record.claims()
+
+
+def test_snapshots_are_swapped(keycloak_stub):
+    fetcher = TokenFetcherUser(DEFAULT_USERNAME, DEFAULT_PASSWORD)
+    try:
+        first = fetcher.snapshot()
+        fetcher.run_refresh_job()
+        second = fetcher.snapshot()
+
+        assert second is not first
+        assert second.version == first.version + 1
+        assert second.refresh_token != first.refresh_token
+        # the refresh grant uses the refresh token of the current snapshot
+        fetcher.get_access_token()
+        assert fetcher.snapshot().version == second.version + 1
+    finally:
+        fetcher.close()
+
+
+def test_versions_published_in_order(keycloak_stub, monkeypatch):
+    fetcher = TokenFetcherUser(DEFAULT_USERNAME, DEFAULT_PASSWORD)
+    fetcher.close()
+    payload = keycloak_stub.issue(DEFAULT_USERNAME, DEFAULT_CLIENT_ID)
+    from_payload = TokenRecord.from_payload
+    numbered, published = threading.Event(), threading.Event()
+
+    def slow_from_payload(payload, received_at, version=0):
+        if version == 2:
+            numbered.set()
+            # the next token is published meanwhile, unless it waits for this one
+            published.wait(0.5)
+        return from_payload(payload, received_at, version)
+
+    monkeypatch.setattr(TokenRecord, "from_payload", slow_from_payload)
+    first = threading.Thread(target=fetcher._update_payload, args=(payload,))
+    first.start()
+    numbered.wait()
+    fetcher._update_payload(payload)
+    published.set()
+    first.join()
+
+    # the last token published is the last one numbered
+    assert fetcher.snapshot().version == 3
+
+
+def test_concurrent_reads(keycloak_stub):
+    fetcher = TokenFetcherUser(DEFAULT_USERNAME, DEFAULT_PASSWORD)
+    try:
+        result = concurrent_reads(fetcher, 64, duration=0.2, refresh_interval=0.001)
+        assert result["reads"] > 0
+        assert result["inconsistencies"] == 0
+
+        results = scaling(fetcher, [1, 2], duration=0.05, refresh_interval=None)
+        assert [(result["threads"], result["mode"]) for result in results] == [
+            (1, "snapshot"), (1, "locked"), (2, "snapshot"), (2, "locked")
+        ]
+    finally:
+        fetcher.close()
@@ -0,0 +1,144 @@
+import json
+import time
+
+import pytest
+from click.testing import CliRunner
+
+from blue_brain_token_fetch.nexus_token_fetch import token_fetcher
+from blue_brain_token_fetch.testing import DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET
+from blue_brain_token_fetch.token_sink import (
+    NetrcTokenSink, TokenSink, merge_netrc_entry, parse_sink, render_fields, write_sinks
+)
+from blue_brain_token_fetch.token_store import FileTokenStore
+
+
+class CountingStore(FileTokenStore):
+    def __init__(self, path):
+        super().__init__(path)
+        self.writes = 0
+
+    def write(self, access_token, expires_at=None):
+        self.writes += 1
+        super().write(access_token, expires_at)
+
+
+def test_formats(tmp_path):
+    expires_at = time.time() + 100
+    sinks = [
+        parse_sink(f"{token_format}:{tmp_path / token_format}")
+        for token_format in ("raw", "env", "netrc", "json")
+    ]
+    write_sinks(sinks, "abc", expires_at, username="user", machine="host")
+
+    assert (tmp_path / "raw").read_text() == "abc"
+    assert (tmp_path / "env").read_text() == "NEXUS_TOKEN=abc\n"
+    assert (tmp_path / "netrc").read_text() == "machine host login user password abc\n"
+    content = json.loads((tmp_path / "json").read_text())
+    assert content["access_token"] == "abc"
+    assert content["expires_at"] == int(expires_at)
+
+
+def test_custom_template(tmp_path):
+    sink = parse_sink(f"export:{tmp_path / 'token.sh'}",
+                      templates={"export": "export NEXUS_TOKEN={token}  # {expires_in}\n"})
+    write_sinks([sink], "abc", time.time() + 60.5)
+    assert (tmp_path / "token.sh").read_text() == "export NEXUS_TOKEN=abc  # 60\n"
+
+    with pytest.raises(ValueError):
+        TokenSink(sink.store, "{unknown}").render(render_fields("abc"))
+
+
+def test_unchanged_sinks_are_skipped(tmp_path):
+    raw = TokenSink(CountingStore(str(tmp_path / "raw")))
+    env = TokenSink(CountingStore(str(tmp_path / "env")), "env")
+
+    assert write_sinks([raw, env], "abc") == [raw, env]
+    assert write_sinks([raw, env], "abc") == []
+    assert write_sinks([raw, env], "def") == [raw, env]
+    assert (raw.store.writes, env.store.writes) == (2, 2)
+
+
+@pytest.mark.parametrize("spec", ["raw", "yaml:path", "raw:"])
+def test_invalid_sink(spec):
+    with pytest.raises(ValueError):
+        parse_sink(spec)
+
+
+def test_cli_sinks(keycloak_stub, tmp_path):
+    config = keycloak_stub.write_keycloak_config(tmp_path / "keycloak_config.yaml")
+    runner = CliRunner()
+    result = runner.invoke(token_fetcher, [
+        "--username", DEFAULT_SERVICE_CLIENT_ID, "--password", DEFAULT_SERVICE_SECRET,
+        "--service", "1", "-kcf", config, "-rp", "0.1", "-to", "0.1",
+        "--sink", f"env:{tmp_path / 'token.env'}",
+        "--sink", f"json:{tmp_path / 'token.json'}",
+        "--sink", f"export:{tmp_path / 'token.sh'}",
+        "--sink-template", "export=export NEXUS_TOKEN={token}\\n",
+    ])
+
+    assert result.exit_code == 1
+    token = json.loads((tmp_path / "token.json").read_text())["access_token"]
+    assert (tmp_path / "token.env").read_text() == f"NEXUS_TOKEN={token}\n"
+    assert (tmp_path / "token.sh").read_text() == f"export NEXUS_TOKEN={token}\n"
+
+
+NETRC = """# personal netrc
+machine other login a password b
+
+machine host
+  login user
+  password old
+# kept
+machine ftp login c password d
+macdef init
+cd /
+
+default login anonymous password x
+"""
+
+
+def test_merge_netrc_entry():
+    entry = "machine host login user password new\n"
+
+    assert merge_netrc_entry(NETRC, "host", entry) == NETRC.replace(
+        "machine host\n  login user\n  password old\n", entry
+    )
+    assert merge_netrc_entry(NETRC, "new", entry) == NETRC + entry
+    assert merge_netrc_entry("", "host", entry) == entry
+    # entries on the same line, duplicated machine
+    assert merge_netrc_entry(
+        "machine host login u password o machine b login c password d\n"
+        "machine host login v password p", "host", entry
+    ) == entry + "machine b login c password d\n"
+
+
+def test_netrc_sink_keeps_other_entries(tmp_path):
+    netrc = tmp_path / "netrc"
+    netrc.write_text(NETRC)
+    sink = parse_sink(f"netrc:{netrc}")
+    assert isinstance(sink, NetrcTokenSink)
+
+    assert write_sinks([sink], "new", username="user", machine="host") == [sink]
+    content = netrc.read_text()
+    assert "machine host login user password new\n" in content
+    assert "password old" not in content
+    assert content.count("machine") == 3 and "default login anonymous" in content
+
+    # unchanged token, nothing written
+    assert write_sinks([sink], "new", username="user", machine="host") == []
+
+
+def test_cli_console_with_sinks(keycloak_stub, tmp_path):
+    config = keycloak_stub.write_keycloak_config(tmp_path / "keycloak_config.yaml")
+    result = CliRunner().invoke(token_fetcher, [
+        "--username", DEFAULT_SERVICE_CLIENT_ID, "--password", DEFAULT_SERVICE_SECRET,
+        "--service", "1", "-kcf", config, "-rp", "0.1", "-to", "0.1", "-o",
+        "--sink", f"accents:{tmp_path / 'token.txt'}",
+        "--sink-template", "accents=jeton é\\t{token}\\n",
+    ])
+
+    assert result.exit_code == 1
+    token = (tmp_path / "token.txt").read_text()[len("jeton é\t"):-1]
+    assert token.count(".") == 2
+    # printed on the console too
+    assert token in result.output
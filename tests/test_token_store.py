@@ -0,0 +1,81 @@
+import os
+import stat
+import time
+
+import pytest
+
+from blue_brain_token_fetch.token_store import (
+    FileTokenStore, KeyringTokenStore, TmpfsTokenStore, benchmark_read, make_token_store
+)
+
+
+def test_file_store(tmp_path):
+    path = tmp_path / "sub" / "token.txt"
+    store = FileTokenStore(str(path))
+
+    store.write("token_1")
+    assert store.read() == "token_1"
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+    store.write("token_2")
+    assert store.read() == "token_2"
+    # no temporary file left behind
+    assert os.listdir(path.parent) == ["token.txt"]
+
+
+def test_file_store_replaces_permissive_file(tmp_path):
+    path = tmp_path / "token.txt"
+    path.write_text("old")
+    os.chmod(path, 0o644)
+
+    FileTokenStore(str(path)).write("token")
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="no /dev/shm")
+def test_tmpfs_store():
+    store = TmpfsTokenStore()
+    assert store.location().startswith("/dev/shm/")
+    try:
+        store.write("token")
+        assert store.read() == "token"
+    finally:
+        os.remove(store.location())
+
+
+def _keyring_store():
+    try:
+        store = KeyringTokenStore(f"nexus_token_test_{os.getpid()}")
+        store.write("probe")
+    except (RuntimeError, OSError) as error:
+        pytest.skip(f"kernel keyring not available: {error}")
+    return store
+
+
+def test_keyring_store():
+    store = _keyring_store()
+    store.write("token_1", expires_at=time.time() + 60)
+    assert store.read() == "token_1"
+
+    store.write("token_2", expires_at=time.time() + 60)
+    assert store.read() == "token_2"
+
+    # a new store of the same description finds the key
+    assert KeyringTokenStore(store.description).read() == "token_2"
+
+
+def test_make_token_store(tmp_path):
+    assert isinstance(make_token_store("file", str(tmp_path / "token")), FileTokenStore)
+    with pytest.raises(ValueError):
+        make_token_store("cloud")
+    with pytest.raises(ValueError):
+        KeyringTokenStore(keyring="@x")
+
+
+def test_benchmark_read(tmp_path):
+    store = FileTokenStore(str(tmp_path / "token"))
+    store.write("token")
+
+    result = benchmark_read(store, 50)
+    assert result["reads"] == 50
+    assert 0 < result["min_us"] <= result["median_us"] <= result["max_us"]
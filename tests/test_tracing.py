@@ -0,0 +1,110 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from blue_brain_token_fetch import tracing
+from blue_brain_token_fetch.testing import (
+    DEFAULT_PASSWORD, DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, DEFAULT_USERNAME,
+)
+from blue_brain_token_fetch.tracing import OTLPJSONFileExporter, STATUS_ERROR, _NULL_SPAN
+from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
+from blue_brain_token_fetch.token_fetcher_user import TokenFetcherUser
+from tests.conftest import UNREACHABLE_URL
+
+
+@pytest.fixture
+def trace_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "tracer", tracing.Tracer())
+    path = tmp_path / "trace.jsonl"
+    tracing.set_exporter(OTLPJSONFileExporter(str(path)))
+    return path
+
+
+def read_spans(path):
+    return [
+        json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+        for line in path.read_text().splitlines()
+    ]
+
+
+def attributes(span):
+    return {attribute["key"]: list(attribute["value"].values())[0] for attribute in span["attributes"]}
+
+
+def test_no_exporter(monkeypatch):
+    monkeypatch.setattr(tracing, "tracer", tracing.Tracer())
+    assert tracing.span("span") is _NULL_SPAN
+
+
+def test_no_tracing_dependency_imported():
+    code = (
+        "import sys, blue_brain_token_fetch.tracing, blue_brain_token_fetch.token_fetcher_user;"
+        "print(any(name.startswith('opentelemetry') for name in sys.modules))"
+    )
+    output = subprocess.check_output([sys.executable, "-c", code], text=True)
+    assert output.strip() == "False"
+
+
+def test_nested_spans(trace_file, monkeypatch):
+    monkeypatch.setenv("TRACEPARENT", f"00-{'a' * 32}-{'b' * 16}-01")
+
+    with tracing.span("parent", realm="BBP"):
+        with pytest.raises(ValueError), tracing.span("child", retry_count=1):
+            raise ValueError("boom")
+
+    child, parent = read_spans(trace_file)
+    assert parent["traceId"] == child["traceId"] == "a" * 32
+    assert parent["parentSpanId"] == "b" * 16
+    assert child["parentSpanId"] == parent["spanId"]
+    assert attributes(parent) == {"realm": "BBP"}
+    assert attributes(child) == {"retry_count": "1"}
+    assert child["status"] == {"code": STATUS_ERROR, "message": "ValueError: boom"}
+
+
+def test_fetcher_spans(trace_file, keycloak_stub):
+    fetcher = TokenFetcherUser(DEFAULT_USERNAME, DEFAULT_PASSWORD)
+    fetcher.close()
+    fetcher.get_access_token()
+    fetcher.run_refresh_job()
+
+    spans = {span["name"]: span for span in read_spans(trace_file)}
+    assert set(spans) == {
+        "keycloak.grant", "TokenFetcherUser.__init__", "TokenFetcherUser.get_access_token",
+        "TokenFetcherUser.refresh_token_rotation"
+    }
+    assert attributes(spans["TokenFetcherUser.__init__"]) == {
+        "grant_type": "password", "realm": "BBP"
+    }
+    assert attributes(spans["TokenFetcherUser.get_access_token"])["cache_hit"] is False
+    assert attributes(spans["keycloak.grant"])["grant_type"] == "refresh_token"
+
+
+def test_failover_retry_count(trace_file, keycloak_stub):
+    config = {"SERVER_URL": [UNREACHABLE_URL, keycloak_stub.server_url],
+              "REALM_NAME": keycloak_stub.realm}
+    fetcher = TokenFetcherService(
+        DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, keycloak_config=config
+    )
+    fetcher.close()
+    # the unreachable server is tried first again, as once its retry delay is over
+    for endpoint in fetcher._keycloak_openid.endpoints:
+        endpoint.down_until, endpoint.latency = 0.0, None
+    fetcher._keycloak_openid.endpoints.sort(key=lambda endpoint: endpoint.url != UNREACHABLE_URL)
+    fetcher.get_access_token()
+
+    grants = [span for span in read_spans(trace_file) if span["name"] == "keycloak.grant"]
+    assert attributes(grants[-1])["retry_count"] == "1"
+
+
+def test_cache_hit(trace_file, keycloak_stub):
+    fetcher = TokenFetcherService(DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET)
+    fetcher.get_valid_access_token()
+    fetcher.get_valid_access_token(min_validity=keycloak_stub.access_token_lifespan + 1)
+
+    hits = [
+        attributes(span)["cache_hit"] for span in read_spans(trace_file)
+        if span["name"] == "TokenFetcherService.get_access_token"
+    ]
+    assert hits == [True, False]
@@ -0,0 +1,132 @@
+import threading
+import time
+
+import pytest
+from keycloak import KeycloakAuthenticationError
+
+from blue_brain_token_fetch.testing import (
+    DEFAULT_PASSWORD, DEFAULT_SERVICE_CLIENT_ID, DEFAULT_SERVICE_SECRET, DEFAULT_USERNAME,
+)
+from blue_brain_token_fetch.token_fetcher_base import FetcherClosedError
+from blue_brain_token_fetch.token_fetcher_service import TokenFetcherService
+from blue_brain_token_fetch.token_fetcher_user import TokenFetcherUser
+from blue_brain_token_fetch.warm_up import warm_up
+
+
+def lazy_service(name=DEFAULT_SERVICE_CLIENT_ID, secret=DEFAULT_SERVICE_SECRET):
+    return TokenFetcherService(name, secret, lazy=True)
+
+
+def test_lazy_construction(keycloak_stub):
+    fetcher = lazy_service()
+    try:
+        assert not hasattr(fetcher, "_keycloak_openid")
+        assert fetcher._interrupt_callback is None
+
+        # the first access authenticates, without a second grant
+        access_token = fetcher.get_access_token()
+        assert keycloak_stub.requests["client_credentials"] == 1
+        assert fetcher.get_valid_access_token() == access_token
+        assert keycloak_stub.requests["client_credentials"] == 1
+    finally:
+        fetcher.close()
+
+
+def test_lazy_user_starts_refreshing(keycloak_stub):
+    fetcher = TokenFetcherUser(DEFAULT_USERNAME, DEFAULT_PASSWORD, lazy=True)
+    try:
+        assert fetcher.claims()["sub"] == DEFAULT_USERNAME
+        assert fetcher._interrupt_callback is not None
+        assert keycloak_stub.requests["password"] == 1
+    finally:
+        fetcher.close()
+
+
+def test_concurrent_first_accesses(keycloak_stub, monkeypatch):
+    monkeypatch.setattr(keycloak_stub, "latency", 0.05)
+    fetcher = lazy_service()
+    tokens = []
+    threads = [
+        threading.Thread(target=lambda: tokens.append(fetcher.get_valid_access_token()))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    try:
+        assert len(set(tokens)) == 1
+        assert keycloak_stub.requests["client_credentials"] == 1
+    finally:
+        fetcher.close()
+
+
+def test_failed_deferred_authentication_retried(keycloak_stub):
+    fetcher = lazy_service(secret="invalid")
+    with pytest.raises(KeycloakAuthenticationError):
+        fetcher.get_access_token()
+    assert fetcher._pending_initialization is not None
+    fetcher.close()
+    assert fetcher._pending_initialization is None
+
+
+def test_warm_up_concurrently(keycloak_stub, monkeypatch):
+    monkeypatch.setattr(keycloak_stub, "latency", 0.3)
+    for index in range(5):
+        keycloak_stub.add_client(f"service-{index}", DEFAULT_SERVICE_SECRET)
+    fetchers = [lazy_service(f"service-{index}") for index in range(5)]
+    fetchers.append(lazy_service(secret="invalid"))
+    try:
+        start = time.monotonic()
+        errors = warm_up(fetchers)
+        # the slowest grant, not the sum of them
+        assert time.monotonic() - start < 1
+        assert errors[:5] == [None] * 5
+        assert isinstance(errors[5], KeycloakAuthenticationError)
+        assert all(fetcher._pending_initialization is None for fetcher in fetchers[:5])
+        # already authenticated fetchers are ready immediately
+        assert warm_up(fetchers[:5]) == [None] * 5
+    finally:
+        for fetcher in fetchers:
+            fetcher.close()
+
+
+def test_warm_up_timeout(keycloak_stub, monkeypatch):
+    monkeypatch.setattr(keycloak_stub, "latency", 0.3)
+    fetcher = lazy_service()
+    try:
+        errors = warm_up([fetcher], timeout=0.05)
+        assert isinstance(errors[0], TimeoutError)
+        # the first access waits for the authentication in progress
+        assert fetcher.get_valid_access_token()
+        assert keycloak_stub.requests["client_credentials"] == 1
+    finally:
+        fetcher.close()
+
+
+def test_lazy_closed_before_access(keycloak_stub):
+    fetcher = lazy_service()
+    fetcher.close()
+    for access in (fetcher.get_access_token, fetcher.get_valid_access_token,
+                   fetcher.snapshot, fetcher.authenticate):
+        with pytest.raises(FetcherClosedError):
+            access()
+    assert keycloak_stub.requests["client_credentials"] == 0
+
+
+def test_close_during_lazy_authentication(keycloak_stub, monkeypatch):
+    monkeypatch.setattr(keycloak_stub, "latency", 0.3)
+    fetcher = TokenFetcherUser(DEFAULT_USERNAME, DEFAULT_PASSWORD, lazy=True)
+    thread = threading.Thread(target=fetcher.authenticate)
+    thread.start()
+    while fetcher._initializing_thread is None:
+        time.sleep(0.01)
+    try:
+        # waits for the authentication in progress, then stops its refreshing
+        fetcher.close()
+        thread.join()
+        assert fetcher._interrupt_callback is None
+        assert fetcher._probe_callback is None
+        assert fetcher.get_access_token()
+    finally:
+        fetcher.close()